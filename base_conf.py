@@ -4,9 +4,10 @@ base_conf.py
   Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
 """
 
-import getpass, time, sys, os
-from utils import Common, Log, PG, Repository
-from benchmark import Sysbench, SysbenchScenario, Pgbench, PgbenchScenario
+import getpass, sys, os
+from utils import Common, Log, PG, Repository, MetricsStore
+from benchmark import Sysbench, SysbenchScenario, Pgbench, PgbenchScenario, Native, NativeScenario, Replay, ReplayScenario
+from benchmark import Phases, MixedScenario
 
 try:
     import tomllib
@@ -22,12 +23,13 @@ def check_template(check_func):
             max_connections,
             reserved_connections,
             superuser_reserved_connections,
-        ] = pg.check(self.restore_everytime, self.linux_monitoring)
+        ] = pg.check(self.restore_everytime, self.linux_monitoring, self.statements_top > 0)
         if ret == False:
             sys.exit(1)
-        time.sleep(5)  # Waiting for PostgreSQL to start up.
+        if pg.wait_until_ready() == None:
+            sys.exit(1)
 
-        check_func(self)
+        check_func(self, **kwargs)
 
         del pg
         return [max_connections, reserved_connections, superuser_reserved_connections]
@@ -44,23 +46,59 @@ class BaseConf:
         # https://optuna.readthedocs.io/en/stable/reference/samplers/index.html
         self.sampling_mode = Common.DEFAULT_SAMPLING_MODE
         self.restore_everytime = True
+        self.restore_method = Common.DEFAULT_RESTORE_METHOD
+        self.restore_verify = False
+        self.storage = None
+        # ["none" | "median" | "percentile" | "hyperband"]
+        # https://optuna.readthedocs.io/en/stable/reference/pruners.html
+        self.pruner = Common.DEFAULT_PRUNER
+        self.pruner_startup_trials = Common.DEFAULT_PRUNER_STARTUP_TRIALS
+        self.pruner_warmup_steps = Common.DEFAULT_PRUNER_WARMUP_STEPS
+        self.pruner_percentile = Common.DEFAULT_PRUNER_PERCENTILE
+        self.report_interval = Common.REPORT_INTERVAL
+        self.reload_only = False
+        self.repeats = Common.DEFAULT_REPEATS
+        self.adaptive_repeats = Common.DEFAULT_ADAPTIVE_REPEATS
+        # ["median" | "trimmed_mean" | "mean"]
+        self.repeat_statistic = Common.DEFAULT_REPEAT_STATISTIC
+        # ["none" | "cv" | "cusum"]
+        self.steady_state = Common.DEFAULT_STEADY_STATE
+        self.steady_state_window = Common.DEFAULT_STEADY_STATE_WINDOW
+        self.steady_state_threshold = None
+        self.cache = False
+        self.cache_repeats = 0
+        self.cache_max_entries = Common.DEFAULT_CACHE_MAX_ENTRIES
+        self.cache_max_age = Common.DEFAULT_CACHE_MAX_AGE
 
         self.linux_monitoring = False
-        self.monitoring_time = 10
+        self.monitoring_time = Common.DEFAULT_MONITORING_TIME
+        self.monitoring_mode = Common.DEFAULT_MONITORING_MODE
+        self.metrics_store = Common.DEFAULT_METRICS_STORE
+        self.statements_top = Common.DEFAULT_STATEMENTS_TOP
+        self.wait_event_interval = Common.DEFAULT_WAIT_EVENT_INTERVAL
+        self.latency_histogram = False
 
         self.base_dir = Common.set_dir(Common.REPOSITORY_DIR)
         self.log_dir = None
 
         self.pgsql_server = {}
+        self.pgsql_servers = []
 
         self.config_real = []
         self.config_int = []
 
         self.bench_conf = {}
+        self.bench_confs = {}
         self.bench_scenario = []
+        self.bench_warmup = []
 
         self.additional_monitor_items = []
 
+        # [[metric, direction], ...]. Single objective "score" if empty.
+        self.objectives = []
+        # [[metric, "<=" | ">=", limit], ...]
+        self.constraints = []
+
         ## --------------------------------------------
         ## Parse configure toml file
         ## --------------------------------------------
@@ -85,7 +123,7 @@ class BaseConf:
 
                 if "target" in trial:
                     self.target = trial["target"]
-                    if self.target not in ["sysbench", "pgbench"]:
+                    if self.target not in Common.BENCHMARK_TARGETS:
                         print("Error: '{}' not supported.".format(self.target))
                         sys.exit(1)
                 else:
@@ -105,6 +143,97 @@ class BaseConf:
                 else:
                     self.restore_everytime = True
 
+                if "storage" in trial:
+                    self.storage = trial["storage"]
+
+                if "restore_method" in trial:
+                    self.restore_method = trial["restore_method"]
+                    if self.restore_method not in ["copy", "rsync", "reflink", "btrfs", "zfs", "lvm", "incremental"]:
+                        print("Error: restore_method '{}' not supported.".format(self.restore_method))
+                        sys.exit(1)
+
+                if "restore_verify" in trial:
+                    self.restore_verify = trial["restore_verify"]
+                    if self.restore_verify and self.restore_method != "incremental":
+                        if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                            print("Notice: restore_verify is ignored unless restore_method is 'incremental'.")
+                        self.restore_verify = False
+
+                if "pruner" in trial:
+                    self.pruner = trial["pruner"]
+                    if self.pruner not in ["none", "median", "percentile", "hyperband"]:
+                        print("Error: pruner '{}' not supported.".format(self.pruner))
+                        sys.exit(1)
+
+                if "pruner_startup_trials" in trial:
+                    self.pruner_startup_trials = trial["pruner_startup_trials"]
+
+                if "pruner_warmup_steps" in trial:
+                    self.pruner_warmup_steps = trial["pruner_warmup_steps"]
+
+                if "pruner_percentile" in trial:
+                    self.pruner_percentile = float(trial["pruner_percentile"])
+                    if self.pruner_percentile < 0.0 or 100.0 < self.pruner_percentile:
+                        print("Error: pruner_percentile must be between 0 and 100.")
+                        sys.exit(1)
+
+                if "report_interval" in trial:
+                    self.report_interval = trial["report_interval"]
+                    if type(self.report_interval) is not int or self.report_interval <= 0:
+                        print("Error: report_interval must be positive integer.")
+                        sys.exit(1)
+
+                if "repeats" in trial:
+                    self.repeats = trial["repeats"]
+                    if type(self.repeats) is not int or self.repeats < 1:
+                        print("Error: repeats must be positive integer.")
+                        sys.exit(1)
+
+                if "adaptive_repeats" in trial:
+                    self.adaptive_repeats = trial["adaptive_repeats"]
+                    if type(self.adaptive_repeats) is not int or self.adaptive_repeats < 0:
+                        print("Error: adaptive_repeats must be non-negative integer.")
+                        sys.exit(1)
+
+                if "repeat_statistic" in trial:
+                    self.repeat_statistic = trial["repeat_statistic"]
+                    if self.repeat_statistic not in ["median", "trimmed_mean", "mean"]:
+                        print("Error: repeat_statistic '{}' not supported.".format(self.repeat_statistic))
+                        sys.exit(1)
+
+                if "steady_state" in trial:
+                    self.steady_state = trial["steady_state"]
+                    if self.steady_state not in ["none", "cv", "cusum"]:
+                        print("Error: steady_state '{}' not supported.".format(self.steady_state))
+                        sys.exit(1)
+
+                if "steady_state_window" in trial:
+                    self.steady_state_window = trial["steady_state_window"]
+                    if type(self.steady_state_window) is not int or self.steady_state_window < 2:
+                        print("Error: steady_state_window must be integer greater than 1.")
+                        sys.exit(1)
+
+                if "steady_state_threshold" in trial:
+                    self.steady_state_threshold = float(trial["steady_state_threshold"])
+
+                if "reload_only" in trial:
+                    self.reload_only = trial["reload_only"]
+
+                if "cache" in trial:
+                    self.cache = trial["cache"]
+
+                if "cache_repeats" in trial:
+                    self.cache_repeats = trial["cache_repeats"]
+                    if type(self.cache_repeats) is not int or self.cache_repeats < 0:
+                        print("Error: cache_repeats must be non-negative integer.")
+                        sys.exit(1)
+
+                if "cache_max_entries" in trial:
+                    self.cache_max_entries = trial["cache_max_entries"]
+
+                if "cache_max_age" in trial:
+                    self.cache_max_age = trial["cache_max_age"]
+
                 # ------------------------
                 # monitoring
                 # ------------------------
@@ -120,37 +249,56 @@ class BaseConf:
 
                 if "monitoring_time" in monitoring:
                     self.monitoring_time = monitoring["monitoring_time"]
+                    if type(self.monitoring_time) not in (int, float) or self.monitoring_time <= 0:
+                        print("Error: monitoring_time must be positive number.")
+                        sys.exit(1)
                 else:
-                    self.monitoring_time = 10
+                    self.monitoring_time = Common.DEFAULT_MONITORING_TIME
+
+                if "monitoring_mode" in monitoring:
+                    self.monitoring_mode = monitoring["monitoring_mode"]
+                    if self.monitoring_mode not in Common.MONITORING_MODES:
+                        print("Error: monitoring_mode '{}' not supported.".format(self.monitoring_mode))
+                        sys.exit(1)
+
+                if "metrics_store" in monitoring:
+                    self.metrics_store = monitoring["metrics_store"]
+                    if self.metrics_store not in Common.METRICS_STORES:
+                        print("Error: metrics_store '{}' not supported.".format(self.metrics_store))
+                        sys.exit(1)
+                    if self.metrics_store == "parquet" and MetricsStore.available() == False:
+                        print("Error: metrics_store 'parquet' requires 'pyarrow' module.")
+                        sys.exit(1)
+
+                if "statements_top" in monitoring:
+                    self.statements_top = monitoring["statements_top"]
+                    if type(self.statements_top) is not int or self.statements_top < 0:
+                        print("Error: statements_top must be positive integer or 0.")
+                        sys.exit(1)
+
+                if "wait_event_interval" in monitoring:
+                    self.wait_event_interval = monitoring["wait_event_interval"]
+                    if type(self.wait_event_interval) not in (int, float) or self.wait_event_interval < 0:
+                        print("Error: wait_event_interval must be positive number or 0.")
+                        sys.exit(1)
+
+                if "latency_histogram" in monitoring:
+                    self.latency_histogram = monitoring["latency_histogram"]
 
                 # ------------------------
                 # postgresql_server
                 # ------------------------
-                pgsql_server = data["postgresql_server"]
-                if pgsql_server == None:
+                pgsql_servers = data["postgresql_server"]
+                if pgsql_servers == None:
                     print("Error: '{}' section not found.".format("postgresql_server"))
                     sys.exit(1)
 
-                keys = ["host", "hostuser", "port", "user", "db", "pg_ctl"]
-                for key in keys:
-                    if key in pgsql_server:
-                        self.pgsql_server[key] = pgsql_server[key]
-                    else:
-                        print("Error: '{}' key not found in [postgresql_server] section.".format(key))
-                        sys.exit(1)
-
-                keys = ["pgdata", "pgdata_backup"]
-                for key in keys:
-                    if key in pgsql_server:
-                        self.pgsql_server[key] = Common.set_dir(pgsql_server[key])
-                    else:
-                        print("Error: '{}' key not found in [postgresql_server] section.".format(key))
-                        sys.exit(1)
-
-                if "passwd" in pgsql_server:
-                    self.pgsql_server["passwd"] = pgsql_server["passwd"]
-                else:
-                    self.pgsql_server["passwd"] = None
+                # [postgresql_server] or an array of tables [[postgresql_server]]
+                if isinstance(pgsql_servers, dict):
+                    pgsql_servers = [pgsql_servers]
+                for pgsql_server in pgsql_servers:
+                    self.pgsql_servers += self._expand_clones(self._parse_pgsql_server(pgsql_server))
+                self.pgsql_server = self.pgsql_servers[0]
 
                 # ------------------------
                 # postgresql_conf
@@ -219,46 +367,45 @@ class BaseConf:
                 else:
                     target_benchmark = benchmark[self.target]
 
-                if "host" in target_benchmark:
-                    self.bench_conf["host"] = target_benchmark["host"]
-                else:
-                    self.bench_conf["host"] = "localhost"
+                self.bench_conf = self._parse_bench_conf(self.target, target_benchmark)
+                self.bench_confs = {self.target: self.bench_conf}
 
-                if "bindir" in target_benchmark:
-                    self.bench_conf["bindir"] = Common.set_dir(target_benchmark["bindir"])
-                else:
-                    print("Error: 'bindir' key not found in [benchmark.{}] section.".format(self.target))
+                if "scenario" in target_benchmark and "phases" in target_benchmark:
+                    print("Error: 'scenario' and 'phases' cannot be used together in [benchmark.{}] section.".format(self.target))
                     sys.exit(1)
 
-                if self.target == "sysbench":
-                    if "sb_table_size" in target_benchmark:
-                        self.bench_conf["sb_table_size"] = target_benchmark["sb_table_size"]
+                if "phases" in target_benchmark:
+                    phases = Phases(target_benchmark["phases"], self.target)
+                    tasks = phases.compile()
+                    if phases.targets() == [self.target]:
+                        self.bench_scenario = [task for [_, task] in tasks]
                     else:
-                        print("Error: 'sb_table_size' key not found in [benchmark.{}] section.".format(self.target))
-                        sys.exit(1)
+                        # Mixed scenario: [start, clients, duration, target, task]
+                        self.bench_scenario = [task[0:3] + [target, task] for [target, task] in tasks]
+                elif "scenario" in target_benchmark:
+                    self.bench_scenario = target_benchmark["scenario"]
+                else:
+                    print("Error: 'scenario' or 'phases' key not found in [benchmark.{}] section.".format(self.target))
+                    sys.exit(1)
 
-                    if "sb_tables" in target_benchmark:
-                        self.bench_conf["sb_tables"] = target_benchmark["sb_tables"]
-                    else:
-                        print("Error: 'sb_tables' key not found in [benchmark.{}] section.".format(self.target))
+                # The other benchmarks of the mixed scenario.
+                for target in self.get_targets():
+                    if target in self.bench_confs:
+                        continue
+                    if target not in Common.BENCHMARK_TARGETS:
+                        print("Error: '{}' not supported.".format(target))
                         sys.exit(1)
-
-                elif self.target == "pgbench":
-                    if "scale" in target_benchmark:
-                        self.bench_conf["scale"] = target_benchmark["scale"]
-                    else:
-                        print("Error: 'scale' key not found in [benchmark.{}] section.".format(self.target))
+                    if target not in benchmark:
+                        print("Error: '[benchmark.{}]' subsection not found in [benckmark] section.".format(target))
                         sys.exit(1)
+                    self.bench_confs[target] = self._parse_bench_conf(target, benchmark[target])
 
-                else:
-                    # never reached.
-                    sys.exit(1)
-
-                if "scenario" in target_benchmark:
-                    self.bench_scenario = target_benchmark["scenario"]
-                else:
-                    print("Error: 'scenario' key not found in [benchmark.{}] section.".format(self.target))
-                    sys.exit(1)
+                if "warmup" in target_benchmark:
+                    self.bench_warmup = target_benchmark["warmup"]
+                    if self.is_mixed():
+                        self.bench_warmup = [
+                            sc if self._is_mixed_task(sc) else sc[0:3] + [self.target, sc] for sc in self.bench_warmup
+                        ]
 
                 if "additional_monitor_items" in target_benchmark:
                     _additional_monitor_items = target_benchmark["additional_monitor_items"]
@@ -267,60 +414,485 @@ class BaseConf:
                 else:
                     self.additional_monitor_items = None
 
+                # ------------------------
+                # objectives (optional)
+                # ------------------------
+                if "objectives" in data:
+                    self._parse_objectives(data["objectives"])
+
             except FileNotFoundError as err:
                 print("Error: '{}' not found.".format(conf_file))
                 sys.exit(1)
 
+    """
+    # Returns True if the task is a task of the mixed scenario: [start, clients, duration, target, task].
+    """
+
+    def _is_mixed_task(self, sc):
+        return len(sc) == 5 and type(sc[3]) is str and isinstance(sc[4], list)
+
+    """
+    # Returns True if the scenario runs several benchmarks.
+    """
+
+    def is_mixed(self):
+        return len(self.bench_scenario) > 0 and all(self._is_mixed_task(sc) for sc in self.bench_scenario)
+
+    """
+    # Returns the benchmarks of the scenario; the target of the trial is the first.
+    """
+
+    def get_targets(self):
+        targets = [self.target]
+        if self.is_mixed():
+            for sc in self.bench_scenario:
+                if sc[3] not in targets:
+                    targets.append(sc[3])
+        return targets
+
+    """
+    # Returns the tasks of the target in the scenario and the warmup.
+    """
+
+    def _target_tasks(self, target):
+        tasks = []
+        for sc in self.bench_scenario + self.bench_warmup:
+            if self._is_mixed_task(sc):
+                if sc[3] == target:
+                    tasks.append(sc[4])
+            elif target == self.target:
+                tasks.append(sc)
+        return tasks
+
+    """
+    # Parses the [benchmark.<target>] section and returns the configuration of the benchmark.
+    """
+
+    def _parse_bench_conf(self, target, target_benchmark):
+        bench_conf = {}
+
+        if "host" in target_benchmark:
+            bench_conf["host"] = target_benchmark["host"]
+        else:
+            bench_conf["host"] = "localhost"
+
+        if "bindir" in target_benchmark:
+            bench_conf["bindir"] = Common.set_dir(target_benchmark["bindir"])
+        elif target not in ["native", "replay"]:
+            print("Error: 'bindir' key not found in [benchmark.{}] section.".format(target))
+            sys.exit(1)
+
+        if target == "sysbench":
+            if "sb_table_size" in target_benchmark:
+                bench_conf["sb_table_size"] = target_benchmark["sb_table_size"]
+            else:
+                print("Error: 'sb_table_size' key not found in [benchmark.{}] section.".format(target))
+                sys.exit(1)
+
+            if "sb_tables" in target_benchmark:
+                bench_conf["sb_tables"] = target_benchmark["sb_tables"]
+            else:
+                print("Error: 'sb_tables' key not found in [benchmark.{}] section.".format(target))
+                sys.exit(1)
+
+        elif target == "pgbench":
+            if "scale" in target_benchmark:
+                bench_conf["scale"] = target_benchmark["scale"]
+            else:
+                print("Error: 'scale' key not found in [benchmark.{}] section.".format(target))
+                sys.exit(1)
+
+        elif target == "native":
+            if "transactions" in target_benchmark:
+                bench_conf["transactions"] = target_benchmark["transactions"]
+            else:
+                print("Error: 'transactions' key not found in [benchmark.{}] section.".format(target))
+                sys.exit(1)
+
+            for key in ["variables", "setup", "teardown"]:
+                if key in target_benchmark:
+                    bench_conf[key] = target_benchmark[key]
+                else:
+                    bench_conf[key] = []
+
+        elif target == "replay":
+            if "source" in target_benchmark:
+                bench_conf["source"] = target_benchmark["source"]
+                if bench_conf["source"] not in Common.REPLAY_SOURCES:
+                    print("Error: source '{}' must be one of {}.".format(bench_conf["source"], Common.REPLAY_SOURCES))
+                    sys.exit(1)
+            else:
+                print("Error: 'source' key not found in [benchmark.{}] section.".format(target))
+                sys.exit(1)
+
+            if "workload" in target_benchmark:
+                bench_conf["workload"] = target_benchmark["workload"]
+            else:
+                print("Error: 'workload' key not found in [benchmark.{}] section.".format(target))
+                sys.exit(1)
+
+            bench_conf["capture_limit"] = target_benchmark.get("capture_limit", Common.DEFAULT_REPLAY_CAPTURE_LIMIT)
+            bench_conf["param_range"] = target_benchmark.get("param_range", Common.DEFAULT_REPLAY_PARAM_RANGE)
+            bench_conf["parameters"] = target_benchmark.get("parameters", [])
+
+        else:
+            # never reached.
+            sys.exit(1)
+
+        return bench_conf
+
+    """
+    # Returns True if a task of the scenario has latency_limit in its options table.
+    """
+
+    def _has_latency_limit(self):
+        for target in self.get_targets():
+            if target not in ["sysbench", "pgbench"]:
+                continue
+            for sc in self._target_tasks(target):
+                if isinstance(sc[-1], dict) and "latency_limit" in sc[-1]:
+                    return True
+        return False
+
+    """
+    # Checks the metric of an objective or a constraint.
+    """
+
+    def _check_metric(self, metric):
+        counter = Common.parse_counter_metric(metric)
+        if metric not in Common.OBJECTIVE_METRICS and counter == None:
+            print("Error: objective metric '{}' not supported.".format(metric))
+            sys.exit(1)
+        if metric == "late" and self._has_latency_limit() == False:
+            print("Error: objective metric 'late' requires 'latency_limit' in the options of a scenario task (sysbench or pgbench).")
+            sys.exit(1)
+        if metric == "cpu" and self.linux_monitoring == False:
+            print("Error: objective metric 'cpu' requires linux_monitoring.")
+            sys.exit(1)
+        if counter != None and counter[0] in ["iostat", "netstat"] and self.linux_monitoring == False:
+            print("Error: objective metric '{}' requires linux_monitoring.".format(metric))
+            sys.exit(1)
+
+    def _parse_objectives(self, objectives):
+        if "metrics" not in objectives and "constraints" not in objectives:
+            print("Error: 'metrics' key not found in [objectives] section.")
+            sys.exit(1)
+
+        percentiles = 0
+        for objective in objectives.get("metrics", []):
+            if len(objective) != 2:
+                print("Format Error: {}".format(objective))
+                sys.exit(1)
+            [metric, direction] = objective
+            self._check_metric(metric)
+            if direction not in ["maximize", "minimize"]:
+                print("Error: direction '{}' must be 'maximize' or 'minimize'.".format(direction))
+                sys.exit(1)
+            if metric in Common.LATENCY_PERCENTILES and self.latency_histogram == False:
+                # Without the histogram, sysbench reports one percentile (--percentile).
+                if self.target != "sysbench" or self.is_mixed() or metric not in ["latency_p95", "latency_p99"]:
+                    print("Error: objective metric '{}' requires latency_histogram.".format(metric))
+                    sys.exit(1)
+                percentiles += 1
+            self.objectives.append([metric, direction])
+
+        for constraint in objectives.get("constraints", []):
+            if len(constraint) != 3:
+                print("Format Error: {}".format(constraint))
+                sys.exit(1)
+            [metric, op, limit] = constraint
+            self._check_metric(metric)
+            if op not in ["<=", ">="]:
+                print("Error: operator '{}' must be '<=' or '>='.".format(op))
+                sys.exit(1)
+            if type(limit) not in [int, float]:
+                print("Value Error: limit must be a number:{}".format(constraint))
+                sys.exit(1)
+            if metric in Common.LATENCY_PERCENTILES and self.latency_histogram == False:
+                print("Error: constraint metric '{}' requires latency_histogram.".format(metric))
+                sys.exit(1)
+            self.constraints.append([metric, op, limit])
+
+        if len(self.constraints) > 0:
+            # optuna supports the constraints in TPESampler (constraints_func).
+            if self.sampling_mode != "TPE":
+                print("Error: constraints require sampling_mode 'TPE'.")
+                sys.exit(1)
+            if self.cache:
+                print("Error: constraints cannot be used with cache.")
+                sys.exit(1)
+
+        if percentiles > 1:
+            print("Error: only one of 'latency_p95' and 'latency_p99' can be used without latency_histogram.")
+            sys.exit(1)
+
+        if len(self.objectives) > 1:
+            if self.pruner != "none":
+                if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                    print("Notice: pruner is disabled in multi-objective tuning.")
+                self.pruner = "none"
+        elif len(self.objectives) == 1 and self.objectives[0] not in [["score", "maximize"], ["tps", "maximize"]]:
+            # The pruner compares the number of transactions executed so far, which
+            # only matches a maximized throughput.
+            if self.pruner != "none":
+                if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                    print("Notice: pruner is disabled unless the objective is 'score' or 'tps' maximized.")
+                self.pruner = "none"
+
+        if len(self.objectives) > 1:
+            if self.adaptive_repeats > 0:
+                if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                    print("Notice: adaptive_repeats is disabled in multi-objective tuning.")
+                self.adaptive_repeats = 0
+
+    def _parse_pgsql_server(self, pgsql_server):
+        _server = {}
+
+        keys = ["host", "hostuser", "port", "user", "db", "pg_ctl"]
+        for key in keys:
+            if key in pgsql_server:
+                _server[key] = pgsql_server[key]
+            else:
+                print("Error: '{}' key not found in [postgresql_server] section.".format(key))
+                sys.exit(1)
+
+        keys = ["pgdata", "pgdata_backup"]
+        for key in keys:
+            if key in pgsql_server:
+                _server[key] = Common.set_dir(pgsql_server[key])
+            else:
+                print("Error: '{}' key not found in [postgresql_server] section.".format(key))
+                sys.exit(1)
+
+        if "passwd" in pgsql_server:
+            _server["passwd"] = pgsql_server["passwd"]
+        else:
+            _server["passwd"] = None
+
+        if "pgdata_snapshot" in pgsql_server:
+            _server["pgdata_snapshot"] = pgsql_server["pgdata_snapshot"]
+        elif self.restore_method in ["zfs", "lvm"]:
+            print("Error: 'pgdata_snapshot' key not found in [postgresql_server] section, but restore_method '{}' requires it.".format(self.restore_method))
+            sys.exit(1)
+        else:
+            _server["pgdata_snapshot"] = None
+
+        if "pgdata_snapshot_size" in pgsql_server:
+            _server["pgdata_snapshot_size"] = pgsql_server["pgdata_snapshot_size"]
+        else:
+            _server["pgdata_snapshot_size"] = Common.DEFAULT_SNAPSHOT_SIZE
+
+        keys = ["clones", "clone_cpus", "clone_memory_max"]
+        for key in keys:
+            _server[key] = pgsql_server[key] if key in pgsql_server else None
+
+        if _server["clones"] != None:
+            if type(_server["clones"]) is not int or _server["clones"] < 1:
+                print("Error: 'clones' must be positive integer in [postgresql_server] section.")
+                sys.exit(1)
+            if self.restore_method in ["zfs", "lvm"]:
+                print("Error: restore_method '{}' cannot be used with 'clones'.".format(self.restore_method))
+                sys.exit(1)
+            if _server["clone_cpus"] != None and len(_server["clone_cpus"]) != _server["clones"]:
+                print("Error: 'clone_cpus' must have {} items.".format(_server["clones"]))
+                sys.exit(1)
+
+        return _server
+
+    """
+    # Expands a server with 'clones = K' into K cloned clusters.
+    # The clone k uses port (port + 1 + k) and the data directory (pgdata + ".clone<k>").
+    """
+
+    def _expand_clones(self, pgsql_server):
+        pgsql_server["clone"] = None
+        if pgsql_server["clones"] == None:
+            return [pgsql_server]
+
+        servers = []
+        for k in range(pgsql_server["clones"]):
+            _server = dict(pgsql_server)
+            _server["clone"] = k
+            _server["origin"] = pgsql_server
+            _server["port"] = pgsql_server["port"] + 1 + k
+            _server["pgdata"] = Common.set_dir(
+                pgsql_server["pgdata"].rstrip("/") + Common.CLONE_SUFFIX + str(k)
+            )
+            if pgsql_server["clone_cpus"] != None:
+                _server["clone_cpus"] = pgsql_server["clone_cpus"][k]
+            servers.append(_server)
+        return servers
+
     """
     Public methods
     """
 
-    def create_bench(self):
-        if self.target == "sysbench":
+    """
+    # Selects the PostgreSQL server used by create_pg(), create_bench(), etc.
+    """
+
+    def select_server(self, index):
+        self.pgsql_server = self.pgsql_servers[index]
+
+    """
+    # Selects the original cluster of the selected clone.
+    """
+
+    def select_origin(self):
+        origin = self.pgsql_server["origin"]
+        for key in ["passwd", "hostpasswd"]:
+            if key in self.pgsql_server:
+                origin[key] = self.pgsql_server[key]
+        self.pgsql_server = origin
+
+    """
+    # Returns the objectives ([[metric, direction], ...]).
+    """
+
+    def get_objectives(self):
+        if len(self.objectives) == 0:
+            return [["score", "maximize"]]
+        return self.objectives
+
+    """
+    # Returns the constraints ([[metric, op, limit], ...]).
+    """
+
+    def get_constraints(self):
+        return self.constraints
+
+    def get_directions(self):
+        return [direction for [_, direction] in self.get_objectives()]
+
+    def is_multi_objective(self):
+        return len(self.get_objectives()) > 1
+
+    """
+    # Returns the latency percentile reported by sysbench for the objective ("latency_p95"
+    # or "latency_p99"), or None (sysbench default: 95, or the histogram is used).
+    """
+
+    def get_latency_percentile(self):
+        if self.latency_histogram:
+            return None
+        for [metric, _] in self.get_objectives():
+            if metric == "latency_p95":
+                return 95
+            elif metric == "latency_p99":
+                return 99
+        return None
+
+    def create_bench(self, target=None):
+        if target == None:
+            target = self.target
+        bench_conf = self.bench_confs[target]
+        if target == "sysbench":
             return Sysbench(
                 self.pgsql_server["host"],
                 self.pgsql_server["port"],
                 self.pgsql_server["user"],
                 self.pgsql_server["passwd"],
                 self.pgsql_server["db"],
-                self.bench_conf["sb_table_size"],
-                self.bench_conf["sb_tables"],
-                self.bench_conf["bindir"],
+                bench_conf["sb_table_size"],
+                bench_conf["sb_tables"],
+                bench_conf["bindir"],
             )
-        elif self.target == "pgbench":
+        elif target == "pgbench":
             return Pgbench(
                 self.pgsql_server["host"],
                 self.pgsql_server["port"],
                 self.pgsql_server["user"],
                 self.pgsql_server["db"],
-                self.bench_conf["scale"],
-                self.bench_conf["bindir"],
+                bench_conf["scale"],
+                bench_conf["bindir"],
+            )
+        elif target == "native":
+            return Native(
+                self.pgsql_server["host"],
+                self.pgsql_server["port"],
+                self.pgsql_server["user"],
+                self.pgsql_server["passwd"],
+                self.pgsql_server["db"],
+                bench_conf["transactions"],
+                bench_conf["variables"],
+                bench_conf["setup"],
+                bench_conf["teardown"],
+            )
+        elif target == "replay":
+            return Replay(
+                self.pgsql_server["host"],
+                self.pgsql_server["port"],
+                self.pgsql_server["user"],
+                self.pgsql_server["passwd"],
+                self.pgsql_server["db"],
+                bench_conf["source"],
+                bench_conf["workload"],
+                bench_conf["capture_limit"],
+                bench_conf["param_range"],
+                bench_conf["parameters"],
             )
         else:
-            print("Error: self.target:'{}' not allowed.".format(self.target))
+            print("Error: target:'{}' not allowed.".format(target))
             sys.exit(1)
 
     def create_bench_scenario(self):
-        if self.target == "sysbench":
+        if self.is_mixed():
+            return MixedScenario(
+                self.pgsql_server["host"],
+                self.pgsql_server["port"],
+                self.pgsql_server["user"],
+                self.pgsql_server["passwd"],
+                self.pgsql_server["db"],
+                {target: self._create_bench_scenario(target) for target in self.get_targets()},
+            )
+        return self._create_bench_scenario(self.target)
+
+    def _create_bench_scenario(self, target):
+        bench_conf = self.bench_confs[target]
+        if target == "sysbench":
             return SysbenchScenario(
                 self.pgsql_server["host"],
                 self.pgsql_server["port"],
                 self.pgsql_server["user"],
                 self.pgsql_server["passwd"],
                 self.pgsql_server["db"],
-                self.bench_conf["bindir"],
+                bench_conf["bindir"],
+                self.get_latency_percentile(),
             )
-        elif self.target == "pgbench":
+        elif target == "pgbench":
             return PgbenchScenario(
                 self.pgsql_server["host"],
                 self.pgsql_server["port"],
                 self.pgsql_server["user"],
                 self.pgsql_server["passwd"],
                 self.pgsql_server["db"],
-                self.bench_conf["bindir"],
+                bench_conf["bindir"],
+                self._target_tasks(target),
+            )
+        elif target == "native":
+            return NativeScenario(
+                self.pgsql_server["host"],
+                self.pgsql_server["port"],
+                self.pgsql_server["user"],
+                self.pgsql_server["passwd"],
+                self.pgsql_server["db"],
+                bench_conf["transactions"],
+                bench_conf["variables"],
+            )
+        elif target == "replay":
+            return ReplayScenario(
+                self.pgsql_server["host"],
+                self.pgsql_server["port"],
+                self.pgsql_server["user"],
+                self.pgsql_server["passwd"],
+                self.pgsql_server["db"],
+                bench_conf["source"],
+                bench_conf["workload"],
+                bench_conf["param_range"],
+                bench_conf["parameters"],
             )
         else:
-            print("Error: self.target:'{}' not allowed.".format(self.target))
+            print("Error: target:'{}' not allowed.".format(target))
             sys.exit(1)
 
     """
@@ -328,20 +900,28 @@ class BaseConf:
     """
 
     def check(self):
-        if self.target == "sysbench":
-            return self._sysbench_check(self)
-        elif self.target == "pgbench":
-            return self._pgbench_check(self)
-        else:
-            print("Error: self.target:'{}' not allowed.".format(self.target))
-            sys.exit(1)
+        ret = None
+        for target in self.get_targets():
+            if target == "sysbench":
+                _ret = self._sysbench_check(self)
+            elif target == "pgbench":
+                _ret = self._pgbench_check(self)
+            elif target in ["native", "replay"]:
+                _ret = self._native_check(self, target=target)
+            else:
+                print("Error: target:'{}' not allowed.".format(target))
+                sys.exit(1)
+            if ret == None:
+                ret = _ret
+        return ret
 
     @check_template
     def _sysbench_check(self):
+        bench_conf = self.bench_confs["sysbench"]
 
         print("\nSysbench check start.")
         print("(1) Sysbench bindir:")
-        _sysbench_path = self.bench_conf["bindir"] + "sysbench"
+        _sysbench_path = bench_conf["bindir"] + "sysbench"
         if os.path.isfile(_sysbench_path) == False:
             print("Error: '{}' not found.".format(_sysbench_path))
             sys.exit(1)
@@ -349,28 +929,28 @@ class BaseConf:
             print("ok.")
         print("Sysbench check finished.\n")
 
-        sysbench = self.create_bench()
+        sysbench = self.create_bench("sysbench")
         print("")
         num_sbtest, num_sbtest_row = sysbench.check()
 
         print("\nSysbench configuration check start.")
 
         print("(1) Sysbench configuration:")
-        if self.bench_conf["sb_table_size"] > num_sbtest_row:
+        if bench_conf["sb_table_size"] > num_sbtest_row:
             print(
                 "Error: 'bench_conf['sb_table_size']={}' must be less than or equal to {}".format(
-                    str(self.bench_conf["sb_table_size"]), str(num_sbtest_row)
+                    str(bench_conf["sb_table_size"]), str(num_sbtest_row)
                 )
             )
             sys.exit(1)
 
-        if self.bench_conf["sb_tables"] > num_sbtest:
+        if bench_conf["sb_tables"] > num_sbtest:
             print("Error: 'bench_conf['sb_tables']' must be less than or equal to {}".format(str(num_sbtest)))
             sys.exit(1)
         print("ok.")
 
         print("(2) Sysbench scenario:")
-        for s in self.bench_scenario:
+        for s in self._target_tasks("sysbench"):
             # command
             if sysbench.command_type_check(s[3]) == False:
                 print("Error: '{}' not supported in scenario['sb_command']".format(s[3]))
@@ -393,10 +973,11 @@ class BaseConf:
 
     @check_template
     def _pgbench_check(self):
+        bench_conf = self.bench_confs["pgbench"]
 
         print("\npgbench check start.")
         print("(1) pgbench bindir:")
-        _pgbench_path = self.bench_conf["bindir"] + "pgbench"
+        _pgbench_path = bench_conf["bindir"] + "pgbench"
         if os.path.isfile(_pgbench_path) == False:
             print("Error: '{}' not found.".format(_pgbench_path))
             sys.exit(1)
@@ -404,17 +985,17 @@ class BaseConf:
             print("ok.")
         print("pgbench check finished.\n")
 
-        pgbench = self.create_bench()
+        pgbench = self.create_bench("pgbench")
         print("")
         num_pgbench_accounts = pgbench.check()
 
         print("\npgbench configuration check start.")
 
         print("(1) pgbench configuration:")
-        if self.bench_conf["scale"] * 100000 > num_pgbench_accounts:
+        if bench_conf["scale"] * 100000 > num_pgbench_accounts:
             print(
                 "Error: 'pgbench_conf['scale']={}' must be less than or equal to {}".format(
-                    str(self.bench_conf["scale"]),
+                    str(bench_conf["scale"]),
                     str(int(num_pgbench_accounts / 100000)),
                 )
             )
@@ -424,3 +1005,23 @@ class BaseConf:
         print("pgbench configuration check finished.")
 
         del pgbench
+
+    @check_template
+    def _native_check(self, target="native"):
+
+        native = self.create_bench(target)
+        print("")
+        native.check()
+
+        print("\n{} configuration check start.".format(target))
+
+        print("(1) {} scenario:".format(target))
+        for s in self._target_tasks(target):
+            if len(s) != 4:
+                print("Format Error: {}".format(s))
+                sys.exit(1)
+        print("ok.")
+
+        print("{} configuration check finished.".format(target))
+
+        del native
@@ -4,3 +4,9 @@ from .sysbench_scenario import SysbenchScenario
 from .pgbench import Pgbench
 from .pgbench_scenario import PgbenchScenario
 from .scenario import Scenario
+from .native import Native
+from .native_scenario import NativeScenario
+from .replay import Replay
+from .replay_scenario import ReplayScenario
+from .phases import Phases
+from .mixed_scenario import MixedScenario
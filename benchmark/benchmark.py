@@ -5,6 +5,8 @@ benchmark.py
 """
 
 from abc import ABC, ABCMeta, abstractmethod
+import subprocess
+import sys
 
 class Benchmark(metaclass=ABCMeta):
 
@@ -37,3 +39,42 @@ class Benchmark(metaclass=ABCMeta):
     @abstractmethod
     def get_col_name(self):
         pass
+
+    @classmethod
+    @abstractmethod
+    def parse_progress(self):
+        pass
+
+    @classmethod
+    @abstractmethod
+    def get_progress_col_name(self):
+        pass
+
+    """
+    # Runs the command (argv, without a shell) and reads its output line by line,
+    # instead of buffering it until exit.
+    # Interval reports recognized by parse_progress() are passed to `progress`
+    # as they arrive; the other lines (the summary) are returned.
+    """
+
+    def stream(self, cmd, progress=None):
+        lines = []
+        try:
+            process = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+            )
+        except OSError as e:
+            print("Error: {}".format(str(e)))
+            sys.exit(1)
+        for line in process.stdout:
+            ret = self.parse_progress(line)
+            if ret == None:
+                lines.append(line.rstrip("\n"))
+            elif progress != None:
+                progress(ret)
+
+        if process.wait() != 0:
+            print("Error: {}".format("\n".join(lines)))
+            sys.exit(1)
+
+        return lines
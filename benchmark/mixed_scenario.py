@@ -0,0 +1,155 @@
+"""
+mixed_scenario.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import sys
+
+from .scenario import Scenario
+
+sys.path.append("..")
+from utils import Common, Log
+
+
+"""
+# Scenario of several benchmarks (e.g. sysbench and pgbench phases in one trial).
+#
+# Each task is [start, clients, duration, target, task of the target].
+# create_job() returns the job of the task on the scenario of the target, and the results
+# and the progress reports are laid out in the columns of all targets
+# ("<target>.<column>"), so that they can be written in one csv file.
+"""
+
+
+class MixedScenario(Scenario):
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        db,
+        scenarios,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.db = db
+        # {target: scenario}
+        self.scenarios = scenarios
+
+    def _pad(self, target, values, col_name):
+        row = []
+        for t in self.scenarios:
+            n = len(col_name(self.scenarios[t]))
+            row += values if t == target else [None] * n
+        return row
+
+    def _unpad(self, target, row):
+        offset = 1  # "target"
+        for t in self.scenarios:
+            n = len(self.scenarios[t].get_col_name())
+            if t == target:
+                return row[offset : offset + n]
+            offset += n
+
+    """
+    # Groups the messages by target, with the results and the tasks of the targets.
+    """
+
+    def _group(self, msg_list):
+        groups = {}
+        for [no, sc, result] in msg_list:
+            target = sc[3]
+            groups.setdefault(target, []).append([no, sc[4], self._unpad(target, result)])
+        return groups
+
+    """
+    Public methods
+    """
+
+    """
+    #  Analyzes the scenario and returns the following metrics:
+    #     total_duration, required_max_connections, total_connections.
+    """
+
+    @Scenario.check_scenario_template
+    def check_scenario(self, sc):
+        if len(sc) != 5 or sc[3] not in self.scenarios or isinstance(sc[4], list) == False:
+            print("Format Error: {}".format(sc))
+            sys.exit(1)
+        if sc[0:3] != sc[4][0:3]:
+            print("Value Error: start, clients and duration must be the same as the task:{}".format(sc))
+            sys.exit(1)
+        self.scenarios[sc[3]].check_scenario([sc[4]])
+
+    """
+    # Score function: sum of the scores of the targets.
+    # With `steady_state`, steady_score() is used instead (sum of the mean tps).
+    """
+
+    def score(self, msg_list):
+        _score = 0
+        for target, msgs in self._group(msg_list).items():
+            _score += self.scenarios[target].score(msgs)
+        return _score
+
+    """
+    # Returns the metric computed from the results of the targets, or None if not supported.
+    #   "tps", "late": sum of the metrics of the targets.
+    #   "latency_avg": mean of the average latency [ms] of each scenario.
+    #   "latency_percentile": max of the metrics of the targets.
+    """
+
+    def get_metric(self, name, msg_list):
+        values = []
+        for target, msgs in self._group(msg_list).items():
+            value = self.scenarios[target].get_metric(name, msgs)
+            if value == None:
+                if name == "late":
+                    continue
+                return None
+            values.append([value, len(msgs)])
+        if len(values) == 0:
+            return None
+        if name in ["tps", "late"]:
+            return sum(v for [v, _] in values)
+        elif name == "latency_avg":
+            return sum(v * n for [v, n] in values) / sum(n for [_, n] in values)
+        return max(v for [v, _] in values)
+
+    """
+    # Returns column name list
+    """
+
+    def get_col_name(self):
+        cols = ["target"]
+        for t in self.scenarios:
+            cols += ["{}.{}".format(t, c) for c in self.scenarios[t].get_col_name()]
+        return cols
+
+    def get_progress_col_name(self):
+        cols = ["target", "tps"]
+        for t in self.scenarios:
+            cols += ["{}.{}".format(t, c) for c in self.scenarios[t].get_progress_col_name()]
+        return cols
+
+    """
+    # Returns the job of one of the scenario, run by the Supervisor in play()@scenario.py
+    """
+
+    def create_job(self, no, sc, progress=False, report_interval=Common.REPORT_INTERVAL, histogram=False):
+        target = sc[3]
+        scenario = self.scenarios[target]
+
+        job = scenario.create_job(no, sc[4], progress, report_interval, histogram)
+        job.sc = sc
+        job.map_result = lambda result: [target] + self._pad(target, result, lambda s: s.get_col_name())
+
+        tps_index = scenario.get_progress_col_name().index("tps")
+        job.map_progress = lambda record: [target, record[tps_index]] + self._pad(
+            target, record, lambda s: s.get_progress_col_name()
+        )
+        return job
@@ -0,0 +1,421 @@
+"""
+native.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import asyncio, itertools
+import random, re
+import sys, time
+
+from .benchmark import Benchmark
+
+sys.path.append("..")
+from utils import Common, Psql, Log, Histogram
+
+try:
+    import psycopg
+except:
+    pass
+
+
+"""
+# Built-in load generator.
+#
+# Runs a transaction mix over `clients` asyncio connections in one process,
+# instead of shelling out to an external binary.
+#
+# transactions: list of [name, weight, [statement, ...]].
+#               Each transaction is chosen with the probability proportional
+#               to its weight, and its statements run in one transaction block.
+# variables:    list of [name, min, max]. Each variable is a random integer in
+#               [min, max], drawn per transaction and bound to "%(name)s" in the statements.
+#
+# If `rate` > 0, the transactions are scheduled open-loop: they arrive at
+# `rate` per second (Poisson arrivals) regardless of the response, and the
+# latency is measured from the scheduled time, so queueing delay is included.
+# Otherwise, each client issues the next transaction as soon as the previous one
+# has finished (closed-loop).
+"""
+
+
+class Native(Benchmark):
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        db,
+        transactions,
+        variables=None,
+        setup=None,
+        teardown=None,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.db = db
+        self.transactions = transactions
+        self.variables = variables if variables != None else []
+        self.setup = setup if setup != None else []
+        self.teardown = teardown if teardown != None else []
+
+        self.histogram = None
+
+    def _conninfo(self):
+        _conn = "host='{}' port={} user='{}' dbname='{}'".format(
+            str(self.host), self.port, str(self.user), str(self.db)
+        )
+        if self.password != None:
+            _conn += " password='{}'".format(str(self.password))
+        return _conn
+
+    """
+    # Returns the list of the statement ids: "<transaction name>.<statement no>".
+    """
+
+    def _statement_ids(self):
+        ids = []
+        for [name, _, statements] in self.transactions:
+            for i in range(len(statements)):
+                ids.append("{}.{}".format(name, i))
+        return ids
+
+    """
+    # Returns the parameters bound to the statements of the transaction.
+    """
+
+    def _params(self, name):
+        return {v[0]: random.randint(v[1], v[2]) for v in self.variables}
+
+    def _exec_statements(self, statements, label):
+        psql = Psql(self.host, self.port, self.user, self.db, self.password)
+        if psql.connect() == False:
+            sys.exit(1)
+        with psql.connection.cursor() as cur:
+            for _sql in statements:
+                if Log.info <= Common.DEFAULT_LOG_LEVEL:
+                    print("Info: {} '{}'".format(label, _sql))
+                if psql.exec_sql(cur, _sql) == False:
+                    psql.close()
+                    sys.exit(1)
+        psql.close()
+        del psql
+
+    """
+    # Client coroutine.
+    #
+    # Takes the scheduled time of a transaction from `arrivals` (open-loop),
+    # or uses the current time (closed-loop), and runs the transaction.
+    """
+
+    async def _client(self, stats, deadline, arrivals):
+        try:
+            conn = await psycopg.AsyncConnection.connect(self._conninfo(), autocommit=True)
+        except psycopg.Error as e:
+            stats["connection_errors"] += 1
+            if Log.error <= Common.DEFAULT_LOG_LEVEL:
+                print("Error: Could not connect to '{}'".format(self.host))
+                print(e)
+            return
+
+        names = [t[0] for t in self.transactions]
+        cum_weights = list(itertools.accumulate(t[1] for t in self.transactions))
+        statements = {t[0]: t[2] for t in self.transactions}
+
+        try:
+            while True:
+                if arrivals != None:
+                    scheduled = await arrivals.get()
+                    if scheduled == None:
+                        break
+                else:
+                    scheduled = time.monotonic()
+                    if scheduled >= deadline:
+                        break
+
+                name = random.choices(names, cum_weights=cum_weights)[0]
+                params = self._params(name)
+                latencies = []
+                try:
+                    async with conn.transaction():
+                        for _sql in statements[name]:
+                            _start = time.monotonic()
+                            await conn.execute(_sql, params if "%(" in _sql else None)
+                            latencies.append(time.monotonic() - _start)
+                except psycopg.Error as e:
+                    stats["errors"] += 1
+                    if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+                        print("Debug1: transaction '{}' failed: {}".format(name, e))
+                    if conn.closed:
+                        break
+                    continue
+
+                latency = time.monotonic() - scheduled
+                stats["transactions"] += 1
+                stats["latency_sum"] += latency
+                if stats["histogram"] != None:
+                    stats["histogram"].record(latency * 1000000)
+                for i, l in enumerate(latencies):
+                    _id = "{}.{}".format(name, i)
+                    stats["statements"][_id][0] += 1
+                    stats["statements"][_id][1] += l
+        finally:
+            await conn.close()
+
+    """
+    # Schedules the transactions at `rate` per second until the deadline,
+    # and then stops the clients.
+    """
+
+    async def _scheduler(self, arrivals, clients, rate, deadline):
+        scheduled = time.monotonic()
+        while True:
+            scheduled += random.expovariate(rate)
+            if scheduled >= deadline:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            arrivals.put_nowait(scheduled)
+
+        # Discard the transactions not started yet, and stop the clients.
+        while arrivals.empty() == False:
+            arrivals.get_nowait()
+        for _ in range(clients):
+            arrivals.put_nowait(None)
+
+    """
+    # Reports the progress every `report_interval` seconds.
+    """
+
+    async def _reporter(self, stats, clients, start, progress, report_interval):
+        prev = [0, 0.0, 0]
+        while True:
+            await asyncio.sleep(report_interval)
+            cur = [stats["transactions"], stats["latency_sum"], stats["errors"]]
+            tx = cur[0] - prev[0]
+            latency = (cur[1] - prev[1]) / tx * 1000 if tx > 0 else 0.0
+            progress(
+                [
+                    round(time.monotonic() - start, 1),
+                    clients,
+                    tx / report_interval,
+                    latency,
+                    (cur[2] - prev[2]) / report_interval,
+                ]
+            )
+            prev = cur
+
+    async def _run(self, clients, duration, rate, progress, report_interval, histogram):
+        stats = {
+            "transactions": 0,
+            "errors": 0,
+            "connection_errors": 0,
+            "latency_sum": 0.0,
+            "histogram": Histogram() if histogram else None,
+            "statements": {_id: [0, 0.0] for _id in self._statement_ids()},
+        }
+        start = time.monotonic()
+        deadline = start + duration
+
+        arrivals = asyncio.Queue() if rate > 0 else None
+        tasks = [asyncio.create_task(self._client(stats, deadline, arrivals)) for _ in range(clients)]
+        if arrivals != None:
+            tasks.append(asyncio.create_task(self._scheduler(arrivals, clients, rate, deadline)))
+        reporter = None
+        if progress != None:
+            reporter = asyncio.create_task(self._reporter(stats, clients, start, progress, report_interval))
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # Also when cancelled by the supervisor.
+            if reporter != None:
+                reporter.cancel()
+
+        stats["elapsed"] = time.monotonic() - start
+        return stats
+
+    """
+    Public methods
+    """
+
+    """
+    # Runs the setup statements
+    """
+
+    def create_bench(self):
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: Run the setup statements.")
+        if len(self.setup) == 0:
+            print("Error: 'setup' key not found in [benchmark.native] section.")
+            sys.exit(1)
+        self._exec_statements(self.setup, "setup")
+        return True
+
+    """
+    # Runs the teardown statements
+    """
+
+    def drop_bench(self):
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: Run the teardown statements.")
+        if len(self.teardown) == 0:
+            print("Error: 'teardown' key not found in [benchmark.native] section.")
+            sys.exit(1)
+        self._exec_statements(self.teardown, "teardown")
+        return True
+
+    """
+    # Checks the transaction mix
+    """
+
+    def check(self):
+
+        print("Native-Check Start.")
+
+        print("(1) Check psycopg module:")
+        if "psycopg" not in sys.modules:
+            print("Error: target 'native' requires 'psycopg' (version 3) module.")
+            sys.exit(1)
+        print("ok.")
+
+        print("(2) Check transactions:")
+        if len(self.transactions) == 0:
+            print("Error: 'transactions' is empty.")
+            sys.exit(1)
+        names = [v[0] for v in self.variables]
+        for t in self.transactions:
+            if len(t) != 3 or type(t[0]) is not str or type(t[2]) is not list or len(t[2]) == 0:
+                print("Format Error: {}".format(t))
+                sys.exit(1)
+            if type(t[1]) not in (int, float) or t[1] <= 0:
+                print("Value Error: weight must be positive number:{}".format(t))
+                sys.exit(1)
+            for _sql in t[2]:
+                for name in re.findall(r"%\((\w+)\)s", _sql):
+                    if name not in names:
+                        print("Error: variable '{}' in '{}' not found in 'variables'.".format(name, _sql))
+                        sys.exit(1)
+        for v in self.variables:
+            if len(v) != 3 or type(v[1]) is not int or type(v[2]) is not int or v[1] > v[2]:
+                print("Format Error: {}".format(v))
+                sys.exit(1)
+        print("ok.")
+
+        print("(3) Access to {}:".format(self.host))
+        psql = Psql(self.host, self.port, self.user, self.db, self.password)
+        if psql.connect() == False:
+            sys.exit(1)
+        psql.close()
+        print("ok.")
+
+        print("Native-Check finished.")
+
+        return len(self.transactions)
+
+    """
+    # Runs the transaction mix in the running event loop (see Supervisor), and returns the result.
+    #
+    # clients: number of connections.
+    # duration: [sec].
+    # rate: target transactions per second of all clients (open-loop), or 0 (closed-loop).
+    """
+
+    async def arun(
+        self,
+        clients,
+        duration,
+        rate=0,
+        progress=None,
+        report_interval=Common.REPORT_INTERVAL,
+        histogram=False,
+    ):
+        if "psycopg" not in sys.modules:
+            print("Error: 'psycopg' (version 3) module not found.")
+            sys.exit(1)
+
+        stats = await self._run(clients, duration, rate, progress, report_interval, histogram)
+
+        if stats["connection_errors"] > 0:
+            print("Error: {} of {} clients could not connect.".format(stats["connection_errors"], clients))
+            sys.exit(1)
+
+        self.histogram = stats["histogram"]
+
+        if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+            print("Debug1: native stats=", stats)
+
+        return self.parse_result(stats)
+
+    """
+    # Runs the transactions and returns the result.
+    """
+
+    def run(
+        self,
+        clients,
+        duration,
+        rate=0,
+        progress=None,
+        report_interval=Common.REPORT_INTERVAL,
+        histogram=False,
+    ):
+        return asyncio.run(self.arun(clients, duration, rate, progress, report_interval, histogram))
+
+    """
+    # The native driver reports the progress directly, not via command output.
+    """
+
+    def parse_progress(self, line):
+        return None
+
+    """
+    # Returns column name list of the progress report
+    """
+
+    def get_progress_col_name(self):
+        return [
+            "elapsed",
+            "clients",
+            "tps",
+            "latency_average",
+            "errors_per_sec",
+        ]
+
+    """
+    # Returns result as a list
+    #
+    # The average latency [ms] of each statement follows the summary columns.
+    """
+
+    def parse_result(self, stats):
+        tx = stats["transactions"]
+        elapsed = stats["elapsed"]
+        ret = [
+            tx,
+            stats["errors"],
+            tx / elapsed if elapsed > 0 else 0.0,
+            stats["latency_sum"] / tx * 1000 if tx > 0 else 0.0,
+            elapsed,
+        ]
+        for _id in self._statement_ids():
+            [count, latency_sum] = stats["statements"][_id]
+            ret.append(latency_sum / count * 1000 if count > 0 else None)
+        return ret
+
+    """
+    # Returns column name list
+    """
+
+    def get_col_name(self):
+        return [
+            "number_of_transactions",
+            "number_of_errors",
+            "tps",
+            "latency_average",
+            "elapsed",
+        ] + ["latency_average[{}]".format(_id) for _id in self._statement_ids()]
@@ -0,0 +1,135 @@
+"""
+native_scenario.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import sys
+
+from .native import Native
+from .scenario import Scenario
+from .supervisor import CoroutineJob
+
+sys.path.append("..")
+from utils import Common, Log, Monitor
+
+
+class NativeScenario(Native, Scenario):
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        db,
+        transactions,
+        variables=None,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.db = db
+        self.transactions = transactions
+        self.variables = variables if variables != None else []
+        self.setup = []
+        self.teardown = []
+
+        self.histogram = None
+
+    """
+    Public methods
+    """
+
+    """
+    #  Analyzes the scenario and returns the following metrics:
+    #     total_duration, required_max_connections, total_connections.
+    """
+
+    @Scenario.check_scenario_template
+    def check_scenario(self, sc):
+        if len(sc) != 4:
+            print("Format Error: {}".format(sc))
+            sys.exit(1)
+        if type(sc[0]) is not int or sc[0] < 0:
+            print("Value Error: wait must be positive integer:{}".format(sc))
+            sys.exit(1)
+        if type(sc[1]) is not int or sc[1] < 0:
+            print("Value Error: clients must be positive integer:{}".format(sc))
+            sys.exit(1)
+        if type(sc[2]) is not int or sc[2] < 0:
+            print("Value Error: duration must be positive integer:{}".format(sc))
+            sys.exit(1)
+        if type(sc[3]) not in (int, float) or sc[3] < 0:
+            print("Value Error: rate must be positive number or 0:{}".format(sc))
+            sys.exit(1)
+
+    """
+    # Score function
+    #
+    # Note: Based on the data obtained, an appropriate score can be set.
+    #       This function returns total number of executed transactions.
+    #       With `steady_state`, steady_score() is used instead, and the score is
+    #       the sum of the mean tps, not a number of transactions.
+    """
+
+    def score(self, msg_list):
+        _score = 0
+        for item in msg_list:
+            sc_result = item[2]
+            _score += int(sc_result[0])
+        return _score
+
+    """
+    # Returns the metric computed from the results of the scenarios, or None if not supported.
+    #   "tps": sum of the tps of each scenario.
+    #   "latency_avg": mean of the average latency [ms] of each scenario.
+    """
+
+    def get_metric(self, name, msg_list):
+        values = []
+        for [_, _, sc_result] in msg_list:
+            if name == "tps":
+                values.append(float(sc_result[2]))
+            elif name == "latency_avg":
+                values.append(float(sc_result[3]))
+            else:
+                return None
+        if len(values) == 0:
+            return None
+        if name == "tps":
+            return sum(values)
+        return sum(values) / len(values)
+
+    """
+    # Returns the driver run by bench().
+    """
+
+    def create_driver(self):
+        return Native(
+            self.host,
+            self.port,
+            self.user,
+            self.password,
+            self.db,
+            self.transactions,
+            self.variables,
+        )
+
+    """
+    # Returns the job of one of the scenario, run by the Supervisor in play()@scenario.py
+    # The driver runs in the event loop of the Supervisor.
+    """
+
+    def create_job(self, no, sc, progress=False, report_interval=Common.REPORT_INTERVAL, histogram=False):
+        [wait, clients, duration, rate] = sc
+
+        nb = self.create_driver()
+        return CoroutineJob(
+            no,
+            sc,
+            int(wait),
+            int(duration),
+            nb,
+            lambda report: nb.arun(int(clients), int(duration), float(rate), report, report_interval, histogram=histogram),
+        )
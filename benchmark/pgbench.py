@@ -6,15 +6,21 @@ pgbench.py
 
 import subprocess
 import psycopg2
-import sys, os
+import sys, os, glob, shutil, tempfile
 
 from .benchmark import Benchmark
 
 sys.path.append("..")
-from utils import Common, Psql, Log
+from utils import Common, Psql, Log, Histogram
 
 
 class Pgbench(Benchmark):
+    # Options of the scenario options table.
+    OPTIONS = ["scripts", "protocol", "jobs", "rate", "latency_limit", "max_tries"]
+    PROTOCOLS = ["simple", "extended", "prepared"]
+    # Number of the commands (including meta commands) of the builtin scripts.
+    BUILTIN_SCRIPTS = {"tpcb-like": 11, "simple-update": 9, "select-only": 2}
+
     def __init__(
         self,
         host,
@@ -32,10 +38,82 @@ class Pgbench(Benchmark):
         self.pgbench_bindir = Common.set_dir(pgbench_bindir)
 
 
+    """
+    # Returns the pgbench options (argv) of the scenario options table:
+    #   scripts:   list of [script, weight]; script is a file or "builtin:<name>" (-f/-b script@weight).
+    #   protocol:  "simple", "extended" or "prepared" (-M).
+    #   jobs:      number of threads (-j).
+    #   rate:      target rate [tps] (-R).
+    #   latency_limit: transactions above the limit [ms] are counted as late (--latency-limit);
+    #              with rate, the transactions that would already be late are skipped.
+    #   max_tries: max number of tries to run a transaction (--max-tries).
+    # With scripts, -r reports the latencies of each script and statement.
+    """
+
+    def _options(self, options):
+        opts = []
+        if options == None:
+            return opts
+        for [script, weight] in options.get("scripts", []):
+            if script.startswith("builtin:"):
+                opts += ["-b", "{}@{}".format(script[len("builtin:") :], weight)]
+            else:
+                opts += ["-f", "{}@{}".format(script, weight)]
+        if "scripts" in options:
+            opts.append("-r")
+        if "protocol" in options:
+            opts += ["-M", str(options["protocol"])]
+        if "jobs" in options:
+            opts += ["-j", str(options["jobs"])]
+        if "rate" in options:
+            opts += ["-R", str(options["rate"])]
+        if "latency_limit" in options:
+            opts.append("--latency-limit={}".format(options["latency_limit"]))
+        if "max_tries" in options:
+            opts.append("--max-tries={}".format(options["max_tries"]))
+        return opts
+
     """
     Public methods
     """
 
+    """
+    # Returns the name of the script used in the column names.
+    """
+
+    @staticmethod
+    def script_name(script):
+        if script.startswith("builtin:"):
+            return script
+        return os.path.basename(script)
+
+    """
+    # Returns the number of the commands of the script reported by -r:
+    # each meta command and each SQL command terminated by ';'.
+    """
+
+    @staticmethod
+    def script_commands(script):
+        if script.startswith("builtin:"):
+            return Pgbench.BUILTIN_SCRIPTS.get(script[len("builtin:") :], 0)
+        if os.path.isfile(script) == False:
+            return 0
+        num = 0
+        pending = False
+        with open(script) as f:
+            for line in f:
+                line = line.strip()
+                if line == "" or line.startswith("--"):
+                    continue
+                if line.startswith("\\"):
+                    num += 1
+                    continue
+                num += line.count(";")
+                pending = line.endswith(";") == False
+        if pending:
+            num += 1
+        return num
+
     """
     # Initializes pgbench
     """
@@ -72,25 +150,27 @@ class Pgbench(Benchmark):
         ```
         """
 
-        cmd = "{}pgbench -i -h {} -U {} -p {} -s {} {}".format(
-            self.pgbench_bindir,
-            str(self.host),
-            str(self.user),
-            self.port,
-            self.pgbench_scale,
-            self.db,
-        )
+        cmd = [
+            "{}pgbench".format(self.pgbench_bindir),
+            "-i",
+            "-h", str(self.host),
+            "-U", str(self.user),
+            "-p", str(self.port),
+            "-s", str(self.pgbench_scale),
+            str(self.db),
+        ]
 
         if Log.info <= Common.DEFAULT_LOG_LEVEL:
-            print("Info: command '{}'".format(str(cmd)))
+            print("Info: command '{}'".format(" ".join(cmd)))
 
         try:
-            completed_process = subprocess.run(
-                cmd, shell=True, check=True, capture_output=True
-            )
+            completed_process = subprocess.run(cmd, check=True, capture_output=True)
         except subprocess.CalledProcessError as e:
             print("Error: {}".format(str(e.stdout)))
             sys.exit(1)
+        except OSError as e:
+            print("Error: {}".format(str(e)))
+            sys.exit(1)
 
         return True
 
@@ -216,14 +296,19 @@ class Pgbench(Benchmark):
         return num_pgbench_accounts
 
     """
-    # Runs pgbench
+    # Returns the command line (argv) of pgbench.
+    # If `histogram` is True, the per-transaction logs are written in a temporary
+    # directory, which is read and removed by finish().
     """
 
-    def run(
+    def command(
         self,
         pgbench_threads,
         pgbench_time,
-        pgbench_scale=None,
+        progress=False,
+        report_interval=Common.REPORT_INTERVAL,
+        histogram=False,
+        options=None,
     ):
 
         """
@@ -239,36 +324,197 @@ class Pgbench(Benchmark):
         -t, --transactions=NUM   number of transactions each client runs (default: 10)
         -T, --time=NUM           duration of benchmark test in seconds
         --max-tries=NUM          max number of tries to run transaction (default: 1)
+        -b, --builtin=NAME[@W]   add builtin script NAME weighted at W (default: 1)
+        -f, --file=FILENAME[@W]  add script FILENAME weighted at W (default: 1)
+        -j, --jobs=NUM           number of threads (default: 1)
+        -M, --protocol=simple|extended|prepared
+        -r, --report-per-command report latencies, failures, and retries per command
+        -L, --latency-limit=NUM  count transactions lasting more than NUM ms as late
         """
 
-        cmd = "{}pgbench -h {} -U {} -p {} -s {} -T {} -c {} --no-vacuum {}".format(
-            self.pgbench_bindir,
-            str(self.host),
-            str(self.user),
-            self.port,
-            self.pgbench_scale,
-            pgbench_time,
-            pgbench_threads,
-            self.db,
-        )
+        cmd = [
+            "{}pgbench".format(self.pgbench_bindir),
+            "-h", str(self.host),
+            "-U", str(self.user),
+            "-p", str(self.port),
+            "-s", str(self.pgbench_scale),
+            "-T", str(pgbench_time),
+            "-c", str(pgbench_threads),
+            "--no-vacuum",
+        ]
+
+        self.opts = self._options(options)
+        cmd += self.opts
+
+        if progress == True:
+            # -P reports the progress to stderr.
+            cmd += ["-P", str(report_interval)]
+
+        self.log_dir = None
+        if histogram == True:
+            # Per-transaction log, read into the histogram and removed after the run.
+            self.log_dir = tempfile.mkdtemp(prefix="pgbench_log.")
+            cmd.append("--log")
+            cmd.append("--log-prefix={}".format(os.path.join(self.log_dir, "pgbench_log")))
+
+        cmd.append(str(self.db))
 
         if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
-            print("Debug1: command '{}'".format(str(cmd)))
+            print("Debug1: command '{}'".format(" ".join(cmd)))
+        return cmd
 
-        try:
-            completed_process = subprocess.run(
-                cmd, shell=True, check=True, capture_output=True
-            )
-            lines = completed_process.stdout.decode("utf-8").splitlines()
-        except subprocess.CalledProcessError as e:
-            print("Error: {}".format(str(e.stdout)))
-            sys.exit(1)
+    """
+    # Returns the result parsed from the output lines of pgbench.
+    # The latency histogram is stored in `self.histogram`, and the reports of the
+    # scripts (-r) in `self.script_stats`.
+    """
+
+    def finish(self, lines):
+        self.histogram = None
+        if self.log_dir != None:
+            self.histogram = self.parse_log(os.path.join(self.log_dir, "pgbench_log"))
+            self.cleanup()
 
         if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
-            print("Debug1: sysbench lines=", lines)
+            print("Debug1: pgbench lines=", lines)
+
+        self.script_stats = self.parse_scripts(lines) if "-r" in self.opts else None
 
         return self.parse_result(lines)
 
+    """
+    # Removes the per-transaction logs, e.g. of a killed pgbench.
+    """
+
+    def cleanup(self):
+        if self.log_dir != None:
+            shutil.rmtree(self.log_dir, ignore_errors=True)
+            self.log_dir = None
+
+    """
+    # Runs pgbench
+    """
+
+    def run(
+        self,
+        pgbench_threads,
+        pgbench_time,
+        pgbench_scale=None,
+        progress=None,
+        report_interval=Common.REPORT_INTERVAL,
+        histogram=False,
+        options=None,
+    ):
+        cmd = self.command(pgbench_threads, pgbench_time, progress != None, report_interval, histogram, options)
+        lines = self.stream(cmd, progress)
+        return self.finish(lines)
+
+    """
+    # Parses a progress report of -P and returns it as a list
+    # (see get_progress_col_name()), or None if the line is not a progress report.
+    #
+    # progress: 5.0 s, 448.8 tps, lat 22.280 ms stddev 5.003, 0 failed
+    # progress: 5.0 s, 99.8 tps, lat 3.190 ms stddev 1.082, lag 0.120 ms, 0 skipped
+    """
+
+    def parse_progress(self, line):
+        l = line.replace(",", " ").split()
+        if len(l) < 5 or l[0] != "progress:" or l[4] != "tps":
+            return None
+
+        def value(key, offset=1):
+            if key not in l:
+                return None
+            return float(l[l.index(key) + offset])
+
+        try:
+            elapsed = float(l[1])
+            tps = float(l[3])
+            latency = value("lat")
+            stddev = value("stddev")
+            lag = value("lag")
+            failed = value("failed", -1)
+            skipped = value("skipped", -1)
+        except (ValueError, IndexError):
+            return None
+        return [elapsed, tps, latency, stddev, lag, failed, skipped]
+
+    """
+    # Returns column name list of the progress report
+    """
+
+    def get_progress_col_name(self):
+        return [
+            "elapsed",
+            "tps",
+            "latency_average",
+            "latency_stddev",
+            "lag",
+            "failed",
+            "skipped",
+        ]
+
+    """
+    # Reads the per-transaction logs of --log and returns Histogram of the latency.
+    #
+    # client_id transaction_no time script_no time_epoch time_us [schedule_lag]
+    # 0 199 2241 0 1175850568 995598
+    #
+    # `time` is the latency [us], or "failed"/"skipped".
+    """
+
+    def parse_log(self, log_prefix):
+        histogram = Histogram()
+        for filename in glob.glob(log_prefix + ".*"):
+            with open(filename) as f:
+                for line in f:
+                    l = line.split()
+                    if len(l) < 3 or l[2].isdigit() == False:
+                        continue
+                    histogram.record(int(l[2]))
+        return histogram
+
+    """
+    # Parses the report of -r and returns a list of {"tps", "latency", "statements"}
+    # in the order of the scripts. With one script, pgbench reports the statement
+    # latencies only, and "tps" and "latency" are None.
+    #
+    # SQL script 1: <builtin: TPC-B (sort of)>
+    #  - weight: 1 (targets 50.0% of total)
+    #  - 2939 transactions (49.8% of total, tps = 292.925232)
+    #  - latency average = 22.283 ms
+    #  - statement latencies in milliseconds and failures:
+    #          0.002           0  \\set aid random(1, 100000 * :scale)
+    #          0.295           0  BEGIN;
+    """
+
+    def parse_scripts(self, lines):
+        scripts = []
+        in_statements = False
+        for line in lines:
+            l = line.replace(",", " ").replace(")", " ").split()
+            if l == []:
+                continue
+            if l[0] == "SQL" and l[1] == "script":
+                scripts.append({"tps": None, "latency": None, "statements": []})
+                in_statements = False
+            elif l[0] == "statement" or (l[0] == "-" and "statement" in l):
+                if len(scripts) == 0:
+                    scripts.append({"tps": None, "latency": None, "statements": []})
+                in_statements = True
+            elif l[0] == "-" and len(scripts) > 0:
+                in_statements = False
+                if "tps" in l:
+                    scripts[-1]["tps"] = float(l[l.index("tps") + 2])
+                elif "latency" in l and "average" in l:
+                    scripts[-1]["latency"] = float(l[l.index("average") + 2])
+            elif in_statements:
+                try:
+                    scripts[-1]["statements"].append(float(l[0]))
+                except ValueError:
+                    in_statements = False
+        return scripts
+
     """
     # Returns result as a list
     """
@@ -290,9 +536,14 @@ class Pgbench(Benchmark):
         latency average = 22.280 ms
         initial connection time = 69.648 ms
         tps = 448.828707 (without initial connection time)
+
+        With -R and --latency-limit:
+        number of transactions skipped: 12 (0.134%)
+        number of transactions above the 50.0 ms latency limit: 30/8988 (0.334%)
         """
 
         num_tx = latency_avg = init_conn = tps = None
+        skipped = late = None
 
         for l in lines:
             l = l.split()
@@ -300,16 +551,21 @@ class Pgbench(Benchmark):
                 continue
 
             if l[0] == "number":
-                if l[2] == "transactions":
+                # Not "number of transactions skipped/retried/above the latency limit".
+                if l[2] == "transactions" and l[3] == "actually":
                     num_tx = l[5]
-            elif l[0] == "latency":
+                elif l[2] == "transactions" and l[3] == "skipped:":
+                    skipped = l[4]
+                elif l[2] == "transactions" and l[3] == "above":
+                    late = l[9].split("/")[0]
+            elif l[0] == "latency" and l[1] == "average":
                 latency_avg = l[3]
             elif l[0] == "initial":
                 init_conn = l[4]
             elif l[0] == "tps":
                 tps = l[2]
 
-        return [num_tx, latency_avg, init_conn, tps]
+        return [num_tx, latency_avg, init_conn, tps, skipped, late]
 
     """
     # Returns column name list
@@ -321,6 +577,8 @@ class Pgbench(Benchmark):
             "latency_average",
             "initial_connection_time",
             "tps",
+            "number_of_skipped",
+            "number_of_late",
         ]
 
 
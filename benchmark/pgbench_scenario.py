@@ -6,10 +6,11 @@ pgbench_scenario.py
 
 import queue
 import threading
-import time, sys
+import os, time, sys
 
 from .pgbench import Pgbench
 from .scenario import Scenario
+from .supervisor import CommandJob
 
 sys.path.append("..")
 from utils import Common, Log, Monitor
@@ -24,6 +25,7 @@ class PgbenchScenario(Pgbench, Scenario):
         password,
         db,
         pgbench_bindir,
+        scenario=None,
     ):
         self.host = host
         self.port = port
@@ -32,6 +34,14 @@ class PgbenchScenario(Pgbench, Scenario):
         self.db = db
         self.pgbench_bindir = Common.set_dir(pgbench_bindir)
 
+        # Custom scripts of the scenario: list of [script, number of commands].
+        self.scripts = []
+        for sc in scenario if scenario != None else []:
+            if len(sc) > 4 and isinstance(sc[4], dict):
+                for [script, _] in sc[4].get("scripts", []):
+                    if script not in [s[0] for s in self.scripts]:
+                        self.scripts.append([script, Pgbench.script_commands(script)])
+
 
     """
     Public methods
@@ -44,7 +54,7 @@ class PgbenchScenario(Pgbench, Scenario):
 
     @Scenario.check_scenario_template
     def check_scenario(self, sc):
-        if len(sc) != 4:
+        if len(sc) != 4 and len(sc) != 5:
             print("Format Error: {}".format(sc))
             sys.exit(1)
         if type(sc[0]) is not int or sc[0] < 0:
@@ -59,12 +69,54 @@ class PgbenchScenario(Pgbench, Scenario):
         if type(sc[3]) is not int or sc[3] < 0:
             print("Value Error: pgbench_scale must be positive integer:{}".format(sc))
             sys.exit(1)
+        if len(sc) == 5:
+            self._check_options(sc)
+
+    def _check_options(self, sc):
+        options = sc[4]
+        if isinstance(options, dict) == False:
+            print("Value Error: options must be a table:{}".format(sc))
+            sys.exit(1)
+        for key in options:
+            if key not in Pgbench.OPTIONS:
+                print("Value Error: option '{}' not supported:{}".format(key, sc))
+                sys.exit(1)
+        for item in options.get("scripts", []):
+            if len(item) != 2 or type(item[0]) is not str or type(item[1]) is not int or item[1] < 0:
+                print("Value Error: scripts must be a list of [script, weight]:{}".format(sc))
+                sys.exit(1)
+            if item[0].startswith("builtin:"):
+                if item[0][len("builtin:") :] not in Pgbench.BUILTIN_SCRIPTS:
+                    print("Value Error: builtin script '{}' not found:{}".format(item[0], sc))
+                    sys.exit(1)
+            elif os.path.isfile(item[0]) == False:
+                print("Error: script '{}' not found:{}".format(item[0], sc))
+                sys.exit(1)
+        if "protocol" in options and options["protocol"] not in Pgbench.PROTOCOLS:
+            print("Value Error: protocol must be one of {}:{}".format(Pgbench.PROTOCOLS, sc))
+            sys.exit(1)
+        if "jobs" in options and (type(options["jobs"]) is not int or options["jobs"] < 1 or options["jobs"] > sc[1]):
+            print("Value Error: jobs must be positive integer less than or equal to threads:{}".format(sc))
+            sys.exit(1)
+        if "rate" in options and (type(options["rate"]) not in (int, float) or options["rate"] <= 0):
+            print("Value Error: rate must be positive number:{}".format(sc))
+            sys.exit(1)
+        if "latency_limit" in options and (type(options["latency_limit"]) not in (int, float) or options["latency_limit"] <= 0):
+            print("Value Error: latency_limit must be positive number:{}".format(sc))
+            sys.exit(1)
+        if "max_tries" in options and (type(options["max_tries"]) is not int or options["max_tries"] < 0):
+            print("Value Error: max_tries must be positive integer or 0:{}".format(sc))
+            sys.exit(1)
 
     """
     # Score function
     #
     # Note: Based on the data obtained, an appropriate score can be set.
-    #       This function returns total number of executed transactions.
+    #       This function returns total number of executed transactions,
+    #       excluding the late transactions of the tasks with latency_limit.
+    #       (The skipped transactions are not counted as executed.)
+    #       With `steady_state`, steady_score() is used instead, and the score is
+    #       the sum of the mean tps, not a number of transactions.
     """
 
     def score(self, msg_list):
@@ -82,27 +134,82 @@ class PgbenchScenario(Pgbench, Scenario):
             sc_ret_latency = float(sc_result[1])
             sc_ret_connection_time = float(sc_result[2])
             sc_ret_tps = float(sc_result[3])
+            # At a fixed rate, the number of transactions is (almost) the same for every
+            # configuration, so the transactions above the latency limit are not counted.
+            sc_ret_late = int(sc_result[5]) if sc_result[5] != None else 0
 
-            _score += sc_ret_transactions
+            _score += sc_ret_transactions - sc_ret_late
 
         return _score
 
     """
-    # Runs one of the scnenario and returns result.
-    # This is invoked in the play()@scenario.py
+    # Returns the metric computed from the results of the scenarios, or None if not supported.
+    #   "tps": sum of the tps of each scenario.
+    #   "latency_avg": mean of the average latency [ms] of each scenario.
+    #   "late": total number of the late and skipped transactions of the scenarios with latency_limit.
     """
 
-    def bench(self, no, queue, sc):
-        [wait, threads, duration, scale] = sc
+    def get_metric(self, name, msg_list):
+        values = []
+        for [_, _, sc_result] in msg_list:
+            if name == "tps":
+                values.append(float(sc_result[3]))
+            elif name == "latency_avg":
+                values.append(float(sc_result[1]))
+            elif name == "late":
+                if sc_result[5] != None:
+                    values.append(int(sc_result[5]) + int(sc_result[4] if sc_result[4] != None else 0))
+            else:
+                return None
+        if len(values) == 0:
+            return None
+        if name in ["tps", "late"]:
+            return sum(values)
+        return sum(values) / len(values)
 
-        if Log.info <= Common.DEFAULT_LOG_LEVEL:
-            print("Info: sysbench thread[{}] created.".format(no))
+    """
+    # Returns column name list: the columns of pgbench, followed by the tps and
+    # latency [ms] of each custom script and the latency [ms] of each statement.
+    """
+
+    def get_col_name(self):
+        cols = Pgbench.get_col_name(self)
+        for [script, commands] in self.scripts:
+            name = Pgbench.script_name(script)
+            cols += ["tps[{}]".format(name), "latency_average[{}]".format(name)]
+            cols += ["latency_average[{}.{}]".format(name, i) for i in range(commands)]
+        return cols
+
+    """
+    # Returns the values of the script columns of the result.
+    """
+
+    def _script_result(self, sc, ret, script_stats):
+        values = {}
+        options = sc[4] if len(sc) > 4 else {}
+        for i, [script, _] in enumerate(options.get("scripts", [])):
+            if script_stats == None or i >= len(script_stats):
+                break
+            values[script] = script_stats[i]
+            if len(options["scripts"]) == 1:
+                # pgbench reports the statement latencies only.
+                values[script]["tps"] = ret[3]
+                values[script]["latency"] = ret[1]
+
+        row = []
+        for [script, commands] in self.scripts:
+            v = values.get(script, {"tps": None, "latency": None, "statements": []})
+            row += [v["tps"], v["latency"]]
+            row += [v["statements"][i] if i < len(v["statements"]) else None for i in range(commands)]
+        return row
 
-        if int(wait) > 0:
-            time.sleep(int(wait))
+    """
+    # Returns the job of one of the scenario, run by the Supervisor in play()@scenario.py
+    """
 
-        if Log.info <= Common.DEFAULT_LOG_LEVEL:
-            print("Info: sysbench thread[{}] started.".format(no))
+    def create_job(self, no, sc, progress=False, report_interval=Common.REPORT_INTERVAL, histogram=False):
+        [wait, threads, duration, scale] = sc[0:4]
+        options = sc[4] if len(sc) > 4 else None
 
         pb = Pgbench(
             self.host,
@@ -112,10 +219,10 @@ class PgbenchScenario(Pgbench, Scenario):
             scale,
             self.pgbench_bindir,
         )
-        ret = pb.run(int(threads), int(duration), int(scale))
+        cmd = pb.command(int(threads), int(duration), progress, report_interval, histogram=histogram, options=options)
 
-        if Log.info <= Common.DEFAULT_LOG_LEVEL:
-            print("Info: sysbench thread[{}] terminated.".format(no))
+        def finish(lines):
+            ret = pb.finish(lines)
+            return ret + self._script_result(sc, ret, pb.script_stats)
 
-        del pb
-        queue.put([no, sc, ret])
+        return CommandJob(no, sc, int(wait), int(duration), pb, cmd, finish, pb.cleanup)
@@ -0,0 +1,223 @@
+"""
+phases.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import sys
+
+sys.path.append("..")
+from utils import Common, Log
+
+
+"""
+# Scenario phases.
+#
+# A phase is a table of the following keys:
+#
+#   name:       Name of the phase, referred to by `after`.
+#   target:     Benchmark of the phase ("sysbench", "pgbench", "native" or "replay";
+#               default: the target of the trial).
+#   start:      Start time [sec] of the phase (default: 0), or
+#   after:      Name (or list of names) of the phases; the phase starts when all of them
+#               have ended (barrier), plus `delay` [sec].
+#   clients:    Constant number of clients during `duration` [sec], or
+#   ramp:       [from, to]: the number of clients changes linearly from `from` to `to`
+#               during `duration` [sec], in `ramp_steps` steps, or
+#   steps:      [[duration, clients], ...]: step function of the number of clients.
+#   args:       The rest of the task of the target, e.g. [command, table_size, tables]
+#               for sysbench, [scale] for pgbench and [rate] for native.
+#               A phase with `ramp` or `steps` cannot have a rate, since each of its
+#               tasks would run at the rate.
+#
+# The phases are compiled into the tasks of the scenario ([start, clients, duration, *args]).
+# A change of the number of clients starts or ends only the difference, so the number
+# of connections at any time is exactly that of the phases, and check_scenario() computes
+# the exact peak connections and duration.
+"""
+
+
+class Phases:
+    KEYS = ["name", "target", "start", "after", "delay", "clients", "ramp", "ramp_steps", "steps", "duration", "args"]
+
+    def __init__(self, phases, default_target):
+        self.phases = phases
+        self.default_target = default_target
+        self.names = {}
+        self.starts = {}
+
+        for i, phase in enumerate(self.phases):
+            self._check(phase)
+            if "name" in phase:
+                if phase["name"] in self.names:
+                    print("Error: phase name '{}' is duplicated.".format(phase["name"]))
+                    sys.exit(1)
+                self.names[phase["name"]] = i
+
+        for phase in self.phases:
+            for name in self._after(phase):
+                if name not in self.names:
+                    print("Error: phase '{}' not found:{}".format(name, phase))
+                    sys.exit(1)
+
+    def _check(self, phase):
+        if isinstance(phase, dict) == False:
+            print("Format Error: phase must be a table:{}".format(phase))
+            sys.exit(1)
+        for key in phase:
+            if key not in self.KEYS:
+                print("Error: key '{}' not supported in phase:{}".format(key, phase))
+                sys.exit(1)
+        if len([key for key in ["clients", "ramp", "steps"] if key in phase]) != 1:
+            print("Error: phase must have one of 'clients', 'ramp' and 'steps':{}".format(phase))
+            sys.exit(1)
+        if "start" in phase and "after" in phase:
+            print("Error: phase cannot have both 'start' and 'after':{}".format(phase))
+            sys.exit(1)
+        if "steps" in phase:
+            if "duration" in phase:
+                print("Error: 'duration' is given by 'steps':{}".format(phase))
+                sys.exit(1)
+            for step in phase["steps"]:
+                if len(step) != 2 or type(step[0]) is not int or step[0] <= 0 or type(step[1]) is not int or step[1] < 0:
+                    print("Value Error: steps must be a list of [duration, clients]:{}".format(phase))
+                    sys.exit(1)
+        else:
+            if type(phase.get("duration")) is not int or phase["duration"] <= 0:
+                print("Value Error: duration must be positive integer:{}".format(phase))
+                sys.exit(1)
+        if "clients" in phase and (type(phase["clients"]) is not int or phase["clients"] < 0):
+            print("Value Error: clients must be positive integer:{}".format(phase))
+            sys.exit(1)
+        if "ramp" in phase:
+            ramp = phase["ramp"]
+            if len(ramp) != 2 or type(ramp[0]) is not int or type(ramp[1]) is not int or ramp[0] < 0 or ramp[1] < 0:
+                print("Value Error: ramp must be [from, to]:{}".format(phase))
+                sys.exit(1)
+            steps = phase.get("ramp_steps", Common.DEFAULT_RAMP_STEPS)
+            if type(steps) is not int or steps < 1 or phase["duration"] < steps:
+                print("Value Error: ramp_steps must be positive integer less than or equal to duration:{}".format(phase))
+                sys.exit(1)
+        for key in ["start", "delay"]:
+            if key in phase and (type(phase[key]) is not int or phase[key] < 0):
+                print("Value Error: {} must be positive integer:{}".format(key, phase))
+                sys.exit(1)
+        if isinstance(phase.get("args", []), list) == False:
+            print("Value Error: args must be a list:{}".format(phase))
+            sys.exit(1)
+        if ("ramp" in phase or "steps" in phase) and self._has_rate(phase):
+            # Each of the stacked tasks would run at the rate, which multiplies the offered load.
+            print("Error: rate cannot be used in a phase with 'ramp' or 'steps':{}".format(phase))
+            sys.exit(1)
+
+    """
+    # Returns True if the args of the phase set a rate: the options table of sysbench
+    # and pgbench, or the rate (or speed) of native and replay.
+    """
+
+    def _has_rate(self, phase):
+        args = phase.get("args", [])
+        for arg in args:
+            if isinstance(arg, dict) and arg.get("rate", 0) != 0:
+                return True
+        target = phase.get("target", self.default_target)
+        return target in ["native", "replay"] and len(args) > 0 and args[0] != 0
+
+    def _after(self, phase):
+        after = phase.get("after", [])
+        return [after] if isinstance(after, str) else after
+
+    """
+    # Returns the step function of the phase: [[duration, clients], ...].
+    """
+
+    def _levels(self, phase):
+        if "steps" in phase:
+            return phase["steps"]
+        if "clients" in phase:
+            return [[phase["duration"], phase["clients"]]]
+
+        [_from, _to] = phase["ramp"]
+        n = phase.get("ramp_steps", Common.DEFAULT_RAMP_STEPS)
+        duration = phase["duration"]
+        levels = []
+        for k in range(n):
+            clients = _to if n == 1 else round(_from + (_to - _from) * k / (n - 1))
+            d = duration // n if k < n - 1 else duration - duration // n * (n - 1)
+            levels.append([d, clients])
+        return levels
+
+    def _start(self, i, visiting=()):
+        if i in self.starts:
+            return self.starts[i]
+        if i in visiting:
+            print("Error: phases depend on each other:{}".format(self.phases[i]))
+            sys.exit(1)
+
+        phase = self.phases[i]
+        after = self._after(phase)
+        if len(after) == 0:
+            start = phase.get("start", 0)
+        else:
+            start = max(self._end(self.names[name], visiting + (i,)) for name in after)
+        start += phase.get("delay", 0)
+
+        self.starts[i] = start
+        return start
+
+    def _end(self, i, visiting=()):
+        return self._start(i, visiting) + sum(d for [d, _] in self._levels(self.phases[i]))
+
+    """
+    Public methods
+    """
+
+    """
+    # Returns the targets of the phases.
+    """
+
+    def targets(self):
+        targets = []
+        for phase in self.phases:
+            target = phase.get("target", self.default_target)
+            if target not in targets:
+                targets.append(target)
+        return targets
+
+    """
+    # Compiles the phases and returns a list of [target, task].
+    """
+
+    def compile(self):
+        tasks = []
+        for i, phase in enumerate(self.phases):
+            target = phase.get("target", self.default_target)
+            args = phase.get("args", [])
+
+            t = self._start(i)
+            stack = []  # [start, clients] of the running tasks
+            running = 0
+
+            def close(start, clients, end):
+                if clients > 0 and end > start:
+                    tasks.append([target, [start, clients, end - start] + args])
+
+            for [duration, clients] in self._levels(phase):
+                # End the latest tasks until the number of clients does not exceed the level,
+                # and start the difference.
+                while running > clients:
+                    [s, c] = stack.pop()
+                    close(s, c, t)
+                    running -= c
+                if running < clients:
+                    stack.append([t, clients - running])
+                    running = clients
+                t += duration
+            for [s, c] in stack:
+                close(s, c, t)
+
+        tasks.sort(key=lambda task: task[1][0])
+
+        if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+            print("Debug1: phases compiled into tasks=", tasks)
+        return tasks
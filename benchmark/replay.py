@@ -0,0 +1,481 @@
+"""
+replay.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import asyncio, csv, io, json, re, struct
+import os, random, sys, time
+from datetime import datetime
+
+from .native import Native
+
+sys.path.append("..")
+from utils import Common, Psql, Log, Histogram
+
+try:
+    import psycopg
+except:
+    pass
+
+
+"""
+# Workload replay.
+#
+# source = "pg_stat_statements":
+#   The 'create' command captures the top `capture_limit` statements of
+#   pg_stat_statements (by calls) into `workload` (json). They are replayed as
+#   a mix weighted by calls, in the same manner as the native target. The parameters
+#   ($1, $2, ...) are random integers in `param_range`, or in the ranges given
+#   in `parameters` for the queryid.
+#
+# source = "csvlog":
+#   `workload` is a csvlog of the server with log_min_duration_statement = 0
+#   (or log_statement = 'all'). The statements are replayed in the logged order
+#   and timing, scaled by `speed`. A session is bound to a free client until it has
+#   no statement queued and is not in a transaction (see _Sessions), so that the
+#   transactions of different sessions never interleave on a connection.
+#   The log is scanned once to build the index (`workload`.idx: relative time,
+#   session no, offset and length of each statement), and the statements are
+#   read from the log by offset while replaying, so that a log of any size
+#   is never loaded into memory.
+"""
+
+# csvlog columns
+CSVLOG_LOG_TIME = 0
+CSVLOG_SESSION_ID = 5
+CSVLOG_MESSAGE = 13
+CSVLOG_DETAIL = 14
+
+# Index record: relative time [sec], session no, offset and length of the record.
+INDEX_RECORD = struct.Struct("<dIQI")
+
+
+class _Sessions:
+    """
+    # Binds the sessions of the csvlog to the clients, like a pooler in transaction mode.
+    #
+    # A session runs on one client until it has no statement queued and the connection
+    # is not in a transaction; then the client takes the next session waiting for a
+    # client, or becomes free. The statements of a waiting session are kept in order.
+    """
+
+    def __init__(self, queues):
+        self.queues = queues
+        self.free = list(range(len(queues)))
+        self.bound = {}  # {session: client}
+        self.owner = {}  # {client: session}
+        self.pending = [0] * len(queues)
+        self.waiting = {}  # {session: [item, ...]} in the order of arrival
+
+    def _bind(self, session, client, items):
+        self.bound[session] = client
+        self.owner[client] = session
+        for item in items:
+            self.pending[client] += 1
+            self.queues[client].put_nowait(item)
+
+    """
+    # Queues the statement (item) of the session.
+    """
+
+    def dispatch(self, session, item):
+        if session in self.bound:
+            self._bind(session, self.bound[session], [item])
+        elif session in self.waiting:
+            self.waiting[session].append(item)
+        elif len(self.free) > 0:
+            self._bind(session, self.free.pop(0), [item])
+        else:
+            self.waiting[session] = [item]
+
+    """
+    # Called by the client after each statement; releases the session if it has
+    # no statement queued and `in_transaction` is False.
+    """
+
+    def done(self, client, in_transaction):
+        self.pending[client] -= 1
+        if self.pending[client] > 0 or in_transaction:
+            return
+        del self.bound[self.owner.pop(client)]
+        if len(self.waiting) > 0:
+            session = next(iter(self.waiting))
+            self._bind(session, client, self.waiting.pop(session))
+        else:
+            self.free.append(client)
+
+    """
+    # Discards the statements not started yet.
+    """
+
+    def clear(self):
+        self.waiting = {}
+        for queue in self.queues:
+            while queue.empty() == False:
+                queue.get_nowait()
+
+
+class Replay(Native):
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        db,
+        source,
+        workload,
+        capture_limit=Common.DEFAULT_REPLAY_CAPTURE_LIMIT,
+        param_range=Common.DEFAULT_REPLAY_PARAM_RANGE,
+        parameters=None,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.db = db
+        self.source = source
+        self.workload = workload
+        self.capture_limit = capture_limit
+        self.param_range = param_range
+        # {queryid: [[min, max], ...]}
+        self.parameters = {str(p[0]): p[1] for p in parameters} if parameters != None else {}
+
+        self.variables = []
+        self.transactions = []
+        self.generators = {}
+        self.histogram = None
+
+        if self.source == "pg_stat_statements" and os.path.isfile(self.workload):
+            self._load_workload()
+
+    """
+    # Loads the captured statements as the transaction mix.
+    # "$n" is rewritten to "%(pn)s", and "%" to "%%" for the parameter binding.
+    """
+
+    def _load_workload(self):
+        with open(self.workload) as f:
+            statements = json.load(f)
+
+        for [queryid, calls, query] in statements:
+            name = str(queryid)
+            numbers = sorted(set(int(n) for n in re.findall(r"\$(\d+)", query)))
+            if len(numbers) > 0:
+                query = re.sub(r"\$(\d+)\b", r"%(p\1)s", query.replace("%", "%%"))
+            ranges = self.parameters.get(name, [])
+            self.generators[name] = []
+            for n in numbers:
+                [_min, _max] = ranges[n - 1] if n <= len(ranges) else self.param_range
+                self.generators[name].append(["p{}".format(n), _min, _max])
+            self.transactions.append([name, max(int(calls), 1), [query]])
+
+    """
+    # The parameters are passed as strings, so that the server infers their types.
+    """
+
+    def _params(self, name):
+        return {g[0]: str(random.randint(g[1], g[2])) for g in self.generators[name]}
+
+    def _index_file(self):
+        return self.workload + ".idx"
+
+    """
+    # Parses a csvlog record (bytes) and returns the row, or None.
+    """
+
+    def _parse_record(self, record):
+        rows = list(csv.reader(io.StringIO(record.decode("utf-8", "replace"))))
+        if len(rows) == 0 or len(rows[0]) <= CSVLOG_DETAIL:
+            return None
+        return rows[0]
+
+    """
+    # Returns the statement of the row, or None if the row is not a statement.
+    #
+    # duration: 0.050 ms  statement: SELECT 1;
+    # duration: 0.050 ms  execute <unnamed>: SELECT ... WHERE aid = $1
+    #   (detail) parameters: $1 = '10'
+    """
+
+    def _statement(self, row):
+        m = re.match(r"(?:duration: [\d.]+ ms\s+)?(statement|execute [^:]*): (.*)", row[CSVLOG_MESSAGE], re.S)
+        if m == None:
+            return None
+        _sql = m.group(2)
+        detail = row[CSVLOG_DETAIL]
+        if m.group(1).startswith("execute") and detail.startswith("parameters: "):
+            params = dict(re.findall(r"\$(\d+) = ('(?:[^']|'')*'|NULL)", detail))
+            _sql = re.sub(r"\$(\d+)\b", lambda x: params.get(x.group(1), x.group(0)), _sql)
+        return _sql
+
+    def _timestamp(self, log_time):
+        # e.g. "2025-01-01 10:00:00.123 UTC"
+        return datetime.strptime(log_time[:23], "%Y-%m-%d %H:%M:%S.%f").timestamp()
+
+    """
+    # Scans the csvlog once and writes the index of the statements,
+    # unless the index is newer than the log. Returns the number of statements.
+    """
+
+    def _build_index(self):
+        index_file = self._index_file()
+        if os.path.isfile(index_file) and os.stat(index_file).st_mtime >= os.stat(self.workload).st_mtime:
+            return os.stat(index_file).st_size // INDEX_RECORD.size
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: Build index of '{}'.".format(self.workload))
+
+        sessions = {}
+        t0 = None
+        num = 0
+        tmp = "{}.{}".format(index_file, os.getpid())
+        with open(self.workload, "rb") as f, open(tmp, "wb") as out:
+            offset = 0
+            start = 0
+            record = b""
+            for line in f:
+                if record == b"":
+                    start = offset
+                record += line
+                offset += len(line)
+                # A quoted field continues on the next line.
+                if record.count(b'"') % 2 == 1:
+                    continue
+
+                row = self._parse_record(record)
+                length = len(record)
+                record = b""
+                if row == None or self._statement(row) == None:
+                    continue
+                try:
+                    t = self._timestamp(row[CSVLOG_LOG_TIME])
+                except ValueError:
+                    continue
+                if t0 == None:
+                    t0 = t
+                session = sessions.setdefault(row[CSVLOG_SESSION_ID], len(sessions))
+                out.write(INDEX_RECORD.pack(t - t0, session, start, length))
+                num += 1
+        os.replace(tmp, index_file)
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: {} statements of {} sessions indexed.".format(num, len(sessions)))
+        return num
+
+    def _read_index(self):
+        with open(self._index_file(), "rb") as f:
+            while True:
+                chunk = f.read(INDEX_RECORD.size * 4096)
+                if not chunk:
+                    break
+                for record in INDEX_RECORD.iter_unpack(chunk):
+                    yield record
+
+    """
+    # Client coroutine of the csvlog replay.
+    # Reads the statements from the log by offset and runs them.
+    """
+
+    async def _replay_client(self, stats, sessions, client, fd):
+        queue = sessions.queues[client]
+        try:
+            conn = await psycopg.AsyncConnection.connect(self._conninfo(), autocommit=True)
+        except psycopg.Error as e:
+            stats["connection_errors"] += 1
+            if Log.error <= Common.DEFAULT_LOG_LEVEL:
+                print("Error: Could not connect to '{}'".format(self.host))
+                print(e)
+            return
+
+        try:
+            while True:
+                item = await queue.get()
+                if item == None:
+                    break
+                [scheduled, offset, length] = item
+                _sql = self._statement(self._parse_record(os.pread(fd, length, offset)))
+                try:
+                    await conn.execute(_sql)
+                except psycopg.Error as e:
+                    stats["errors"] += 1
+                    if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+                        print("Debug1: statement '{}' failed: {}".format(_sql, e))
+                    if conn.closed:
+                        break
+                    sessions.done(client, conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE)
+                    continue
+                sessions.done(client, conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE)
+
+                latency = time.monotonic() - scheduled
+                stats["transactions"] += 1
+                stats["latency_sum"] += latency
+                if stats["histogram"] != None:
+                    stats["histogram"].record(latency * 1000000)
+        finally:
+            await conn.close()
+
+    """
+    # Dispatches the statements to the clients at the logged time / speed,
+    # until the deadline, and then stops the clients.
+    """
+
+    async def _dispatcher(self, sessions, speed, start, deadline):
+        for [t, session, offset, length] in self._read_index():
+            scheduled = start + t / speed
+            if scheduled >= deadline:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sessions.dispatch(session, [scheduled, offset, length])
+
+        # Discard the statements not started yet, and stop the clients.
+        sessions.clear()
+        for queue in sessions.queues:
+            queue.put_nowait(None)
+
+    async def _run(self, clients, duration, rate, progress, report_interval, histogram):
+        if self.source != "csvlog":
+            return await Native._run(self, clients, duration, rate, progress, report_interval, histogram)
+
+        stats = {
+            "transactions": 0,
+            "errors": 0,
+            "connection_errors": 0,
+            "latency_sum": 0.0,
+            "histogram": Histogram() if histogram else None,
+            "statements": {},
+        }
+        # rate is the replay speed for csvlog.
+        speed = rate if rate > 0 else 1.0
+        start = time.monotonic()
+        deadline = start + duration
+
+        sessions = _Sessions([asyncio.Queue() for _ in range(clients)])
+        fd = os.open(self.workload, os.O_RDONLY)
+        reporter = None
+        try:
+            tasks = [asyncio.create_task(self._replay_client(stats, sessions, client, fd)) for client in range(clients)]
+            tasks.append(asyncio.create_task(self._dispatcher(sessions, speed, start, deadline)))
+            if progress != None:
+                reporter = asyncio.create_task(self._reporter(stats, clients, start, progress, report_interval))
+
+            await asyncio.gather(*tasks)
+        finally:
+            if reporter != None:
+                reporter.cancel()
+            os.close(fd)
+
+        stats["elapsed"] = time.monotonic() - start
+        return stats
+
+    """
+    Public methods
+    """
+
+    """
+    # Captures the workload (pg_stat_statements), or builds the index of the log (csvlog)
+    """
+
+    def create_bench(self):
+        if self.source == "csvlog":
+            if os.path.isfile(self.workload) == False:
+                print("Error: workload '{}' not found.".format(self.workload))
+                sys.exit(1)
+            self._build_index()
+            return True
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: Capture the workload from pg_stat_statements.")
+
+        psql = Psql(self.host, self.port, self.user, self.db, self.password)
+        if psql.connect() == False:
+            sys.exit(1)
+
+        _sql = (
+            "SELECT s.queryid, s.calls, s.query FROM pg_stat_statements s"
+            " JOIN pg_database d ON s.dbid = d.oid"
+            " WHERE d.datname = current_database()"
+            " AND s.query ~* '^\\s*(select|insert|update|delete|with)\\s'"
+            " AND s.query !~* '\\m(pg_stat|pg_settings|pg_catalog|pg_database|pg_class)'"
+            " ORDER BY s.calls DESC LIMIT {};".format(self.capture_limit)
+        )
+        cur = psql.exec_select_cmd(_sql)
+        if cur == None:
+            print("Error: Cannot read pg_stat_statements. Is the extension installed in '{}'?".format(self.db))
+            psql.close()
+            sys.exit(1)
+
+        statements = [[_row[0], _row[1], _row[2]] for _row in cur]
+        cur.close()
+        psql.close()
+
+        if len(statements) == 0:
+            print("Error: No statement found in pg_stat_statements.")
+            sys.exit(1)
+
+        with open(self.workload, "w") as f:
+            json.dump(statements, f, indent=1)
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: {} statements captured into '{}'.".format(len(statements), self.workload))
+        return True
+
+    """
+    # Removes the captured workload (pg_stat_statements), or the index of the log (csvlog)
+    """
+
+    def drop_bench(self):
+        path = self._index_file() if self.source == "csvlog" else self.workload
+        if os.path.isfile(path) == False:
+            print("Error: '{}' not found.".format(path))
+            sys.exit(1)
+        os.remove(path)
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: '{}' removed.".format(path))
+        return True
+
+    """
+    # Checks the workload
+    """
+
+    def check(self):
+
+        print("Replay-Check Start.")
+
+        print("(1) Check psycopg module:")
+        if "psycopg" not in sys.modules:
+            print("Error: target 'replay' requires 'psycopg' (version 3) module.")
+            sys.exit(1)
+        print("ok.")
+
+        print("(2) Check workload:")
+        if os.path.isfile(self.workload) == False:
+            if self.source == "pg_stat_statements":
+                print("Error: workload '{}' not found. Capture it using the 'create' command.".format(self.workload))
+            else:
+                print("Error: workload '{}' not found.".format(self.workload))
+            sys.exit(1)
+        if self.source == "csvlog":
+            num = self._build_index()
+        else:
+            num = len(self.transactions)
+        if num == 0:
+            print("Error: No statement found in '{}'.".format(self.workload))
+            sys.exit(1)
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: number of statements = ", num)
+        print("ok.")
+
+        print("(3) Access to {}:".format(self.host))
+        psql = Psql(self.host, self.port, self.user, self.db, self.password)
+        if psql.connect() == False:
+            sys.exit(1)
+        psql.close()
+        print("ok.")
+
+        print("Replay-Check finished.")
+
+        return num
@@ -0,0 +1,60 @@
+"""
+replay_scenario.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import sys
+
+from .replay import Replay
+from .native_scenario import NativeScenario
+
+sys.path.append("..")
+from utils import Common, Log
+
+
+"""
+# The scenario format, the score and the metrics are the same as the native target:
+#   [start, clients, duration, rate]
+# where rate is the replay speed for csvlog (0: the logged speed).
+"""
+
+
+class ReplayScenario(Replay, NativeScenario):
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        db,
+        source,
+        workload,
+        param_range=Common.DEFAULT_REPLAY_PARAM_RANGE,
+        parameters=None,
+    ):
+        Replay.__init__(
+            self, host, port, user, password, db, source, workload, param_range=param_range, parameters=parameters
+        )
+        self._parameters = parameters
+
+    """
+    Public methods
+    """
+
+    """
+    # Returns the driver run by bench().
+    """
+
+    def create_driver(self):
+        return Replay(
+            self.host,
+            self.port,
+            self.user,
+            self.password,
+            self.db,
+            self.source,
+            self.workload,
+            param_range=self.param_range,
+            parameters=self._parameters,
+        )
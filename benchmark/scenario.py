@@ -5,10 +5,13 @@ scenario.py
 """
 
 import multiprocessing as mp
+import csv, datetime, queue
 import time, sys
 
+from .supervisor import Supervisor
+
 sys.path.append("..")
-from utils import Common, Log, Monitor
+from utils import Common, Log, Monitor, Histogram
 
 
 class Scenario:
@@ -50,9 +53,7 @@ class Scenario:
                 total_connections += sc[1]
 
             # Compute required_max_connections
-            required_max_connections = Common.compute_max_connections(
-                ([scenario[0:3] for scenario in scenario])
-            )
+            required_max_connections = Common.compute_max_connections(scenario)
 
             return total_duration, required_max_connections, total_connections
 
@@ -62,8 +63,15 @@ class Scenario:
     # Monitoring function.
     #
     # This function runs on the monitor process.
-    # For each monitoring interval (`monitoring_time` in seconds),
-    # it retrieves PostgreSQL server statistics and saves the results.
+    # For each monitoring interval (`monitoring_time` in seconds, which can be less than a second),
+    # it retrieves PostgreSQL server statistics at absolute deadlines, so that the time
+    # taken by the sampling does not shift the following samples, and saves the results
+    # in batches.
+    # If `monitoring_mode` is "server", the samples are taken by the server-side collector
+    # (see Monitor.start_collector()) and fetched once at the end.
+    # If `statements_top` is greater than 0, the top statements of pg_stat_statements during
+    # the trial are written, and if `wait_event_interval` is greater than 0, the wait events
+    # are sampled at that interval (see Monitor.start_statements() and start_wait_events()).
     # When it receives a message via `_queue_mon`, it terminates monitoring.
     """
 
@@ -79,6 +87,11 @@ class Scenario:
         linux_monitoring,
         additional_monitor_items,
         _queue_mon,
+        monitoring_mode=Common.DEFAULT_MONITORING_MODE,
+        max_duration=None,
+        metrics=None,
+        statements_top=Common.DEFAULT_STATEMENTS_TOP,
+        wait_event_interval=Common.DEFAULT_WAIT_EVENT_INTERVAL,
     ):
 
         # TODO: Need retry feature.
@@ -91,31 +104,76 @@ class Scenario:
             log_dir,
             linux_monitoring,
             additional_monitor_items,
+            monitoring_time,
+            metrics,
+            statements_top,
+            wait_event_interval,
         )
         if mon.start() == False:
             if Log.error <= Common.DEFAULT_LOG_LEVEL:
                 print("Error: Monitor process did not establish connection.")
             del mon
             sys.exit(1)
+        # The statements are monitored if pg_stat_statements can be read.
+        mon.start_statements()
 
         if Log.info <= Common.DEFAULT_LOG_LEVEL:
             print("Info: monitor process created.")
 
+        if monitoring_mode == "server":
+            if mon.start_collector(max_duration) == False:
+                if Log.error <= Common.DEFAULT_LOG_LEVEL:
+                    print("Error: Monitor could not start the server-side collector.")
+                mon.close()
+                sys.exit(1)
+            mon.start_wait_events()
+            _queue_mon.get()
+            if Log.info <= Common.DEFAULT_LOG_LEVEL:
+                print('Info: monitor process terminated by "stop" message.')
+            mon.stop_collector()
+            mon.close()
+            return
+
+        mon.start_wait_events()
+        next_sample = time.monotonic()
         while True:
-            if _queue_mon.empty() == False:
+            mon.monitoring()
+            if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+                print("Debug1: monitor process retrieves the statistics.")
+
+            next_sample += monitoring_time
+            now = time.monotonic()
+            if next_sample < now:
+                # Skip the missed deadlines.
+                next_sample += (int((now - next_sample) / monitoring_time) + 1) * monitoring_time
+            try:
+                _queue_mon.get(timeout=next_sample - now)
                 if Log.info <= Common.DEFAULT_LOG_LEVEL:
                     print('Info: monitor process terminated by "stop" message.')
                 break
-            mon.monitoring()
-            if Log.info <= Common.DEFAULT_LOG_LEVEL:
-                print("Info: monitor process retrieves the statistics.")
+            except queue.Empty:
+                pass
 
-            time.sleep(monitoring_time)
-
-        mon.stop
+        mon.close()
 
     """
     # Runs scenario-specific benchmarks and launches monitoring as needed.
+    #
+    # The tasks of the scenario are run by one Supervisor (see supervisor.py): the benchmark
+    # binaries are its subprocesses, and the native drivers run in its event loop.
+    # If `log_dir` is set, the interval reports of all tasks are written
+    # to the progress file as they arrive.
+    # If `progress_callback` is set, every `report_interval` seconds it is called with
+    # (step, number of transactions executed so far). When it returns True, all
+    # tasks are killed and `self.pruned` is set to True.
+    # If `steady_state` (SteadyState) is set, the score is the sum of the mean tps of
+    # each scenario after it reached the steady state (see steady_score()), instead of
+    # the number of transactions returned by score().
+    # If `histogram` is True, the latency histograms of all tasks are merged
+    # into `self.histogram` (Histogram) and saved in log_dir.
+    # If `metrics` (MetricsPartition) is set, the monitoring samples and the interval
+    # reports are written to the metrics store instead of the csv files.
+    # `statements_top` and `wait_event_interval` are passed to the monitor (see monitor()).
     """
 
     def play(
@@ -125,13 +183,22 @@ class Scenario:
         monitoring_time=None,
         linux_monitoring=False,
         additional_monitor_items=None,
+        progress_callback=None,
+        report_interval=Common.REPORT_INTERVAL,
+        steady_state=None,
+        histogram=False,
+        monitoring_mode=Common.DEFAULT_MONITORING_MODE,
+        metrics=None,
+        statements_top=Common.DEFAULT_STATEMENTS_TOP,
+        wait_event_interval=Common.DEFAULT_WAIT_EVENT_INTERVAL,
     ):
         total_duration, _, _ = self.check_scenario(scenario)
         if Log.info <= Common.DEFAULT_LOG_LEVEL:
             print("Info: total_duration = {}[sec]".format(total_duration))
 
-        # Don't set: `mp.set_start_method("spawn")`
-        _queue = mp.Queue()
+        self.pruned = False
+        self.steady_onsets = {}
+        self.histogram = None
 
         # Create and Start monitor process
         if log_dir != None:
@@ -150,42 +217,126 @@ class Scenario:
                     linux_monitoring,
                     additional_monitor_items,
                     _queue_mon,
+                    monitoring_mode,
+                    total_duration + 2 * Common.TIMEOUT_MARGIN,
+                    metrics,
+                    statements_top,
+                    wait_event_interval,
                 ),
                 daemon=True,
             )
             process_mon.start()
 
-        # Create and Start benchmark threads.
-        no = 0
-        process_list = []
-        for sc in scenario:
-            process = mp.Process(name=str(no), target=self.bench, args=(no, _queue, sc), daemon=True)
-            process.start()
-            no += 1
-            process_list.append(process)
-
+        # Record and report the progress if required.
+        progress = log_dir != None or progress_callback != None or steady_state != None
+        progress_file = None
+        if log_dir != None and metrics == None:
+            progress_file = open("{}{}".format(log_dir, Common.PROGRESS_FILE), "w")
+            progress_writer = csv.writer(progress_file, quotechar="'", quoting=csv.QUOTE_NONNUMERIC)
+            progress_writer.writerow(["no", "timestamp"] + self.get_progress_col_name())
+        tps_index = self.get_progress_col_name().index("tps")
+        progress_rows = []  # written to the metrics store in batches
+        last_flush = time.monotonic()
+
+        def flush_progress():
+            nonlocal progress_rows, last_flush
+            metrics.write("progress", ["no", "timestamp"] + self.get_progress_col_name(), progress_rows)
+            progress_rows = []
+            last_flush = time.monotonic()
+
+        transactions = 0.0
+        series = {}  # {no: [[elapsed, tps], ...]}
+
+        # Each interval report holds the tps of the last `report_interval` seconds.
+        def on_progress(no, timestamp, record):
+            nonlocal transactions
+            if record[tps_index] != None:
+                transactions += record[tps_index] * report_interval
+                series.setdefault(no, []).append([record[0], record[tps_index]])
+            if progress_file != None:
+                progress_writer.writerow([no, timestamp] + record)
+                progress_file.flush()
+            elif metrics != None:
+                progress_rows.append([no, datetime.datetime.fromtimestamp(timestamp)] + record)
+                if time.monotonic() - last_flush >= Common.MONITOR_FLUSH_INTERVAL:
+                    flush_progress()
+
+        def on_interval(step):
+            if progress_callback(step, transactions) == True:
+                if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                    print("Notice: benchmark pruned at step {}.".format(step))
+                return True
+            return False
+
+        jobs = [self.create_job(no, sc, progress, report_interval, histogram) for no, sc in enumerate(scenario)]
+        supervisor = Supervisor(
+            jobs,
+            on_progress if progress else None,
+            on_interval if progress_callback != None else None,
+            report_interval,
+        )
+        try:
+            msgs = supervisor.run()
+        finally:
+            if progress_file != None:
+                progress_file.close()
+            if metrics != None:
+                flush_progress()
+                metrics.close()
+
+            # Stop monitor process, which writes the buffered samples.
+            if log_dir != None:
+                _queue_mon.put("stop")
+                process_mon.join(Common.MONITOR_STOP_TIMEOUT)
+                if process_mon.is_alive():
+                    process_mon.terminate()
+                del _queue_mon
+
+        self.pruned = supervisor.stopped
+
+        # [no, sc, result, histogram]
         msg_list = []
+        if histogram == True:
+            self.histogram = Histogram()
+        for [no, sc, result, _histogram] in msgs:
+            msg_list.append([no, sc, result])
+            if _histogram != None:
+                self.histogram.merge(_histogram)
 
-        # Join processes
-        for ps in process_list:
-            ps.join(timeout=total_duration + Common.TIMEOUT_MARGIN)
-
-        # benchmark (sysbench or pgbench) processes are blocking this process ....
-
-        # Stop monitor process
-        if log_dir != None:
-            _queue_mon.put("stop")
-            del _queue_mon
+        if self.histogram != None and log_dir != None:
+            self.histogram.save("{}{}".format(log_dir, Common.HISTOGRAM_FILE))
 
-        # Check message queue
-        while _queue.empty() == False:
-            val = _queue.get()
-            msg_list.append(val)
+        if steady_state != None and len(series) > 0:
+            score = self.steady_score(series, steady_state)
+        else:
+            score = self.score(msg_list)
 
-        for ps in process_list:
-            ps.terminate()
+        return score, sorted(msg_list, key=lambda x: (x[0]))
 
-        if log_dir != None:
-            process_mon.terminate()
+    """
+    # Score function based on the steady state.
+    #
+    # Returns the sum of the mean tps of each scenario after the steady state is reached.
+    # Note that the unit differs from score(), which returns a number of transactions:
+    # the scores of trials run with and without steady_state are not comparable.
+    # The elapsed time at which each scenario reached the steady state is stored in
+    # `self.steady_onsets` ({no: elapsed}, None if it did not reach the steady state,
+    # in which case all intervals are used).
+    """
 
-        return self.score(msg_list), sorted(msg_list, key=lambda x: (x[0]))
+    def steady_score(self, series, steady_state):
+        _score = 0.0
+        self.steady_onsets = {}
+        for no in sorted(series):
+            tps = [r[1] for r in series[no]]
+            onset = steady_state.detect(tps)
+            if onset == None:
+                if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                    print("Notice: scenario {} did not reach the steady state.".format(no))
+                self.steady_onsets[no] = None
+                onset = 0
+            else:
+                self.steady_onsets[no] = series[no][onset][0]
+            _score += sum(tps[onset:]) / len(tps[onset:])
+
+        return _score
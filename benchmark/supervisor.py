@@ -0,0 +1,224 @@
+"""
+supervisor.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import asyncio
+import os, signal
+import time, sys
+
+sys.path.append("..")
+from utils import Common, Log
+
+
+"""
+# Runs the tasks of a scenario in one asyncio event loop.
+#
+# A CommandJob runs a benchmark binary (sysbench or pgbench) directly, without a shell,
+# as the leader of a new session, so that the binary and its children can be killed
+# as a process group. Its output is read line by line, and the interval reports are
+# passed to `progress` as they arrive.
+# A CoroutineJob runs a driver of this process (native or replay) as a task of the loop.
+#
+# Each job starts `wait` seconds after the supervisor, and is killed if it does not end
+# within `duration` + Common.TIMEOUT_MARGIN seconds after its start.
+"""
+
+
+class Job:
+    def __init__(self, no, sc, wait, duration, driver):
+        self.no = no
+        self.sc = sc
+        self.wait = wait
+        self.duration = duration
+        self.driver = driver
+        # Conversion of the result and of the interval reports (see MixedScenario).
+        self.map_result = None
+        self.map_progress = None
+
+    @property
+    def histogram(self):
+        return self.driver.histogram
+
+
+class CommandJob(Job):
+    def __init__(self, no, sc, wait, duration, driver, argv, finish, cleanup=None):
+        super().__init__(no, sc, wait, duration, driver)
+        self.argv = [str(arg) for arg in argv]
+        # finish(lines) returns the result parsed from the output.
+        self.finish = finish
+        # cleanup() removes the files of the command if it did not finish.
+        self.cleanup = cleanup
+
+
+class CoroutineJob(Job):
+    def __init__(self, no, sc, wait, duration, driver, run):
+        super().__init__(no, sc, wait, duration, driver)
+        # run(progress) returns the coroutine that returns the result.
+        self.run = run
+
+
+class Supervisor:
+    def __init__(self, jobs, progress=None, interval=None, report_interval=Common.REPORT_INTERVAL):
+        self.jobs = jobs
+        # progress(no, timestamp, record)
+        self.progress = progress
+        # interval(step) is called every `report_interval` seconds; if it returns True,
+        # all jobs are killed and `self.stopped` is set to True.
+        self.interval = interval
+        self.report_interval = report_interval
+        self.stopped = False
+
+    def _report(self, job):
+        if self.progress == None:
+            return None
+
+        def report(record):
+            if job.map_progress != None:
+                record = job.map_progress(record)
+            self.progress(job.no, time.time(), record)
+
+        return report
+
+    """
+    # Kills the process group of the job: SIGTERM, and SIGKILL if it is still alive
+    # after Common.KILL_GRACE_PERIOD seconds.
+    """
+
+    async def _kill(self, process):
+        for sig in [signal.SIGTERM, signal.SIGKILL]:
+            if process.returncode != None:
+                return
+            try:
+                os.killpg(process.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                return
+            try:
+                await asyncio.wait_for(process.wait(), Common.KILL_GRACE_PERIOD)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _command(self, job):
+        report = self._report(job)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *job.argv,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True,
+                limit=Common.SUPERVISOR_LINE_LIMIT,
+            )
+        except OSError as e:
+            print("Error: task[{}]: {}".format(job.no, str(e)))
+            if job.cleanup != None:
+                job.cleanup()
+            return None
+
+        lines = []
+        try:
+            async for line in process.stdout:
+                line = line.decode(errors="replace")
+                ret = job.driver.parse_progress(line)
+                if ret == None:
+                    lines.append(line.rstrip("\n"))
+                elif report != None:
+                    report(ret)
+            await process.wait()
+        except BaseException:
+            # Cancelled by the deadline or by the interval callback.
+            await self._kill(process)
+            if job.cleanup != None:
+                job.cleanup()
+            raise
+
+        if process.returncode != 0:
+            print("Error: task[{}] exited with {}: {}".format(job.no, process.returncode, "\n".join(lines)))
+            if job.cleanup != None:
+                job.cleanup()
+            return None
+        return job.finish(lines)
+
+    async def _coroutine(self, job):
+        try:
+            return await job.run(self._report(job))
+        except SystemExit:
+            # The driver reported the error and gave up; the other jobs go on.
+            return None
+
+    async def _job(self, job, start):
+        delay = start + job.wait - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: task[{}] started.".format(job.no))
+
+        timeout = job.duration + Common.TIMEOUT_MARGIN
+        try:
+            if isinstance(job, CommandJob):
+                ret = await asyncio.wait_for(self._command(job), timeout)
+            else:
+                ret = await asyncio.wait_for(self._coroutine(job), timeout)
+        except asyncio.TimeoutError:
+            if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                print("Notice: task[{}] killed after {}[sec].".format(job.no, timeout))
+            return None
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: task[{}] terminated.".format(job.no))
+
+        if ret == None:
+            return None
+        if job.map_result != None:
+            ret = job.map_result(ret)
+        return [job.no, job.sc, ret, job.histogram]
+
+    async def _watch(self, tasks):
+        step = 0
+        while any(task.done() == False for task in tasks):
+            await asyncio.sleep(self.report_interval)
+            step += 1
+            if self.interval(step) == True:
+                self.stopped = True
+                for task in tasks:
+                    task.cancel()
+                return
+
+    async def _run(self):
+        start = time.monotonic()
+        tasks = [asyncio.create_task(self._job(job, start)) for job in self.jobs]
+        watcher = None
+        if self.interval != None:
+            watcher = asyncio.create_task(self._watch(tasks))
+        try:
+            rets = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            if watcher != None:
+                watcher.cancel()
+            for task in tasks:
+                task.cancel()
+            # Each _command() kills its process group when cancelled.
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        msgs = []
+        for ret in rets:
+            if isinstance(ret, asyncio.CancelledError):
+                continue
+            if isinstance(ret, BaseException):
+                raise ret
+            if ret != None:
+                msgs.append(ret)
+        return msgs
+
+    """
+    Public methods
+    """
+
+    """
+    # Runs the jobs and returns the list of [no, sc, result, histogram] of the jobs
+    # that have finished successfully.
+    """
+
+    def run(self):
+        return asyncio.run(self._run())
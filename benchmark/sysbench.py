@@ -11,7 +11,7 @@ import sys, os
 from .benchmark import Benchmark
 
 sys.path.append("..")
-from utils import Common, Psql, Log
+from utils import Common, Psql, Log, Histogram
 
 
 class Sysbench(Benchmark):
@@ -35,6 +35,21 @@ class Sysbench(Benchmark):
         self.sysbench_tables = sysbench_tables
         self.sysbench_bindir = Common.set_dir(sysbench_bindir)
 
+    """
+    # Returns the connection options of sysbench.
+    """
+
+    def _conn_options(self):
+        opts = [
+            "--db-driver=pgsql",
+            "--pgsql-host={}".format(self.host),
+            "--pgsql-port={}".format(self.port),
+            "--pgsql-user={}".format(self.user),
+        ]
+        if self.password != None:
+            opts.append("--pgsql-password={}".format(self.password))
+        opts.append("--pgsql-db={}".format(self.db))
+        return opts
 
     """
     Public methods
@@ -70,32 +85,20 @@ class Sysbench(Benchmark):
             print("Error: {} already exists".format("sysbench tables"))
             sys.exit(1)
 
-        if self.password == None:
-            PG_CONN = "--db-driver=pgsql --pgsql-host={} --pgsql-user={} --pgsql-db={}".format(
-                str(self.host), str(self.user), str(self.db)
-            )
-        else:
-            PG_CONN = "--db-driver=pgsql --pgsql-host={} --pgsql-user={} --pgsql-password={} --pgsql-db={}".format(
-                str(self.host), str(self.user), str(self.password), str(self.db)
-            )
-
-        SYSBENCH_OPTIONS = "--table_size={} --tables={}".format(
-            self.sysbench_table_size, self.sysbench_tables
-        )
-        cmd = "{}sysbench {} {} {} prepare".format(
-            self.sysbench_bindir, str(type), PG_CONN, SYSBENCH_OPTIONS
-        )
+        cmd = ["{}sysbench".format(self.sysbench_bindir), str(type)] + self._conn_options()
+        cmd += ["--table_size={}".format(self.sysbench_table_size), "--tables={}".format(self.sysbench_tables), "prepare"]
 
         if Log.info <= Common.DEFAULT_LOG_LEVEL:
-            print("Info: command '{}'".format(str(cmd)))
+            print("Info: command '{}'".format(" ".join(cmd)))
 
         try:
-            completed_process = subprocess.run(
-                cmd, shell=True, check=True, capture_output=True
-            )
+            completed_process = subprocess.run(cmd, check=True, capture_output=True)
         except subprocess.CalledProcessError as e:
             print("Error: {}".format(str(e.stdout)))
             sys.exit(1)
+        except OSError as e:
+            print("Error: {}".format(str(e)))
+            sys.exit(1)
 
         return True
 
@@ -245,50 +248,157 @@ class Sysbench(Benchmark):
         return True
 
     """
-    # Runs sysbench
+    # Returns the command line (argv) of sysbench run.
     """
 
-    def run(self, sysbench_threads, sysbench_time, sysbench_command="oltp_read_write"):
+    def command(self, sysbench_threads, sysbench_time, sysbench_command="oltp_read_write", progress=False, report_interval=Common.REPORT_INTERVAL, percentile=None, histogram=False, rate=None, latency_limit=None):
 
         if self.command_type_check(sysbench_command) == False:
             print("Error: command '{}' not supported.".format(str(sysbench_command)))
             sys.exit(1)
 
-        if self.password == None:
-            PG_CONN = "--db-driver=pgsql --pgsql-host={} --pgsql-user={} --pgsql-db={}".format(
-                str(self.host), str(self.user), str(self.db)
-            )
-        else:
-            PG_CONN = "--db-driver=pgsql --pgsql-host={} --pgsql-user={} --pgsql-password={} --pgsql-db={}".format(
-                str(self.host), str(self.user), str(self.password), str(self.db)
-            )
+        cmd = ["{}sysbench".format(self.sysbench_bindir), sysbench_command] + self._conn_options()
+        cmd += [
+            "--table_size={}".format(self.sysbench_table_size),
+            "--tables={}".format(self.sysbench_tables),
+            "--threads={}".format(sysbench_threads),
+            "--time={}".format(sysbench_time),
+        ]
+
+        if progress == True:
+            cmd.append("--report-interval={}".format(report_interval))
+        if percentile != None:
+            cmd.append("--percentile={}".format(percentile))
+        if rate != None:
+            # Open-loop: the events arrive at `rate` per second, and wait in the queue if all threads are busy.
+            cmd.append("--rate={}".format(rate))
+        if histogram == True or latency_limit != None:
+            # The late transactions are counted from the histogram.
+            cmd.append("--histogram=on")
+        cmd.append("run")
+
+        if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+            print("Debug1: command '{}'".format(" ".join(cmd)))
+        return cmd
+
+    """
+    # Returns the result parsed from the output lines of sysbench run.
+    # If `histogram` is True, the latency histogram is stored in `self.histogram`.
+    """
 
-        SYSBENCH_OPTIONS = "--table_size={} --tables={} --threads={} --time={}".format(
-            self.sysbench_table_size,
-            self.sysbench_tables,
+    def finish(self, lines, histogram=False, latency_limit=None):
+        _histogram = self.parse_histogram(lines) if histogram == True or latency_limit != None else None
+        self.histogram = _histogram if histogram == True else None
+
+        if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+            print("Debug1: sysbench lines=", lines)
+
+        ret = self.parse_result(lines)
+        # Number of the transactions above the latency limit [ms].
+        late = None
+        if latency_limit != None and _histogram != None:
+            late = _histogram.count_above(latency_limit * 1000)
+        ret.append(late)
+        return ret
+
+    """
+    # Runs sysbench
+    """
+
+    def run(self, sysbench_threads, sysbench_time, sysbench_command="oltp_read_write", progress=None, report_interval=Common.REPORT_INTERVAL, percentile=None, histogram=False, rate=None, latency_limit=None):
+        cmd = self.command(
             sysbench_threads,
             sysbench_time,
+            sysbench_command,
+            progress != None,
+            report_interval,
+            percentile,
+            histogram,
+            rate,
+            latency_limit,
         )
+        lines = self.stream(cmd, progress)
+        return self.finish(lines, histogram, latency_limit)
 
-        cmd = "{}sysbench {} {} {} run".format(
-            self.sysbench_bindir, sysbench_command, PG_CONN, SYSBENCH_OPTIONS
-        )
-        if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
-            print("Debug1: command '{}'".format(str(cmd)))
+    """
+    # Parses an interval report of --report-interval and returns it as a list
+    # (see get_progress_col_name()), or None if the line is not an interval report.
+    #
+    # [ 5s ] thds: 10 tps: 2467.60 qps: 49353.78 (r/w/o: 34551.25/9868.32/4934.21) lat (ms,95%): 5.00 err/s: 0.00 reconn/s: 0.00
+    """
+
+    def parse_progress(self, line):
+        l = line.split()
+        if len(l) < 7 or l[0] != "[" or l[2] != "]" or "tps:" not in l:
+            return None
+
+        def value(key):
+            if key not in l:
+                return None
+            return float(l[l.index(key) + 1].rstrip(")"))
 
         try:
-            completed_process = subprocess.run(
-                cmd, shell=True, check=True, capture_output=True
-            )
-            lines = completed_process.stdout.decode("utf-8").splitlines()
-        except subprocess.CalledProcessError as e:
-            print("Error: {}".format(str(e.stdout)))
-            sys.exit(1)
+            elapsed = float(l[1].rstrip("s"))
+            threads = value("thds:")
+            tps = value("tps:")
+            qps = value("qps:")
+            reads = writes = others = None
+            if "(r/w/o:" in l:
+                [reads, writes, others] = [float(v) for v in l[l.index("(r/w/o:") + 1].rstrip(")").split("/")]
+            latency = None
+            for i in range(len(l) - 1):
+                if l[i].startswith("(ms,"):
+                    latency = float(l[i + 1])
+                    break
+            errors = value("err/s:")
+            reconnects = value("reconn/s:")
+        except (ValueError, IndexError):
+            return None
+        return [elapsed, threads, tps, qps, reads, writes, others, latency, errors, reconnects]
 
-        if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
-            print("Debug1: sysbench lines=", lines)
+    """
+    # Returns column name list of the interval report
+    """
+
+    def get_progress_col_name(self):
+        return [
+            "elapsed",
+            "threads",
+            "tps",
+            "qps",
+            "reads_per_sec",
+            "writes_per_sec",
+            "others_per_sec",
+            "latency_percentile",
+            "errors_per_sec",
+            "reconnects_per_sec",
+        ]
 
-        return self.parse_result(lines)
+    """
+    # Parses the output of --histogram and returns Histogram, or None if not found.
+    #
+    # Latency histogram (values are in milliseconds)
+    #        value  ------------- distribution ------------- count
+    #        1.759 |*                                        1
+    #        1.791 |****                                     12
+    """
+
+    def parse_histogram(self, lines):
+        histogram = None
+        for line in lines:
+            if line.startswith("Latency histogram"):
+                histogram = Histogram()
+                continue
+            if histogram == None or "|" not in line:
+                continue
+            [value, distribution] = line.split("|", 1)
+            try:
+                value = float(value)
+                count = int(distribution.split()[-1])
+            except (ValueError, IndexError):
+                continue
+            histogram.record(value * 1000, count)
+        return histogram
 
     """
     # Returns the result as a list
@@ -337,7 +447,8 @@ class Sysbench(Benchmark):
                 latency_avg = l[1]
             elif l[0] == "max:":
                 latency_max = l[1]
-            elif l[0] == "95th":
+            elif l[0].endswith("th") and len(l) > 2 and l[1] == "percentile:":
+                # "95th percentile:" by default, or the value of --percentile.
                 latency_95 = l[2]
             elif l[0] == "sum:":
                 latency_sum = l[1]
@@ -391,6 +502,7 @@ class Sysbench(Benchmark):
             "latency_sum",
             "threads_events",
             "threads_execution",
+            "late_transactions",
         ]
 
 
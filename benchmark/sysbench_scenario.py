@@ -6,10 +6,11 @@ sysbench_scenario.py
 
 import queue
 import threading
-import time, sys
+import os, time, sys
 
 from .sysbench import Sysbench
 from .scenario import Scenario
+from .supervisor import CommandJob
 
 sys.path.append("..")
 from utils import Common, Log, Monitor
@@ -24,6 +25,7 @@ class SysbenchScenario(Sysbench, Scenario):
         password,
         db,
         sysbench_bindir,
+        percentile=None,
     ):
 
         self.host = host
@@ -32,6 +34,8 @@ class SysbenchScenario(Sysbench, Scenario):
         self.password = password
         self.db = db
         self.sysbench_bindir = Common.set_dir(sysbench_bindir)
+        # Latency percentile reported as 'latency_95' (sysbench --percentile, default 95).
+        self.percentile = percentile
 
 
     """
@@ -45,7 +49,7 @@ class SysbenchScenario(Sysbench, Scenario):
 
     @Scenario.check_scenario_template
     def check_scenario(self, sc):
-        if len(sc) != 6:
+        if len(sc) != 6 and len(sc) != 7:
             print("Format Error: {}".format(sc))
             sys.exit(1)
         if type(sc[0]) is not int or sc[0] < 0:
@@ -66,12 +70,39 @@ class SysbenchScenario(Sysbench, Scenario):
         if type(sc[5]) is not int or sc[5] < 0:
             print("Value Error: tables must be positive integer:{}".format(sc))
             sys.exit(1)
+        if len(sc) == 7:
+            self._check_options(sc)
+
+    """
+    # Options table of the task:
+    #   rate:          target transactions per second (--rate).
+    #   latency_limit: transactions above the limit [ms] are counted as late.
+    """
+
+    def _check_options(self, sc):
+        options = sc[6]
+        if isinstance(options, dict) == False:
+            print("Value Error: options must be a table:{}".format(sc))
+            sys.exit(1)
+        for key in options:
+            if key not in ["rate", "latency_limit"]:
+                print("Value Error: option '{}' not supported:{}".format(key, sc))
+                sys.exit(1)
+        if "rate" in options and (type(options["rate"]) is not int or options["rate"] <= 0):
+            print("Value Error: rate must be positive integer:{}".format(sc))
+            sys.exit(1)
+        if "latency_limit" in options and (type(options["latency_limit"]) not in (int, float) or options["latency_limit"] <= 0):
+            print("Value Error: latency_limit must be positive number:{}".format(sc))
+            sys.exit(1)
 
     """
     # Score function
     #
     # Note: Based on the data obtained, an appropriate score can be set.
-    #       This function returns total number of executed transactions.
+    #       This function returns total number of executed transactions,
+    #       excluding the late transactions of the tasks with latency_limit.
+    #       With `steady_state`, steady_score() is used instead, and the score is
+    #       the sum of the mean tps, not a number of transactions.
     """
 
     def score(self, msg_list):
@@ -88,27 +119,52 @@ class SysbenchScenario(Sysbench, Scenario):
             sc_ret_transaction = int(sc_result[4])
             sc_ret_queries = int(sc_result[5])
 
+            # At a fixed rate, the number of transactions is (almost) the same for every
+            # configuration, so the transactions above the latency limit are not counted.
+            sc_ret_late = int(sc_result[18]) if sc_result[18] != None else 0
+
             # Note: Based on the data obtained, an appropriate score can be set.
-            _score += sc_ret_transaction
+            _score += sc_ret_transaction - sc_ret_late
 
         return _score
 
     """
-    # Runs one of the scnenario and returns result.
-    # This is invoked in the play()@scenario.py
+    # Returns the metric computed from the results of the scenarios, or None if not supported.
+    #   "tps": sum of the tps of each scenario.
+    #   "latency_avg": mean of the average latency [ms] of each scenario.
+    #   "latency_percentile": max of the latency percentile [ms] of each scenario.
+    #   "late": total number of the late transactions of the scenarios with latency_limit.
     """
 
-    def bench(self, no, queue, sc):
-        [wait, threads, duration, command, table_size, tables] = sc
+    def get_metric(self, name, msg_list):
+        values = []
+        for [_, _, sc_result] in msg_list:
+            if name == "tps":
+                values.append(int(sc_result[4]) / float(sc_result[9].rstrip("s")))
+            elif name == "latency_avg":
+                values.append(float(sc_result[12]))
+            elif name == "latency_percentile":
+                values.append(float(sc_result[14]))
+            elif name == "late":
+                if sc_result[18] != None:
+                    values.append(int(sc_result[18]))
+            else:
+                return None
+        if len(values) == 0:
+            return None
+        if name in ["tps", "late"]:
+            return sum(values)
+        elif name == "latency_avg":
+            return sum(values) / len(values)
+        return max(values)
 
-        if Log.info <= Common.DEFAULT_LOG_LEVEL:
-            print("Info: sysbench thread[{}] created.".format(no))
-
-        if int(wait) > 0:
-            time.sleep(int(wait))
+    """
+    # Returns the job of one of the scenario, run by the Supervisor in play()@scenario.py
+    """
 
-        if Log.info <= Common.DEFAULT_LOG_LEVEL:
-            print("Info: sysbench thread[{}] started.".format(no))
+    def create_job(self, no, sc, progress=False, report_interval=Common.REPORT_INTERVAL, histogram=False):
+        [wait, threads, duration, command, table_size, tables] = sc[0:6]
+        options = sc[6] if len(sc) > 6 else {}
 
         sb = Sysbench(
             self.host,
@@ -120,10 +176,23 @@ class SysbenchScenario(Sysbench, Scenario):
             tables,
             self.sysbench_bindir,
         )
-        ret = sb.run(int(threads), int(duration), str(command))
-
-        if Log.info <= Common.DEFAULT_LOG_LEVEL:
-            print("Info: sysbench thread[{}] terminated.".format(no))
-
-        del sb
-        queue.put([no, sc, ret])
+        cmd = sb.command(
+            int(threads),
+            int(duration),
+            str(command),
+            progress,
+            report_interval,
+            self.percentile,
+            histogram=histogram,
+            rate=options.get("rate"),
+            latency_limit=options.get("latency_limit"),
+        )
+        return CommandJob(
+            no,
+            sc,
+            int(wait),
+            int(duration),
+            sb,
+            cmd,
+            lambda lines: sb.finish(lines, histogram, options.get("latency_limit")),
+        )
@@ -5,8 +5,8 @@ conf.py
 """
 
 import optuna
-import getpass, time, sys
-from utils import Common, Log, PG, Repository
+import getpass, time, sys, csv, json
+from utils import Common, Log, PG, Repository, ResultCache, SteadyState
 from benchmark import Sysbench, SysbenchScenario, Pgbench, PgbenchScenario
 from base_conf import BaseConf
 
@@ -25,27 +25,42 @@ class Conf(BaseConf):
     """
 
     def input_server_passwd(self):
-        def pg_passwd():
+        def pg_passwd(pgsql_server):
             print("Enter postgresql passwd:")
             _passwd = getpass.getpass()
             if len(_passwd) == 0:
                 _passwd = None
-            self.pgsql_server["passwd"] = _passwd
+            pgsql_server["passwd"] = _passwd
+
+        hostpasswd = {}
+        for pgsql_server in self.pgsql_servers:
+            host = pgsql_server["host"]
+            if host == "localhost" or host == "127.0.0.1":
+                pgsql_server["hostpasswd"] = None
+                continue
+
+            if len(self.pgsql_servers) > 1:
+                print("Server: {}".format(self.get_target_name(pgsql_server)))
+
+            if host not in hostpasswd:
+                print("Enter server passwd:")
+                hostpasswd[host] = getpass.getpass()
+            pgsql_server["hostpasswd"] = hostpasswd[host]
+
+            if "passwd" in pgsql_server:
+                if pgsql_server["passwd"] != "None":
+                    pg_passwd(pgsql_server)
+            else:
+                pg_passwd(pgsql_server)
 
-        host = self.pgsql_server["host"]
-        if host == "localhost" or host == "127.0.0.1":
-            self.pgsql_server["hostpasswd"] = None
-            return
+    """
+    # Returns the name of the PostgreSQL server, e.g. "192.168.128.193:5432".
+    """
 
-        print("Enter server passwd:")
-        _passwd = getpass.getpass()
-        self.pgsql_server["hostpasswd"] = _passwd
-
-        if "passwd" in self.pgsql_server:
-            if self.pgsql_server["passwd"] != "None":
-                pg_passwd()
-        else:
-            pg_passwd()
+    def get_target_name(self, pgsql_server=None):
+        if pgsql_server == None:
+            pgsql_server = self.pgsql_server
+        return "{}:{}".format(pgsql_server["host"], pgsql_server["port"])
 
 
     """
@@ -55,6 +70,9 @@ class Conf(BaseConf):
     def get_scenario(self):
         return self.bench_scenario
 
+    def get_warmup(self):
+        return self.bench_warmup
+
     """
     # Writes the file contains best_value, best_params, best_trial and best_trials.
     """
@@ -76,20 +94,120 @@ class Conf(BaseConf):
         filename = self.base_dir + self.log_dir + Common.BEST_RESULT_FILE
         with open(filename, mode="w") as f:
             f.write("best_value={}\n".format(str(best_value)))
+            if "score_ci" in best_trial.user_attrs:
+                f.write("best_value_ci={}\n".format(str(best_trial.user_attrs["score_ci"])))
+                f.write("scores={}\n".format(str(best_trial.user_attrs["scores"])))
             write_dict(best_params, "best_params")
             f.write("The best trial in the study => {}\n".format(best_trial))
             f.write("Trials located at the Pareto front in the study => {}\n".format(best_trials))
 
+    """
+    # Writes the Pareto front of the multi-objective study: the values of the objectives
+    # and the parameters of each trial on the front, and the best_result file.
+    """
+
+    def dump_pareto_front(self, best_trials):
+        if self.log_dir == None:
+            return
+
+        objectives = ["{}({})".format(metric, direction) for [metric, direction] in self.get_objectives()]
+        param_names = []
+        for trial in best_trials:
+            for name in trial.params:
+                if name not in param_names:
+                    param_names.append(name)
+
+        filename = self.base_dir + self.log_dir + Common.PARETO_FILE
+        with open(filename, mode="w") as f:
+            writer = csv.writer(f, quotechar="'", quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerow(["trial"] + objectives + param_names)
+            for trial in sorted(best_trials, key=lambda t: t.number):
+                writer.writerow(
+                    [trial.number] + list(trial.values) + [trial.params.get(name) for name in param_names]
+                )
+
+        filename = self.base_dir + self.log_dir + Common.BEST_RESULT_FILE
+        with open(filename, mode="w") as f:
+            f.write("objectives={}\n".format(objectives))
+            for trial in sorted(best_trials, key=lambda t: t.number):
+                f.write("\ntrial={}\n".format(trial.number))
+                f.write("values={}\n".format(list(trial.values)))
+                f.write("params={}\n".format(trial.params))
+
+    """
+    # Returns the optuna storage URL, or None if the study is kept in memory.
+    """
+
+    def get_storage(self):
+        if self.storage != None:
+            return self.storage
+        if "sqlite3" not in sys.modules:
+            return None
+        storage = "sqlite:///{}{}{}".format(self.base_dir, self.log_dir, Common.STUDY_DB)
+        if len(self.pgsql_servers) > 1:
+            # Several workers write to the same file.
+            storage += "?timeout={}".format(Common.STUDY_DB_TIMEOUT)
+        return storage
+
+    """
+    # Writes the file contains the number of trials and the throughput of each target.
+    """
+
+    def dump_targets(self, trials, elapsed):
+        if self.log_dir == None:
+            return
+
+        stats = {}
+        for pgsql_server in self.pgsql_servers:
+            stats[self.get_target_name(pgsql_server)] = [0, 0, 0, 0.0, []]
+
+        for trial in trials:
+            target = trial.user_attrs.get("target")
+            if target not in stats:
+                continue
+            stats[target][0] += 1
+            if trial.state == optuna.trial.TrialState.COMPLETE:
+                stats[target][1] += 1
+                stats[target][4].append(trial.values[0])
+            elif trial.state == optuna.trial.TrialState.PRUNED:
+                stats[target][2] += 1
+            if trial.datetime_start != None and trial.datetime_complete != None:
+                stats[target][3] += (trial.datetime_complete - trial.datetime_start).total_seconds()
+
+        filename = self.base_dir + self.log_dir + Common.TARGETS_FILE
+        with open(filename, mode="w") as f:
+            writer = csv.writer(f, quotechar="'", quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerow(["target", "trials", "completed", "pruned", "busy_time", "trials_per_hour", "mean_value"])
+            for target in stats:
+                [n, completed, pruned, busy_time, values] = stats[target]
+                trials_per_hour = n * 3600 / elapsed if elapsed > 0 else 0
+                mean_value = sum(values) / len(values) if len(values) > 0 else None
+                writer.writerow([target, n, completed, pruned, busy_time, trials_per_hour, mean_value])
+
     """
     # Writes the file contains the trials configuration.
     """
 
     def dump_conf(self):
+        # Returns the value in TOML, e.g. the options table of a task or a task of the mixed scenario.
+        def toml_value(v):
+            if isinstance(v, bool):
+                return str(v).lower()
+            elif isinstance(v, int) or isinstance(v, float):
+                return str(v)
+            elif isinstance(v, list):
+                return "[{}]".format(", ".join(toml_value(x) for x in v))
+            elif isinstance(v, dict):
+                return "{{{}}}".format(", ".join("{} = {}".format(k, toml_value(x)) for k, x in v.items()))
+            return json.dumps(str(v))
+
         def write_dict(conf):
             dic = conf.keys()
             for key in conf:
                 if "passwd" in key or "password" in key:
                     continue
+                if conf[key] == None or isinstance(conf[key], dict) or isinstance(conf[key], list):
+                    continue
                 if isinstance(conf[key], int):
                     f.write("{} = {}\n".format(key, conf[key]))
                 else:
@@ -106,6 +224,8 @@ class Conf(BaseConf):
                 for s in l:
                     if isinstance(s, int) or isinstance(s, float):
                         f.write("{}, ".format(s))
+                    elif isinstance(s, dict) or isinstance(s, list):
+                        f.write("{}, ".format(toml_value(s)))
                     else:
                         f.write("\"{}\", ".format(s))
 
@@ -138,24 +258,75 @@ class Conf(BaseConf):
             write_item(self.n_trials, "n_trials")
             write_item(self.sampling_mode, "sampling_mode", True)
             write_item(self.restore_everytime, "restore_everytime", True)
+            write_item(self.restore_method, "restore_method", True)
+            write_item(str(self.restore_verify).lower(), "restore_verify")
+            write_item(str(self.reload_only).lower(), "reload_only")
+            write_item(self.repeats, "repeats")
+            write_item(self.adaptive_repeats, "adaptive_repeats")
+            write_item(self.repeat_statistic, "repeat_statistic", True)
+            write_item(self.steady_state, "steady_state", True)
+            if self.steady_state != "none":
+                write_item(self.steady_state_window, "steady_state_window")
+                if self.steady_state_threshold != None:
+                    write_item(self.steady_state_threshold, "steady_state_threshold")
+            write_item(self.pruner, "pruner", True)
+            if self.pruner != "none":
+                write_item(self.pruner_startup_trials, "pruner_startup_trials")
+                write_item(self.pruner_warmup_steps, "pruner_warmup_steps")
+                write_item(self.pruner_percentile, "pruner_percentile")
+                write_item(self.report_interval, "report_interval")
+            write_item(str(self.cache).lower(), "cache")
+            if self.cache:
+                write_item(self.cache_repeats, "cache_repeats")
+                write_item(self.cache_max_entries, "cache_max_entries")
+                write_item(self.cache_max_age, "cache_max_age")
 
             write_title("Monitoring section", "monitoring")
             write_item(self.linux_monitoring, "linux_monitoring", True)
             write_item(self.monitoring_time, "monitoring_time")
-
-            write_title("PostgreSQL server configuration section", "postgresql_server")
-            write_dict(self.pgsql_server)
+            write_item(self.monitoring_mode, "monitoring_mode", True)
+            write_item(self.metrics_store, "metrics_store", True)
+            write_item(self.statements_top, "statements_top")
+            write_item(self.wait_event_interval, "wait_event_interval")
+            write_item(str(self.latency_histogram).lower(), "latency_histogram")
+
+            if len(self.pgsql_servers) == 1:
+                write_title("PostgreSQL server configuration section", "postgresql_server")
+                write_dict(self.pgsql_server)
+            else:
+                for pgsql_server in self.pgsql_servers:
+                    write_title("PostgreSQL server configuration section", "[postgresql_server]")
+                    write_dict(pgsql_server)
 
             write_title("PostgreSQL configuration parameters section", "postgresql_conf")
             write_list(self.config_int, "config_int")
             write_list(self.config_real, "config_real")
 
             write_title("Benchmark section", "benchmark")
-            write_title("benchmark configuration", "benchmark.{}".format(self.target))
-            write_dict(self.bench_conf)
-            write_list(self.bench_scenario, "scenario")
-            if self.additional_monitor_items is not None:
-                write_list(self.additional_monitor_items, "additional_monitor_items")
+            # The target of the trial first, and then the other benchmarks of the mixed scenario.
+            for target in self.get_targets():
+                bench_conf = self.bench_confs[target]
+                write_title("benchmark configuration", "benchmark.{}".format(target))
+                write_dict(bench_conf)
+                for key in bench_conf:
+                    # e.g. the transaction mix of the native target (nested lists of strings).
+                    if isinstance(bench_conf[key], list) and len(bench_conf[key]) > 0:
+                        f.write("{} = {}\n".format(key, toml_value(bench_conf[key])))
+                if target != self.target:
+                    continue
+                # The phases are written as the compiled scenario.
+                write_list(self.bench_scenario, "scenario")
+                if len(self.bench_warmup) > 0:
+                    write_list(self.bench_warmup, "warmup")
+                if self.additional_monitor_items is not None:
+                    write_list(self.additional_monitor_items, "additional_monitor_items")
+
+            if len(self.objectives) > 0 or len(self.constraints) > 0:
+                write_title("Objectives section", "objectives")
+                if len(self.objectives) > 0:
+                    write_list(self.objectives, "metrics")
+                if len(self.constraints) > 0:
+                    write_list(self.constraints, "constraints")
 
     """
     # Prints connection information
@@ -206,31 +377,77 @@ class Conf(BaseConf):
 
         print_title("Trials")
         print("n_trials = {}".format(self.n_trials))
+        print("restore_everytime = {}".format(self.restore_everytime))
+        if self.restore_everytime:
+            print("restore_method = '{}'".format(self.restore_method))
+            if self.restore_verify:
+                print("restore_verify = {}".format(self.restore_verify))
+        print("reload_only = {}".format(self.reload_only))
+        print("repeats = {} (adaptive_repeats = {}, statistic = '{}')".format(
+            self.repeats, self.adaptive_repeats, self.repeat_statistic
+        ))
+        print("steady_state = '{}'".format(self.steady_state))
+        print("pruner = '{}'".format(self.pruner))
+        if self.pruner != "none":
+            print("report_interval = {} [sec]".format(self.report_interval))
+        if self.cache:
+            print("cache = '{}{}' (repeats = {})".format(self.base_dir, Common.CACHE_DIR, self.cache_repeats))
         print("duration per trial = {} [sec]".format(duration))
-        estimated_duration = duration * self.n_trials
+        if len(self.pgsql_servers) > 1:
+            print("targets = {}".format(len(self.pgsql_servers)))
+        estimated_duration = duration * self.n_trials / len(self.pgsql_servers)
         estimated_duration, unit = Common.pretty_time_format(estimated_duration)
         print("Estimated total duration = {:.1f} {}".format(estimated_duration, unit))
 
         print_title("Monitoring")
         print("linux_monitoring = {}".format(str(self.linux_monitoring)))
         print("sampling period = {} [sec]".format(self.monitoring_time))
+        print("monitoring_mode = {}".format(self.monitoring_mode))
+        print("metrics_store = {}".format(self.metrics_store))
+        print("statements_top = {}".format(self.statements_top))
+        print("wait_event_interval = {} [sec]".format(self.wait_event_interval))
+        print("latency_histogram = {}".format(str(self.latency_histogram)))
 
         print_title("PostgreSQL server configuration")
-        print("host          = '{}'".format(self.pgsql_server["host"]))
-        print("hostuser      = '{}'".format(self.pgsql_server["hostuser"]))
-        print("port          = {}".format(self.pgsql_server["port"]))
-        print("user          = '{}'".format(self.pgsql_server["user"]))
-        print("db            = '{}'".format(self.pgsql_server["db"]))
-        print("pg_ctl        = '{}'".format(self.pgsql_server["pg_ctl"]))
-        print("pgdata        = '{}'".format(self.pgsql_server["pgdata"]))
-        print("pgdata_backup = '{}'".format(self.pgsql_server["pgdata_backup"]))
+        for pgsql_server in self.pgsql_servers:
+            if len(self.pgsql_servers) > 1:
+                print("\n[[postgresql_server]]")
+            print("host          = '{}'".format(pgsql_server["host"]))
+            print("hostuser      = '{}'".format(pgsql_server["hostuser"]))
+            print("port          = {}".format(pgsql_server["port"]))
+            print("user          = '{}'".format(pgsql_server["user"]))
+            print("db            = '{}'".format(pgsql_server["db"]))
+            print("pg_ctl        = '{}'".format(pgsql_server["pg_ctl"]))
+            print("pgdata        = '{}'".format(pgsql_server["pgdata"]))
+            print("pgdata_backup = '{}'".format(pgsql_server["pgdata_backup"]))
+            if pgsql_server["pgdata_snapshot"] != None:
+                print("pgdata_snapshot = '{}'".format(pgsql_server["pgdata_snapshot"]))
+            if pgsql_server["clone"] != None:
+                print("clone         = {} (cpus = {}, memory_max = {})".format(
+                    pgsql_server["clone"], pgsql_server["clone_cpus"], pgsql_server["clone_memory_max"]
+                ))
 
         print_title("PostgreSQL configuration parameters")
         print_list(self.config_int, "config_int")
         print_list(self.config_real, "config_real")
 
+        print_title("Objectives")
+        for [metric, direction] in self.get_objectives():
+            print("{} ({})".format(metric, direction))
+        for [metric, op, limit] in self.constraints:
+            print("{} {} {} (constraint)".format(metric, op, limit))
+
         print_title("benchmark configuration")
+        if self.target == "native":
+            print_list(self.bench_conf["transactions"], "transactions")
+            if len(self.bench_conf["variables"]) > 0:
+                print_list(self.bench_conf["variables"], "variables")
+        elif self.target == "replay":
+            print("source = '{}'".format(self.bench_conf["source"]))
+            print("workload = '{}'".format(self.bench_conf["workload"]))
         print_list(self.bench_scenario, "scenario")
+        if len(self.bench_warmup) > 0:
+            print_list(self.bench_warmup, "warmup")
         if self.additional_monitor_items is not None:
             print_list(self.additional_monitor_items, "additional_monitor_items")
         self.print_connection_info(required_max_connections, total_connections)
@@ -248,6 +465,17 @@ class Conf(BaseConf):
             self.pgsql_server["hostuser"],
             # Note: "hostpasswd" should be entered using input_server_passwd().
             self.pgsql_server["hostpasswd"],
+            port=self.pgsql_server["port"],
+            pg_user=self.pgsql_server["user"],
+            pg_db=self.pgsql_server["db"],
+            pg_passwd=self.pgsql_server["passwd"],
+            restore_method=self.restore_method,
+            restore_verify=self.restore_verify,
+            pgdata_snapshot=self.pgsql_server["pgdata_snapshot"],
+            pgdata_snapshot_size=self.pgsql_server["pgdata_snapshot_size"],
+            clone=self.pgsql_server["clone"],
+            cpus=self.pgsql_server["clone_cpus"],
+            memory_max=self.pgsql_server["clone_memory_max"],
         )
 
     """
@@ -260,6 +488,44 @@ class Conf(BaseConf):
             self.log_dir,
         )
 
+    """
+    # Creates SteadyState instance, or returns None if the detection is disabled.
+    """
+
+    def create_steady_state(self):
+        if self.steady_state == "none":
+            return None
+        return SteadyState(self.steady_state, self.steady_state_window, self.steady_state_threshold)
+
+    """
+    # Creates ResultCache instance, or returns None if the cache is disabled.
+    """
+
+    def create_cache(self):
+        if self.cache == False:
+            return None
+        return ResultCache(
+            self.base_dir + Common.CACHE_DIR,
+            self.cache_max_entries,
+            self.cache_max_age,
+        )
+
+    """
+    # Returns the names of the tuned parameters.
+    """
+
+    def get_param_names(self):
+        names = []
+        if self.config_int != None:
+            for p in self.config_int:
+                if p[0] in Common.IGNORE_PARAMS:
+                    continue
+                names.append(str(p[0]))
+        if self.config_real != None:
+            for p in self.config_real:
+                names.append(str(p[0]))
+        return names
+
     """
     # Extracts the params from trial.
     """
@@ -289,12 +555,28 @@ class Conf(BaseConf):
 
         return conf_params
 
+    """
+    # Returns the constraints_func of the sampler.
+    """
+    def _constraints_func(self):
+        n = len(self.constraints)
+
+        # The constraint values (<= 0 if satisfied) are set by the objective of pg_tuner;
+        # a pruned trial has none.
+        def constraints(trial):
+            return trial.user_attrs.get("constraints", [0.0] * n)
+
+        return constraints
+
     """
     # Get sampler
     """
     def get_sampler(self):
         if self.sampling_mode == 'TPE':
-            sampler = optuna.samplers.TPESampler()
+            if len(self.constraints) > 0:
+                sampler = optuna.samplers.TPESampler(constraints_func=self._constraints_func())
+            else:
+                sampler = optuna.samplers.TPESampler()
         elif self.sampling_mode == 'Random':
             sampler = optuna.samplers.RandomSampler()
         elif self.sampling_mode == 'Grid':
@@ -309,3 +591,31 @@ class Conf(BaseConf):
             print("Error: sampler mode '{}' not supported.".format(self.sampling_mode))
             sys.exit(1)
         return sampler
+
+    """
+    # Get pruner
+    #
+    # Each trial reports the number of transactions executed so far
+    # every `report_interval` seconds; the step is the number of reports.
+    """
+
+    def get_pruner(self):
+        if self.pruner == "none":
+            pruner = optuna.pruners.NopPruner()
+        elif self.pruner == "median":
+            pruner = optuna.pruners.MedianPruner(
+                n_startup_trials=self.pruner_startup_trials,
+                n_warmup_steps=self.pruner_warmup_steps,
+            )
+        elif self.pruner == "percentile":
+            pruner = optuna.pruners.PercentilePruner(
+                self.pruner_percentile,
+                n_startup_trials=self.pruner_startup_trials,
+                n_warmup_steps=self.pruner_warmup_steps,
+            )
+        elif self.pruner == "hyperband":
+            pruner = optuna.pruners.HyperbandPruner(min_resource=max(1, self.pruner_warmup_steps))
+        else:
+            print("Error: pruner '{}' not supported.".format(self.pruner))
+            sys.exit(1)
+        return pruner
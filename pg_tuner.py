@@ -15,10 +15,11 @@ Usage:
 """
 
 import argparse
+import multiprocessing as mp
 import time, sys, csv, os
 import optuna
 
-from utils import Common, Log, PG, Repository
+from utils import Common, Log, PG, Repository, Stats, Monitor, MetricsStore
 from conf import Conf
 from benchmark import Sysbench, SysbenchScenario
 from benchmark import Pgbench, PgbenchScenario
@@ -35,54 +36,501 @@ class PgTuner:
         self.pg = None
         self.sc = None
         self.repo = None
+        self.cache = None
+
+        # [[target_name, pg, sc], ...]: one entry per PostgreSQL server.
+        self.targets = []
+        self.target_name = None
+        # {target_name: fingerprint}, used by the result cache.
+        self.fingerprints = {}
+        # True if the trials apply the parameters by reload instead of restart.
+        self.reload_only = False
 
         self.max_connections = None
 
-    def _objective(self, trial):
-        conf_params = self.conf.extract_params_from(trial)
+    def _write_timing(self, log_dir, timing):
+        timing_file = "{}{}".format(log_dir, Common.TIMING_FILE)
+        with open(timing_file, "w") as f:
+            writer = csv.writer(f, quotechar="'", quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerow(["item", "seconds"])
+            for [item, seconds] in timing:
+                writer.writerow([item, seconds])
+
+    """
+    # Returns the partition of the metrics store of the measurement, or None if the
+    # metrics are stored in the csv files.
+    """
+
+    def _metrics_partition(self, trial_number, repeat):
+        if self.conf.metrics_store != "parquet":
+            return None
+        return MetricsStore(self.repo.get_metrics_dir()).partition(trial_number, repeat)
+
+    """
+    # Returns the rows (dict) of the monitoring item of the measurement.
+    """
+
+    def _read_item(self, log_dir, metrics, item):
+        if metrics != None:
+            return metrics.read(item)
+        return Monitor.read_item(log_dir, item)
+
+    """
+    # Measures the configuration once: restores the database cluster, sets the configuration,
+    # starts the server, runs the warm-up and the scenario, and stops the server.
+    # Only the first measurement of the trial reports the progress to the pruner.
+    # `repeat` is the number of the measurement in the trial.
+    # Returns the score, or None if the trial is pruned.
+    """
+
+    def _measure(self, trial, conf_params, log_dir, first=True, repeat=0):
+        timing = []
+        metrics = self._metrics_partition(trial.number, repeat)
 
         # 0. restore database cluster
         if self.conf.restore_everytime:
-            self.pg.restore_backup()
+            _start = time.monotonic()
+            if self.pg.restore_backup() == False:
+                sys.exit(1)
+            timing.append(["restore_" + self.pg.restore_method, time.monotonic() - _start])
 
         # 1. set conf
-        if self.pg.set_conf(conf_params, self.max_connections) != True:
+        if self.pg.set_conf(conf_params, self.max_connections, log_dir) != True:
             sys.exit(1)
 
-        # 2. pg start
-        self.pg.start()
-        time.sleep(5) # Wait until Postgres is operational.
+        # 2. pg start (or reload if the server keeps running between trials)
+        _start = time.monotonic()
+        if self.reload_only and self.pg.is_running():
+            if self.pg.reload() == False:
+                sys.exit(1)
+            timing.append(["reload", time.monotonic() - _start])
+        else:
+            self.pg.start()
+            startup_time = self.pg.wait_until_ready(start_time=_start)
+            if startup_time == None:
+                sys.exit(1)
+            timing.append(["startup", startup_time])
 
         # 3. benchmark run
-        _log_dir = self.repo.get_log_dir(trial.number)
+        if len(self.conf.get_warmup()) > 0:
+            # Warm-up: not monitored and not scored.
+            _start = time.monotonic()
+            self.sc.play(self.conf.get_warmup())
+            timing.append(["warmup", time.monotonic() - _start])
 
-        cmd = "mv {} {}".format(Common.ADDITIONAL_CONF, _log_dir)
-        self.pg.exec_local(cmd)
+        def report(step, transactions):
+            trial.report(transactions, step)
+            return trial.should_prune()
 
         score, ret = self.sc.play(
             self.conf.bench_scenario,
-            _log_dir,
+            log_dir,
             self.conf.monitoring_time,
             self.conf.linux_monitoring,
             self.conf.additional_monitor_items,
+            report if self.conf.pruner != "none" and first == True else None,
+            self.conf.report_interval,
+            self.conf.create_steady_state(),
+            self.conf.latency_histogram,
+            self.conf.monitoring_mode,
+            metrics,
+            self.conf.statements_top,
+            self.conf.wait_event_interval,
         )
+        if len(self.sc.steady_onsets) > 0:
+            trial.set_user_attr("steady_state_onsets", [self.sc.steady_onsets[no] for no in sorted(self.sc.steady_onsets)])
 
-        ret_file = "{}{}".format(_log_dir, Common.RESULT_FILE)
+        ret_file = "{}{}".format(log_dir, Common.RESULT_FILE)
         with open(ret_file, "w") as f:
             writer = csv.writer(f, quotechar="'", quoting=csv.QUOTE_NONNUMERIC)
             writer.writerow(["no"] + self.sc.get_col_name())
             for [no, scenario, result] in ret:
                 writer.writerow([no] + result)
 
-        score_file = "{}{}".format(_log_dir, Common.SCORE_FILE)
+        score_file = "{}{}".format(log_dir, Common.SCORE_FILE)
         with open(score_file, "w") as f:
             f.write(str(score) + "\n")
 
+        if metrics != None:
+            metrics.write("result", ["no"] + self.sc.get_col_name(), [[no] + result for [no, scenario, result] in ret])
+            metrics.write("score", ["score", "pruned"], [[score, self.sc.pruned]])
+            metrics.close()
+
+        self._write_timing(log_dir, timing)
+
         # 4. pg stop
-        self.pg.stop()
+        if self.reload_only == False:
+            self.pg.stop()
+
+        if self.sc.pruned == True:
+            return None
+
+        if len(self.conf.get_constraints()) > 0:
+            constraint_values = trial.user_attrs.get("constraint_values", [])
+            constraint_values.append(self._get_constraint_values(log_dir, score, ret, metrics))
+            trial.set_user_attr("constraint_values", constraint_values)
+
+        return self._get_objective_values(log_dir, score, ret, metrics)
+
+    """
+    # Returns the stat (Common.COUNTER_STATS) of the counter in the summary of the
+    # monitor, or None if not found.
+    """
+
+    def _get_counter(self, log_dir, metrics, item, column, stat):
+        for row in self._read_item(log_dir, metrics, Common.MONITOR_SUMMARY):
+            if row["item"] == item and row["column"] == column:
+                if row[stat] in [None, "None"]:
+                    return None
+                return float(row[stat])
+        return None
+
+    """
+    # Returns the value of the metric ([objectives] section) of a measurement, or None
+    # if it cannot be obtained.
+    """
+
+    def _get_metric_value(self, metric, log_dir, score, ret, metrics):
+        value = None
+        counter = Common.parse_counter_metric(metric)
+        if metric == "score":
+            value = score
+        elif metric in ["tps", "latency_avg", "late"]:
+            value = self.sc.get_metric(metric, ret)
+        elif metric in Common.LATENCY_PERCENTILES:
+            if self.sc.histogram != None:
+                value = self.sc.histogram.percentile(Common.LATENCY_PERCENTILES[metric])
+                if value != None:
+                    value /= 1000.0  # [ms]
+            else:
+                value = self.sc.get_metric("latency_percentile", ret)
+        elif metric == "wal_bytes":
+            # pg_stat_wal.wal_bytes is cumulative; the total increase counts the resets.
+            value = self._get_counter(log_dir, metrics, "wal", "wal_bytes", "total")
+        elif metric == "cpu":
+            rows = self._read_item(log_dir, metrics, "mpstat")
+            if len(rows) > 0:
+                value = sum(100.0 - float(row["idle"]) for row in rows) / len(rows)
+        elif counter != None:
+            value = self._get_counter(log_dir, metrics, *counter)
+
+        if value == None:
+            if Log.warning <= Common.DEFAULT_LOG_LEVEL:
+                print("Warning: cannot get the objective metric '{}'.".format(metric))
+        return value
+
+    """
+    # Returns the list of the values of the objectives ([objectives] section) of a measurement.
+    # A value that cannot be obtained is NaN, which makes the trial fail.
+    """
+
+    def _get_objective_values(self, log_dir, score, ret, metrics=None):
+        values = []
+        for [metric, _] in self.conf.get_objectives():
+            value = self._get_metric_value(metric, log_dir, score, ret, metrics)
+            values.append(float("nan") if value == None else float(value))
+        return values
+
+    """
+    # Returns the list of the values of the constraints of a measurement, which are
+    # less than or equal to 0 if satisfied (optuna's constraints_func).
+    # A constraint whose metric cannot be obtained is violated.
+    """
+
+    def _get_constraint_values(self, log_dir, score, ret, metrics=None):
+        values = []
+        for [metric, op, limit] in self.conf.get_constraints():
+            value = self._get_metric_value(metric, log_dir, score, ret, metrics)
+            if value == None:
+                values.append(float("inf"))
+            elif op == "<=":
+                values.append(float(value) - limit)
+            else:
+                values.append(limit - float(value))
+        return values
+
+    """
+    # Returns True if the configuration may be better than the best trial so far,
+    # i.e. its confidence interval (or score, if measured once) reaches the best value.
+    # Single objective only.
+    """
+
+    def _is_promising(self, trial, scores):
+        try:
+            best_value = trial.study.best_value
+        except ValueError:
+            # No completed trial yet.
+            return False
+        score = Stats.score(scores, self.conf.repeat_statistic)
+        ci = Stats.confidence_interval(scores, score)
+        if self.conf.get_directions()[0] == "maximize":
+            return (ci[1] if ci != None else score) >= best_value
+        return (ci[0] if ci != None else score) <= best_value
+
+    def _objective(self, trial):
+        conf_params = self.conf.extract_params_from(trial)
+        _log_dir = self.repo.get_log_dir(trial.number)
+
+        trial.set_user_attr("target", self.target_name)
+        if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+            print("Notice: trial {} runs on '{}'.".format(trial.number, self.target_name))
+
+        # Look up the result cache.
+        scores = []
+        needed = self.conf.repeats
+        cache_key = None
+        if self.cache != None:
+            scenario = [self.conf.target, self.conf.bench_conf, self.conf.bench_scenario]
+            if len(self.conf.objectives) > 0:
+                scenario.append(self.conf.objectives)
+            if self.conf.steady_state != "none":
+                # The steady-state score is a tps, not a number of transactions.
+                scenario.append(
+                    [self.conf.steady_state, self.conf.steady_state_window, self.conf.steady_state_threshold]
+                )
+            # The warm-up and keeping the server running between trials change the
+            # state of the server (caches) that the scenario is measured on.
+            if len(self.conf.get_warmup()) > 0:
+                scenario.append(["warmup", self.conf.get_warmup()])
+            if self.reload_only:
+                scenario.append("reload_only")
+            cache_key = self.cache.key(
+                conf_params,
+                self.max_connections,
+                scenario,
+                self.fingerprints[self.target_name],
+            )
+            cached_scores = self.cache.get(cache_key)
+            if cached_scores != None:
+                scores = [m if type(m) is list else [m] for m in cached_scores]
+                needed = max(needed, 1 + self.conf.cache_repeats)
+                trial.set_user_attr("cached_scores", cached_scores)
+                if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                    print("Notice: trial {} found in the cache ({} scores).".format(trial.number, len(cached_scores)))
+
+        # Measure until the required number of scores, and re-measure if promising.
+        measured = 0
+        adapted = False
+        while True:
+            while len(scores) < needed:
+                values = self._measure(trial, conf_params, self.repo.get_log_dir(trial.number, measured), measured == 0, measured)
+                if values == None:
+                    raise optuna.TrialPruned()
+                measured += 1
+                if self.cache != None:
+                    cached_scores = self.cache.put(cache_key, values if len(values) > 1 else values[0])
+                    scores = [m if type(m) is list else [m] for m in cached_scores]
+                else:
+                    scores.append(values)
+
+            if (
+                adapted == False
+                and self.conf.adaptive_repeats > 0
+                and self._is_promising(trial, [m[0] for m in scores])
+            ):
+                if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                    print("Notice: trial {} is promising; measure {} more times.".format(trial.number, self.conf.adaptive_repeats))
+                needed = len(scores) + self.conf.adaptive_repeats
+                adapted = True
+                continue
+            break
+
+        # Constraints: the robust statistic of each constraint, read by the sampler.
+        if "constraint_values" in trial.user_attrs:
+            constraint_values = trial.user_attrs["constraint_values"]
+            trial.set_user_attr(
+                "constraints",
+                [
+                    Stats.score([c[j] for c in constraint_values], self.conf.repeat_statistic)
+                    for j in range(len(self.conf.get_constraints()))
+                ],
+            )
+
+        # Multi-objective: the robust statistic of each objective.
+        if self.conf.is_multi_objective():
+            values = [
+                Stats.score([m[j] for m in scores], self.conf.repeat_statistic)
+                for j in range(len(self.conf.get_objectives()))
+            ]
+            trial.set_user_attr("objective_values", scores)
+
+            score_file = "{}{}".format(_log_dir, Common.SCORE_AGGREGATE_FILE)
+            with open(score_file, "w") as f:
+                f.write(",".join(str(v) for v in values) + "\n")
+
+            return tuple(values)
+
+        # Robust score and its confidence interval.
+        scores = [m[0] for m in scores]
+        score = Stats.score(scores, self.conf.repeat_statistic)
+        trial.set_user_attr("scores", scores)
+        ci = Stats.confidence_interval(scores, score)
+        if ci != None:
+            trial.set_user_attr("score_ci", ci)
+
+        score_file = "{}{}".format(_log_dir, Common.SCORE_AGGREGATE_FILE)
+        with open(score_file, "w") as f:
+            f.write(str(score) + "\n")
 
         return float(score)
 
+    """
+    # Returns the best trial by the lower bound (upper bound if minimized) of the confidence
+    # interval of the score, among the trials that satisfy the constraints.
+    # Falls back to the trial with the best value if no trial has a confidence interval.
+    """
+
+    def _select_best_trial(self, study):
+        trials = [t for t in study.trials if t.state == optuna.trial.TrialState.COMPLETE]
+        if len(self.conf.get_constraints()) > 0:
+            feasible = [t for t in trials if all(c <= 0 for c in t.user_attrs.get("constraints", []))]
+            if len(feasible) > 0:
+                trials = feasible
+            elif Log.warning <= Common.DEFAULT_LOG_LEVEL:
+                print("Warning: no trial satisfies the constraints.")
+
+        candidates = [t for t in trials if "score_ci" in t.user_attrs]
+        if len(candidates) == 0:
+            if len(self.conf.get_constraints()) == 0:
+                return study.best_trial
+            if self.conf.get_directions()[0] == "maximize":
+                return max(trials, key=lambda t: t.value)
+            return min(trials, key=lambda t: t.value)
+        if self.conf.get_directions()[0] == "maximize":
+            return max(candidates, key=lambda t: t.user_attrs["score_ci"][0])
+        return min(candidates, key=lambda t: t.user_attrs["score_ci"][1])
+
+    """
+    # Creates PG and Scenario instances for each PostgreSQL server, and checks them.
+    # Returns the list of [max_connections, reserved_connections, superuser_reserved_connections].
+    """
+
+    def _create_targets(self):
+        connections = []
+        self.targets = []
+        for index in range(len(self.conf.pgsql_servers)):
+            self.conf.select_server(index)
+            pg = self.conf.create_pg()
+            if pg.provision() == False:
+                sys.exit(1)
+            sc = self.conf.create_bench_scenario()
+            connections.append(self.conf.check())
+            self.targets.append([self.conf.get_target_name(), pg, sc])
+            if self.cache != None:
+                self.fingerprints[self.conf.get_target_name()] = pg.get_fingerprint()
+
+        self.conf.select_server(0)
+        [self.target_name, self.pg, self.sc] = self.targets[0]
+        self.reload_only = self._check_reload_only()
+        return connections
+
+    """
+    # Classifies the search space by pg_settings.context, and returns True if
+    # the trials can apply the parameters by reload instead of restart.
+    """
+
+    def _check_reload_only(self):
+        if self.conf.reload_only == False:
+            return False
+
+        names = self.conf.get_param_names()
+        contexts = self.pg.get_param_contexts(names)
+        if contexts == None:
+            sys.exit(1)
+
+        restart_params = []
+        for name in names:
+            if name not in contexts:
+                print("Error: parameter '{}' not found in pg_settings.".format(name))
+                sys.exit(1)
+            if contexts[name] not in Common.RELOAD_CONTEXTS:
+                restart_params.append("{} ({})".format(name, contexts[name]))
+
+        if len(restart_params) > 0:
+            if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                print("Notice: reload_only is ignored because the following parameters require restart:")
+                for p in restart_params:
+                    print("\t{}".format(p))
+            return False
+
+        if self.conf.restore_everytime:
+            if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                print("Notice: reload_only is ignored because restore_everytime is true.")
+            return False
+
+        if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+            print("Notice: all parameters are reloadable; the server keeps running between trials.")
+        return True
+
+    def _delete_targets(self):
+        for [_, pg, sc] in self.targets:
+            pg.close()
+        self.targets = []
+
+    """
+    # Runs the trials of the study on the target `index`.
+    # This runs in a worker process; trials are handed out until n_trials is reached.
+    """
+
+    def _worker(self, index, storage, counter):
+        [self.target_name, self.pg, self.sc] = self.targets[index]
+        self.conf.select_server(index)
+
+        sampler = self.conf.get_sampler()
+        pruner = self.conf.get_pruner()
+        study = optuna.load_study(study_name=self.conf.log_dir, storage=storage, sampler=sampler, pruner=pruner)
+
+        while True:
+            with counter.get_lock():
+                if counter.value >= self.conf.n_trials:
+                    break
+                counter.value += 1
+            study.optimize(self._objective, n_trials=1)
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: worker for '{}' finished.".format(self.target_name))
+
+    """
+    # Runs the study on all targets concurrently, one worker process per target.
+    """
+
+    def _optimize_parallel(self, storage):
+        counter = mp.Value("i", 0)
+        process_list = []
+        for index in range(len(self.targets)):
+            process = mp.Process(name=self.targets[index][0], target=self._worker, args=(index, storage, counter))
+            process.start()
+            process_list.append(process)
+
+        for ps in process_list:
+            ps.join()
+
+    """
+    # Checks the scenario and the warm-up scenario, which runs before the scenario.
+    # Returns total_duration, required_max_connections, total_connections.
+    """
+
+    def _check_scenario(self):
+        (
+            total_duration,
+            required_max_connections,
+            total_connections,
+        ) = self.sc.check_scenario(self.conf.get_scenario())
+
+        if len(self.conf.get_warmup()) > 0:
+            (
+                warmup_duration,
+                warmup_max_connections,
+                warmup_connections,
+            ) = self.sc.check_scenario(self.conf.get_warmup())
+            total_duration += warmup_duration
+            required_max_connections = max(required_max_connections, warmup_max_connections)
+            total_connections = max(total_connections, warmup_connections)
+
+        total_duration *= self.conf.repeats
+
+        return total_duration, required_max_connections, total_connections
+
     def _confirm_duration(self, duration, n_trials, show_only=False):
         estimated_time = duration * n_trials
         if estimated_time > 10 * 60:  # over 10 [min]
@@ -162,7 +610,7 @@ class PgTuner:
             total_duration,
             required_max_connections,
             total_connections,
-        ) = self.sc.check_scenario(self.conf.get_scenario())
+        ) = self._check_scenario()
 
         self.conf.print_conf(
             total_duration, required_max_connections, total_connections
@@ -180,24 +628,18 @@ class PgTuner:
         self.conf = Conf(conf_file)
         self.conf.input_server_passwd()
 
-        self.pg = self.conf.create_pg()
-        self.sc = self.conf.create_bench_scenario()
-
-        [
-            max_connections,
-            reserved_connections,
-            superuser_reserved_connections,
-        ] = self.conf.check()
+        self._create_targets()
 
         (
             total_duration,
             required_max_connections,
             total_connections,
-        ) = self.sc.check_scenario(self.conf.get_scenario())
-        self._confirm_duration(total_duration, self.conf.n_trials, show_only=True)
+        ) = self._check_scenario()
+        self._confirm_duration(total_duration / len(self.targets), self.conf.n_trials, show_only=True)
 
         self.conf.print_connection_info(required_max_connections, total_connections)
 
+        self._delete_targets()
         del self.conf, self.pg, self.sc
 
     """
@@ -244,21 +686,31 @@ class PgTuner:
             sys.exit(1)
 
         self.conf.input_server_passwd()
-        self.pg = self.conf.create_pg()
 
-        # Gets pg_ctl status
-        pg_status = self.pg.is_running()
+        for index in range(len(self.conf.pgsql_servers)):
+            # Clones share the backup of the original cluster.
+            if self.conf.pgsql_servers[index]["clone"] not in (None, 0):
+                continue
+            self.conf.select_server(index)
+            if self.conf.pgsql_server["clone"] != None:
+                self.conf.select_origin()
+            self.pg = self.conf.create_pg()
 
-        # Stops PostgreSQL server if running.
-        if pg_status == True:
-            self.pg.stop()
+            # Gets pg_ctl status
+            pg_status = self.pg.is_running()
 
-        # pg.make_backup
-        self.pg.make_backup()
+            # Stops PostgreSQL server if running.
+            if pg_status == True:
+                self.pg.stop()
 
-        # Restart if pg_status == True
-        if pg_status == True:
-            self.pg.start()
+            # pg.make_backup
+            self.pg.make_backup()
+
+            # Restart if pg_status == True
+            if pg_status == True:
+                self.pg.start()
+
+            self.pg.close()
 
 
     """
@@ -272,6 +724,7 @@ class PgTuner:
 
         # Check repository
         self.repo = self.conf.create_repository()
+        self.cache = self.conf.create_cache()
 
         if self.repo.check_repo() == False:
             sys.exit(0)
@@ -279,66 +732,87 @@ class PgTuner:
         #
         self.conf.input_server_passwd()
 
-        self.pg = self.conf.create_pg()
-        self.sc = self.conf.create_bench_scenario()
-
         # check
-        [
-            max_connections,
-            reserved_connections,
-            superuser_reserved_connections,
-        ] = self.conf.check()
+        connections = self._create_targets()
 
         (
             total_duration,
             required_max_connections,
             total_connections,
-        ) = self.sc.check_scenario(self.conf.get_scenario())
+        ) = self._check_scenario()
 
         # Confirm duration
-        if self._confirm_duration(total_duration, self.conf.n_trials) == False:
+        if self._confirm_duration(total_duration / len(self.targets), self.conf.n_trials) == False:
+            self._delete_targets()
             del self.sc, self.pg, self.conf
             sys.exit(0)
 
         # Check max_connection
-        if (
-            self._check_max_connections(
-                [max_connections, reserved_connections, superuser_reserved_connections],
-                required_max_connections,
-            )
-            == False
-        ):
-            del self.sc, self.pg, self.conf
-            sys.exit(0)
+        for [max_connections, reserved_connections, superuser_reserved_connections] in connections:
+            if (
+                self._check_max_connections(
+                    [max_connections, reserved_connections, superuser_reserved_connections],
+                    required_max_connections,
+                )
+                == False
+            ):
+                self._delete_targets()
+                del self.sc, self.pg, self.conf
+                sys.exit(0)
 
         self.conf.print_conf(total_duration, required_max_connections, total_connections)
         self.conf.dump_conf()
 
         # Cold start
-        self.pg.stop()
+        for [_, pg, _] in self.targets:
+            pg.stop()
 
         # Optimize parameters
         sampler = self.conf.get_sampler()
-
-        if "sqlite3" in sys.modules:
-            storage = "sqlite:///{}{}{}".format(
-                self.conf.base_dir, self.conf.log_dir, Common.STUDY_DB
+        pruner = self.conf.get_pruner()
+        _start = time.monotonic()
+
+        if len(self.targets) > 1:
+            storage = self.conf.get_storage()
+            if storage == None:
+                print("Error: running trials on several targets requires 'sqlite3' module or 'storage' in [trial] section.")
+                sys.exit(1)
+            study = optuna.create_study(
+                directions=self.conf.get_directions(), study_name=self.conf.log_dir, storage=storage, sampler=sampler, pruner=pruner,
             )
+            self._optimize_parallel(storage)
+        elif self.conf.get_storage() != None:
             study = optuna.create_study(
-                direction="maximize", study_name=self.conf.log_dir, storage=storage, sampler=sampler,
+                directions=self.conf.get_directions(), study_name=self.conf.log_dir, storage=self.conf.get_storage(), sampler=sampler, pruner=pruner,
             )
+            study.optimize(self._objective, n_trials=self.conf.n_trials)
         else:
-            study = optuna.create_study(direction="maximize", sampler=sampler)
-        study.optimize(self._objective, n_trials=self.conf.n_trials)
+            study = optuna.create_study(directions=self.conf.get_directions(), sampler=sampler, pruner=pruner)
+            study.optimize(self._objective, n_trials=self.conf.n_trials)
 
         # Store result
-        self.conf.dump_best_result(study.best_value, study.best_params, study.best_trial, study.best_trials)
-        print("Best objective value: {}".format(study.best_value))
-        print("Best parameter: {}".format(study.best_params))
+        if self.conf.is_multi_objective():
+            self.conf.dump_pareto_front(study.best_trials)
+            self.conf.dump_targets(study.trials, time.monotonic() - _start)
+            print("Pareto front: {} trials".format(len(study.best_trials)))
+            for t in study.best_trials:
+                print("  trial {}: {}".format(t.number, t.values))
+        else:
+            best_trial = self._select_best_trial(study)
+            self.conf.dump_best_result(best_trial.value, best_trial.params, best_trial, study.best_trials)
+            self.conf.dump_targets(study.trials, time.monotonic() - _start)
+            print("Best objective value: {}".format(best_trial.value))
+            if "score_ci" in best_trial.user_attrs:
+                print("95% confidence interval: {}".format(best_trial.user_attrs["score_ci"]))
+            print("Best parameter: {}".format(best_trial.params))
 
         #
-        self.pg.start()
+        for [_, pg, _] in self.targets:
+            # With reload_only, the server is still running.
+            if self.reload_only == False or pg.is_running() == False:
+                pg.start()
 
+        self._delete_targets()
         del self.conf, self.pg, self.sc, self.repo
 
     """
@@ -3,3 +3,9 @@ from .pg import PG
 from .psql import Psql
 from .repository import Repository
 from .monitor import Monitor
+from .metrics_store import MetricsStore, MetricsPartition
+from .ssh import SSHPool
+from .cache import ResultCache
+from .steady_state import SteadyState
+from .stats import Stats
+from .histogram import Histogram
@@ -0,0 +1,140 @@
+"""
+cache.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import hashlib, json
+import os, sys, time
+from .common import Common, Log
+
+
+"""
+# Result cache.
+#
+# The scores of the trials are stored in `cache_dir`, one json file per key.
+# The key is the sha256 of the normalized configuration parameters, the scenario
+# and the target fingerprint, so the cache can be shared by the studies.
+"""
+
+
+class ResultCache(Common):
+    def __init__(
+        self,
+        cache_dir,
+        max_entries=Common.DEFAULT_CACHE_MAX_ENTRIES,
+        max_age=Common.DEFAULT_CACHE_MAX_AGE,
+    ):
+        self.cache_dir = Common.set_dir(cache_dir)
+        self.max_entries = max_entries
+        self.max_age = max_age  # [day]
+
+        if os.path.isdir(self.cache_dir) == False:
+            os.makedirs(self.cache_dir, mode=0o770, exist_ok=True)
+
+    def _normalize_value(self, value):
+        value = str(value).strip().strip("'")
+        # Split the number and the unit, e.g. "32MB" -> ["32", "MB"].
+        i = len(value)
+        while i > 0 and value[i - 1].isalpha():
+            i -= 1
+        number, unit = value[:i], value[i:]
+        try:
+            number = "{:.6g}".format(float(number))
+        except ValueError:
+            return value
+        return number + unit
+
+    def _path(self, key):
+        return "{}{}.json".format(self.cache_dir, key)
+
+    """
+    Public methods
+    """
+
+    """
+    # Returns the key of the configuration.
+    # `conf_params` is a list of [name, value] used to render trial.conf.
+    """
+
+    def key(self, conf_params, max_connections, scenario, fingerprint):
+        params = sorted(
+            [str(name).strip().lower(), self._normalize_value(value)] for [name, value] in conf_params
+        )
+        if max_connections != None:
+            params.append(["max_connections", str(max_connections)])
+        material = json.dumps([params, scenario, fingerprint], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    """
+    # Returns the list of scores stored for the key, or None if not found or expired.
+    """
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if self.max_age != None and time.time() - os.stat(path).st_mtime > self.max_age * 86400:
+                self._remove(path)
+                return None
+            with open(path) as f:
+                scores = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # Update the access time for the eviction.
+        os.utime(path)
+        return scores
+
+    """
+    # Appends the score to the entry of the key, and returns the scores of the entry.
+    """
+
+    def put(self, key, score):
+        scores = self.get(key)
+        if scores == None:
+            scores = []
+        scores.append(score)
+
+        # Write to a temporary file and rename it, since several workers may share the cache.
+        path = self._path(key)
+        tmp = "{}.{}".format(path, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(scores, f)
+        os.replace(tmp, path)
+
+        self.evict()
+        return scores
+
+    """
+    # Removes the entries not used for `max_age` days, and then the least recently used
+    # entries while the number of entries exceeds `max_entries`.
+    """
+
+    def evict(self):
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json") == False:
+                continue
+            path = self.cache_dir + name
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if self.max_age != None and now - st.st_mtime > self.max_age * 86400:
+                self._remove(path)
+                continue
+            entries.append([st.st_mtime, path])
+
+        if self.max_entries != None and len(entries) > self.max_entries:
+            entries.sort()
+            for [_, path] in entries[: len(entries) - self.max_entries]:
+                self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+                print("Debug1: cache entry '{}' removed.".format(path))
+        except OSError:
+            pass
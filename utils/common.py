@@ -35,6 +35,33 @@ class Common:
     CHANNEL_TIMEOUT = 5
 
     IGNORE_PARAMS = ["max_connections", "shared_buffers"]
+    # pg_settings.context of the parameters which can be changed without restart.
+    RELOAD_CONTEXTS = ["sighup", "backend", "superuser-backend", "superuser", "user"]
+
+    # ["copy" | "rsync" | "reflink" | "btrfs" | "zfs" | "lvm" | "incremental"]
+    DEFAULT_RESTORE_METHOD = "copy"
+    MANIFEST_SUFFIX = ".manifest"
+
+    # Cloned clusters
+    CLONE_SUFFIX = ".clone"
+    CGROUP_ROOT = "/sys/fs/cgroup/"
+    CGROUP_PREFIX = "pg_tuner"
+    DEFAULT_SNAPSHOT_SIZE = "10G"
+
+    # Readiness probe after server start [sec]
+    STARTUP_TIMEOUT = 300
+    STARTUP_PROBE_INTERVAL = 0.1
+    STARTUP_PROBE_MAX_INTERVAL = 2.0
+    # Connection errors which mean that the server is not ready yet.
+    # Any other error (e.g. authentication, pg_hba.conf, missing database) fails at once.
+    STARTUP_ERRORS = [
+        "the database system is starting up",
+        "the database system is not yet accepting connections",
+        "the database system is in recovery mode",
+        "Connection refused",
+        "No such file or directory",
+        "timeout expired",
+    ]
 
     """
     # Repository
@@ -44,9 +71,71 @@ class Common:
     BEST_RESULT_FILE = "best_result"
     STAT_FILE = "stat.dat"
     RESULT_FILE = "result.csv"
+    PROGRESS_FILE = "progress.csv"
     SCORE_FILE = "score.txt"
+    SCORE_AGGREGATE_FILE = "score_aggregate.txt"  # score of the trial from all measurements
+    TIMING_FILE = "timing.csv"
 
     STUDY_DB = "study.db"
+    STUDY_DB_TIMEOUT = 60
+    TARGETS_FILE = "targets.csv"
+
+    # Result cache, shared by the studies in the repository.
+    CACHE_DIR = ".cache"
+    DEFAULT_CACHE_MAX_ENTRIES = 10000
+    DEFAULT_CACHE_MAX_AGE = 30  # [day]
+
+    BENCHMARK_TARGETS = ["sysbench", "pgbench", "native", "replay"]
+    # Scenario phases
+    DEFAULT_RAMP_STEPS = 5
+
+    # Workload replay
+    REPLAY_SOURCES = ["pg_stat_statements", "csvlog"]
+    DEFAULT_REPLAY_CAPTURE_LIMIT = 20
+    DEFAULT_REPLAY_PARAM_RANGE = [1, 100000]
+
+    """
+    # monitoring
+    """
+    DEFAULT_MONITORING_TIME = 10  # [sec]
+    MONITORING_MODES = ["client", "server"]
+    DEFAULT_MONITORING_MODE = "client"
+    MONITOR_FLUSH_INTERVAL = 5  # [sec] between the writes of the buffered samples
+    MONITOR_STOP_TIMEOUT = 60  # [sec] to write the samples after the benchmark
+    MONITOR_RING_TABLE = "pg_tuner_monitor_ring"
+    MONITOR_RING_SIZE = 100000  # max number of samples kept by the server-side collector
+
+    # Cumulative counters of the monitoring items: {item: [column, ...]}.
+    # Their per-interval deltas and per-second rates are added to the samples.
+    MONITOR_COUNTERS = {
+        "checkpointer": ["num_timed", "num_requested", "write_time", "sync_time", "buffers_written"],
+        "bgwriter": ["buffers_clean", "maxwritten_clean", "buffers_alloc"],
+        "wal": ["wal_records", "wal_fpi", "wal_bytes", "wal_buffers_full", "wal_write", "wal_sync", "wal_write_time", "wal_sync_time"],
+        "autovacuum": ["reads", "writes", "writebacks", "extends", "hits", "evictions", "reuses", "fsyncs"],
+        "io": ["reads", "writes", "writebacks", "extends", "hits", "evictions", "reuses", "fsyncs"],
+        "iostat": ["kb_read", "kb_wrtn", "kb_dscd"],
+        "netstat": ["rx_ok", "tx_ok"],
+    }
+    COUNTER_STATS = ["total", "mean_rate", "max_rate", "resets"]
+    MONITOR_SUMMARY = "monitor_summary"
+
+    # pg_stat_statements and wait events
+    DEFAULT_STATEMENTS_TOP = 0  # 0: disabled
+    STATEMENTS_MODULE = "pg_stat_statements"
+    STATEMENTS = "statements"
+    STATEMENT_COUNTERS = [
+        "calls", "total_exec_time", "rows",
+        "shared_blks_hit", "shared_blks_read", "shared_blks_dirtied", "shared_blks_written",
+        "temp_blks_read", "temp_blks_written", "wal_bytes",
+    ]
+    DEFAULT_WAIT_EVENT_INTERVAL = 0  # [sec], 0: disabled
+    WAIT_EVENTS = "wait_events"
+
+    # Metrics store
+    METRICS_STORES = ["csv", "parquet"]
+    DEFAULT_METRICS_STORE = "csv"
+    METRICS_STORE_DIR = "metrics"
+    METRICS_STORE_FILE = "part-0.parquet"
 
     """
     # psql
@@ -57,6 +146,40 @@ class Common:
     # benchmark
     """
     TIMEOUT_MARGIN = 20
+    KILL_GRACE_PERIOD = 5  # [sec] between SIGTERM and SIGKILL
+    SUPERVISOR_LINE_LIMIT = 1024 * 1024  # [byte] max length of an output line of a benchmark
+    REPORT_INTERVAL = 5  # [sec]
+
+    # Repeated measurements
+    DEFAULT_REPEATS = 1
+    DEFAULT_ADAPTIVE_REPEATS = 0
+    DEFAULT_REPEAT_STATISTIC = "median"
+    DEFAULT_TRIM_PROPORTION = 0.2
+
+    # Latency histogram
+    HISTOGRAM_FILE = "histogram.json"
+    HISTOGRAM_SUB_BUCKET_BITS = 8
+
+    # Objectives
+    OBJECTIVE_METRICS = [
+        "score", "tps", "latency_avg",
+        "latency_p50", "latency_p90", "latency_p95", "latency_p99", "latency_p999",
+        "wal_bytes", "cpu", "late",
+    ]  # and the counters: "<item>.<column>.<stat>" (MONITOR_COUNTERS, COUNTER_STATS)
+    LATENCY_PERCENTILES = {
+        "latency_p50": 50.0,
+        "latency_p90": 90.0,
+        "latency_p95": 95.0,
+        "latency_p99": 99.0,
+        "latency_p999": 99.9,
+    }
+    PARETO_FILE = "pareto_front.csv"
+
+    # Steady-state detection
+    DEFAULT_STEADY_STATE = "none"
+    DEFAULT_STEADY_STATE_WINDOW = 6  # [intervals]
+    DEFAULT_STEADY_STATE_CV = 0.05
+    DEFAULT_STEADY_STATE_CUSUM = 3.0
 
     """
     # postgresql default params
@@ -78,6 +201,10 @@ class Common:
     # ["TPE" |  "Random" | "Grid" | "CmaEs" | "QMC" | "GP" ]
     # https://optuna.readthedocs.io/en/stable/reference/samplers/index.html
     DEFAULT_SAMPLING_MODE = "TPE"
+    DEFAULT_PRUNER = "none"
+    DEFAULT_PRUNER_STARTUP_TRIALS = 5
+    DEFAULT_PRUNER_WARMUP_STEPS = 2
+    DEFAULT_PRUNER_PERCENTILE = 25.0
 
     """
     Public methods
@@ -107,6 +234,10 @@ class Common:
 
     """
     # Estimates the maximum number of concurrent connections the scenario will require.
+    #
+    # Each task of the scenario is [start, connections, duration, ...]; the other
+    # elements (e.g. the options table of a rate-limited task) are ignored, since
+    # a rate limit does not change the number of connections.
     """
     def compute_max_connections(scenario, margin=5):
         max_connections = 0
@@ -134,3 +265,16 @@ class Common:
             if connections > max_connections:
                 max_connections = connections
         return max_connections
+
+    """
+    # Returns [item, column, stat] of a counter metric ("<item>.<column>.<stat>",
+    # e.g. "wal.wal_bytes.mean_rate"), or None if the metric is not a counter.
+    """
+    def parse_counter_metric(metric):
+        names = metric.split(".")
+        if len(names) != 3:
+            return None
+        [item, column, stat] = names
+        if column not in Common.MONITOR_COUNTERS.get(item, []) or stat not in Common.COUNTER_STATS:
+            return None
+        return names
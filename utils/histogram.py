@@ -0,0 +1,145 @@
+"""
+histogram.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import json, sys
+from .common import Common, Log
+
+
+"""
+# Latency histogram with log-linear buckets (in the manner of HdrHistogram).
+#
+# Values are integers in microseconds. Values less than 2^`sub_bucket_bits` are
+# recorded exactly; larger values are recorded in buckets whose width doubles at
+# every power of two, each split into 2^(`sub_bucket_bits` - 1) sub-buckets,
+# so the relative error is less than 1 / 2^(`sub_bucket_bits` - 1).
+#
+# Only non-empty buckets are stored, so histograms are small enough to be
+# merged across processes and stored with each trial.
+"""
+
+
+class Histogram:
+    def __init__(self, sub_bucket_bits=Common.HISTOGRAM_SUB_BUCKET_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count >> 1
+        self.counts = {}  # {index: count}
+        self.total = 0
+
+    def _index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        exponent = value.bit_length() - self.sub_bucket_bits
+        sub = value >> exponent
+        return self.sub_bucket_count + (exponent - 1) * self.sub_bucket_half + (sub - self.sub_bucket_half)
+
+    """
+    # Returns [lowest, highest] value of the bucket.
+    """
+
+    def _range(self, index):
+        if index < self.sub_bucket_count:
+            return index, index
+        k = index - self.sub_bucket_count
+        exponent = k // self.sub_bucket_half + 1
+        sub = k % self.sub_bucket_half + self.sub_bucket_half
+        return sub << exponent, ((sub + 1) << exponent) - 1
+
+    """
+    Public methods
+    """
+
+    """
+    # Records the value [us] `count` times.
+    """
+
+    def record(self, value, count=1):
+        value = int(value)
+        if value < 0 or count <= 0:
+            return
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+
+    """
+    # Adds the counts of the other histogram.
+    """
+
+    def merge(self, other):
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            # Re-record the other's buckets at their midpoints.
+            for index, count in other.counts.items():
+                [low, high] = other._range(index)
+                self.record((low + high) // 2, count)
+            return
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+
+    """
+    # Returns the value [us] at the percentile (0-100), or None if empty.
+    # The value is the midpoint of the bucket containing the percentile.
+    """
+
+    def percentile(self, q):
+        if self.total == 0:
+            return None
+        rank = max(1, int(self.total * q / 100.0 + 0.5))
+        cumulative = 0
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            if cumulative >= rank:
+                [low, high] = self._range(index)
+                return (low + high) / 2
+        [low, high] = self._range(max(self.counts))
+        return (low + high) / 2
+
+    """
+    # Returns the number of the values greater than the value [us].
+    # The values are compared at the midpoints of the buckets.
+    """
+
+    def count_above(self, value):
+        count = 0
+        for index, c in self.counts.items():
+            [low, high] = self._range(index)
+            if (low + high) / 2 > value:
+                count += c
+        return count
+
+    def mean(self):
+        if self.total == 0:
+            return None
+        s = 0.0
+        for index, count in self.counts.items():
+            [low, high] = self._range(index)
+            s += (low + high) / 2 * count
+        return s / self.total
+
+    def to_dict(self):
+        return {
+            "unit": "us",
+            "sub_bucket_bits": self.sub_bucket_bits,
+            "total": self.total,
+            "counts": [[index, self.counts[index]] for index in sorted(self.counts)],
+        }
+
+    @staticmethod
+    def from_dict(d):
+        h = Histogram(d["sub_bucket_bits"])
+        for [index, count] in d["counts"]:
+            h.counts[index] = count
+        h.total = d["total"]
+        return h
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+    @staticmethod
+    def load(filename):
+        with open(filename) as f:
+            return Histogram.from_dict(json.load(f))
@@ -0,0 +1,175 @@
+"""
+metrics_store.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import datetime
+import os, sys
+from .common import Common, Log
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except:
+    pass
+
+
+"""
+# Columnar store of the metrics of the trials (Parquet, requires pyarrow).
+#
+# Each item (a monitoring item such as "wal", or "progress" and "result") is a dataset
+# partitioned by trial and repeat (hive partitioning):
+#
+#   <study dir>/metrics/<item>/trial=<trial>/repeat=<repeat>/part-0.parquet
+#
+# A partition is written incrementally, one row group per write(), by the monitor
+# process (monitoring items) and by the scenario runner (progress and result).
+# The columns are typed from the first rows written: numbers (including the numbers
+# in text) are float64, datetimes are timestamp[ms], booleans are bool and the others
+# are string. scan() reads an item of all trials in one vectorized scan.
+"""
+
+
+def _arrow_type(values):
+    for value in values:
+        if value == None:
+            continue
+        if isinstance(value, bool):
+            return pa.bool_()
+        if isinstance(value, (int, float)):
+            return pa.float64()
+        if isinstance(value, datetime.datetime):
+            return pa.timestamp("ms")
+        try:
+            float(value)
+            return pa.float64()
+        except (TypeError, ValueError):
+            return pa.string()
+    return pa.float64()
+
+
+def _coerce(value, _type):
+    if value == None:
+        return None
+    if _type == pa.float64():
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if _type == pa.string():
+        return str(value)
+    if _type == pa.bool_():
+        return value in (True, "True", "true", "t")
+    return value
+
+
+class MetricsPartition:
+    def __init__(self, store_dir, trial, repeat=0):
+        self.store_dir = Common.set_dir(store_dir)
+        self.trial = trial
+        self.repeat = repeat
+        # {item: ParquetWriter}
+        self.writers = {}
+
+    def _path(self, item):
+        return "{}{}/trial={}/repeat={}/{}".format(self.store_dir, item, self.trial, self.repeat, Common.METRICS_STORE_FILE)
+
+    """
+    Public methods
+    """
+
+    """
+    # Appends the rows (lists in the order of colnames) of the item as a row group.
+    # The columns in `text` are stored as string (e.g. identifiers that are numbers).
+    """
+
+    def write(self, item, colnames, rows, text=()):
+        if len(rows) == 0:
+            return True
+
+        try:
+            if item not in self.writers:
+                columns = list(zip(*rows))
+                schema = pa.schema(
+                    [(name, pa.string() if name in text else _arrow_type(columns[i])) for i, name in enumerate(colnames)]
+                )
+                path = self._path(item)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.writers[item] = pq.ParquetWriter(path, schema)
+
+            writer = self.writers[item]
+            arrays = [
+                pa.array([_coerce(row[i], field.type) for row in rows], type=field.type)
+                for i, field in enumerate(writer.schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=writer.schema))
+        except Exception as e:
+            if Log.error <= Common.DEFAULT_LOG_LEVEL:
+                print("Error: could not write the metrics '{}': {}".format(item, e))
+            return False
+        return True
+
+    """
+    # Returns the rows (dict) of the item of this partition, or [] if not found.
+    """
+
+    def read(self, item):
+        path = self._path(item)
+        if os.path.isfile(path) == False:
+            return []
+        return pq.read_table(path).to_pylist()
+
+    """
+    # Closes the files of the items, which completes them.
+    """
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+class MetricsStore:
+    def __init__(self, store_dir):
+        self.store_dir = Common.set_dir(store_dir)
+
+    """
+    Public methods
+    """
+
+    """
+    # Returns True if pyarrow is available.
+    """
+
+    @staticmethod
+    def available():
+        return "pyarrow" in sys.modules
+
+    """
+    # Returns the partition of the measurement `repeat` of the trial.
+    """
+
+    def partition(self, trial, repeat=0):
+        return MetricsPartition(self.store_dir, trial, repeat)
+
+    """
+    # Returns the items in the store.
+    """
+
+    def items(self):
+        if os.path.isdir(self.store_dir) == False:
+            return []
+        return sorted(name for name in os.listdir(self.store_dir) if os.path.isdir(self.store_dir + name))
+
+    """
+    # Reads the item of all trials in one scan and returns pyarrow.Table, which has
+    # the partition columns "trial" and "repeat" as well.
+    # `columns` and `filter` (pyarrow.dataset expression, e.g. ds.field("trial") < 100)
+    # are pushed down to the scan.
+    """
+
+    def scan(self, item, columns=None, filter=None):
+        dataset = ds.dataset(self.store_dir + item, format="parquet", partitioning="hive")
+        return dataset.to_table(columns=columns, filter=filter)
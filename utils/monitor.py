@@ -4,11 +4,40 @@ monitor.py
   Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
 """
 
-import sys, os
+import csv, datetime, json, threading
+import sys, os, time
 from .common import Log, Common
 from .psql import Psql
 
 
+"""
+# Returns the number of the text of a counter (int if possible), or None.
+"""
+
+
+def _number(value):
+    if value == None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+"""
+# Returns the increase of a cumulative counter from `previous` to `current`, and
+# whether the counter was reset.
+# The counters are int64 or float8, which do not wrap; a decrease is a reset
+# (e.g. pg_stat_reset_shared()), and the counter has restarted from 0.
+"""
+
+
+def _counter_delta(previous, current):
+    if current >= previous:
+        return current - previous, False
+    return current, True
+
+
 class Monitor(Psql):
     def __init__(
         self,
@@ -20,52 +49,57 @@ class Monitor(Psql):
         log_dir,
         linux_monitoring,
         additional_monitor_items=None,
+        monitoring_time=Common.DEFAULT_MONITORING_TIME,
+        metrics=None,
+        statements_top=Common.DEFAULT_STATEMENTS_TOP,
+        wait_event_interval=Common.DEFAULT_WAIT_EVENT_INTERVAL,
     ):
         super().__init__(host, port, user, database, password)
         self.log_dir = Common.set_dir(log_dir)
         self.linux_monitoring = linux_monitoring
         self.additional_monitor_items = additional_monitor_items
+        self.monitoring_time = monitoring_time
+        # MetricsPartition: if set, the samples are written to the metrics store instead of the csv files.
+        self.metrics = metrics
 
         self.connection = None
         self.count = 0
 
-    """
-    Public methods
-    """
-
-    """
-    # get monitoring items
-    """
-    def get_basic_monitoring_items(self):
-        return ["timestamp", "numconnections", "checkpointer", "bgwriter", "wal", "autovacuum", "io"]
-
-    def get_linux_monitoring_items(self):
-        return ["vmstat", "mpstat", "free", "iostat", "netstat"]
+        self.items = self._items()
+        self.query = self._sample_query()
+        # Open csv files, column names and buffered rows of the items:
+        # {item: file}, {item: [colname, ...]}, {item: [row, ...]}
+        self.files = {}
+        self.colnames = {}
+        self.buffer = {}
+        self.last_flush = time.monotonic()
 
-    """
-    # Connects to the PostgreSQL server.
-    """
+        # Cumulative counters of the items, their previous values and their summary:
+        # {item: [column, ...]}, {item: [timestamp, [value, ...]]},
+        # {item: {column: [total, elapsed, max_rate, resets]}}
+        self.counters = {}
+        self.previous = {}
+        self.summary = {}
 
-    def start(self):
+        self.collector = None
 
-        if self.connect():
-            if Log.info <= Common.DEFAULT_LOG_LEVEL:
-                print("Info: Monitor: Connection established.")
-            return True
-        else:
-            return False
+        # pg_stat_statements: the number of the statements written (0: disabled), and
+        # the snapshot at the start: {(userid, dbid, queryid): [counter, ..., query]}
+        self.statements_top = statements_top
+        self.statements = None
+        # Wait events: the sampling interval (0: disabled), the sampler thread, and the
+        # histogram: {(backend_type, wait_event_type, wait_event): count}
+        self.wait_event_interval = wait_event_interval
+        self.wait_sampler = None
+        self.wait_events = {}
+        self.wait_samples = 0
 
     """
-    # Executes queries to monitor PostgreSQL server statistics and saves the results.
+    # Returns the list of [item, sql] of the monitoring items, except "timestamp".
     """
 
-    def monitoring(self):
-
-        _print_column = True if self.count == 0 else False
-        self.count += 1
-
+    def _items(self):
         sql = [
-            ["timestamp", "SELECT current_timestamp::timestamp(0);"],
             [
                 "numconnections",
                 "SELECT sum(numbackends) AS numconnections FROM pg_stat_database;",
@@ -112,44 +146,585 @@ class Monitor(Psql):
         if self.additional_monitor_items != None:
             sql += self.additional_monitor_items
 
-        # Main loop
-        for [item, sql] in sql:
-            cur = self.exec_select_cmd(sql)
-            if cur == None:
-                if Log.error <= Common.DEFAULT_LOG_LEVEL:
-                    print("Error: Monitor failed to issue sql:'{}'".format(sql))
-                return False
+        return sql
+
+    """
+    # Returns the columns of the sample: the sample timestamp, the same timestamp in
+    # epoch seconds with full precision and, for each item, the rows of the item
+    # aggregated into a json array (NULL if no row).
+    # The timestamp is for display, and has the precision of milliseconds if the interval
+    # is less than a second or fractional; the rates of the counters use the epoch.
+    """
+
+    def _sample_columns(self, timestamp="current_timestamp"):
+        precision = 0 if float(self.monitoring_time).is_integer() and self.monitoring_time >= 1 else 3
+        columns = [
+            "{}::timestamp({})::text".format(timestamp, precision),
+            "extract(epoch FROM {})::text".format(timestamp),
+        ]
+        for [item, sql] in self.items:
+            columns.append("(SELECT json_agg(_t)::text FROM ({}) _t)".format(sql.strip().rstrip(";")))
+        return columns
+
+    """
+    # Returns the query that collects the whole sample in one round trip.
+    # All items see the same current_timestamp and the same statistics snapshot.
+    """
+
+    def _sample_query(self):
+        return "SELECT " + ", ".join(self._sample_columns()) + ";"
+
+    """
+    # Returns the DO block of the server-side collector.
+    #
+    # It takes a sample every `monitoring_time` seconds at absolute deadlines (a sample
+    # that is late skips the missed deadlines), and stores it in the unlogged table
+    # Common.MONITOR_RING_TABLE, a ring buffer of Common.MONITOR_RING_SIZE samples.
+    # Each sample is committed, so the samples survive the cancel by stop_collector().
+    # It ends by itself after `max_duration` seconds.
+    """
+
+    def _collector_block(self, max_duration):
+        columns = self._sample_columns("clock_timestamp()")
+        return """DO $pg_tuner$
+DECLARE
+    pg_tuner_no bigint := 0;
+    pg_tuner_next timestamptz := clock_timestamp();
+    pg_tuner_end timestamptz := clock_timestamp() + interval '{duration} seconds';
+BEGIN
+    WHILE clock_timestamp() < pg_tuner_end LOOP
+        INSERT INTO {table} VALUES (pg_tuner_no % {size}, pg_tuner_no, ARRAY[{columns}])
+            ON CONFLICT (slot) DO UPDATE SET no = EXCLUDED.no, sample = EXCLUDED.sample;
+        COMMIT;
+        pg_tuner_no := pg_tuner_no + 1;
+        pg_tuner_next := pg_tuner_next + interval '{interval} seconds';
+        WHILE pg_tuner_next < clock_timestamp() LOOP
+            pg_tuner_next := pg_tuner_next + interval '{interval} seconds';
+        END LOOP;
+        PERFORM pg_sleep(extract(epoch FROM pg_tuner_next - clock_timestamp()));
+    END LOOP;
+END
+$pg_tuner$;""".format(
+            duration=max_duration,
+            table=Common.MONITOR_RING_TABLE,
+            size=Common.MONITOR_RING_SIZE,
+            columns=", ".join(columns),
+            interval=self.monitoring_time,
+        )
+
+    """
+    # Adds the sample (a row of the columns of _sample_columns()) to the buffer.
+    """
+
+    def _add_sample(self, sample):
+        timestamp = datetime.datetime.fromisoformat(sample[0])
+        epoch = float(sample[1])
+        # The sample timestamp, taken once.
+        # In the metrics store, each row has the sample number and the timestamp instead.
+        prefix = []
+        if self.metrics == None:
+            self.buffer.setdefault("timestamp", []).append([sample[0]])
+            self.colnames.setdefault("timestamp", ["current_timestamp"])
+        else:
+            prefix = [self.count, timestamp]
 
-            if cur.rowcount == 0:
+        for [item, sql], value in zip(self.items, sample[2:]):
+            if value == None:
                 if Log.info <= Common.DEFAULT_LOG_LEVEL:
                     print("Info: sql:'{}' returns 0 row".format(sql))
                 continue
+            # Keep the text of the numbers as they are (e.g. numeric).
+            rows = json.loads(value, parse_float=str, parse_int=str)
+            if item not in self.colnames:
+                self.colnames[item] = list(rows[0].keys())
+                # The counters are the aggregates of one row.
+                if len(rows) == 1:
+                    self.counters[item] = [col for col in Common.MONITOR_COUNTERS.get(item, []) if col in rows[0]]
+            colnames = self.colnames[item]
+            self.buffer.setdefault(item, []).extend(
+                prefix + [row.get(col) for col in colnames] + self._deltas(item, epoch, row) for row in rows
+            )
+
+    """
+    # Returns the deltas and the rates [per sec] of the counters of the item since
+    # the previous sample ([delta, rate, delta, rate, ...]; None in the first sample),
+    # and adds them to the summary.
+    """
+
+    def _deltas(self, item, epoch, row):
+        columns = self.counters.get(item, [])
+        if len(columns) == 0:
+            return []
+        values = [_number(row.get(col)) for col in columns]
+        previous = self.previous.get(item)
+        self.previous[item] = [epoch, values]
+        if previous == None:
+            return [None] * (2 * len(columns))
+
+        elapsed = epoch - previous[0]
+        summary = self.summary.setdefault(item, {})
+        deltas = []
+        for col, prev, value in zip(columns, previous[1], values):
+            if prev == None or value == None:
+                deltas += [None, None]
+                continue
+            delta, reset = _counter_delta(prev, value)
+            rate = delta / elapsed if elapsed > 0 else None
+            s = summary.setdefault(col, [0, 0.0, None, 0])
+            s[0] += delta
+            s[1] += elapsed
+            if rate != None and (s[2] == None or rate > s[2]):
+                s[2] = rate
+            if reset:
+                s[3] += 1
+                if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                    print("Notice: Monitor: counter '{}.{}' was reset at sample {}.".format(item, col, self.count))
+            deltas += [delta, rate]
+        return deltas
+
+    """
+    # Returns the column names of the rows of the item: the columns of the item,
+    # followed by "<counter>_delta" and "<counter>_rate" of its counters.
+    """
+
+    def _header(self, item):
+        header = list(self.colnames[item])
+        for col in self.counters.get(item, []):
+            header += [col + "_delta", col + "_rate"]
+        return header
+
+    """
+    # Writes the summary of the counters of the trial: the total increase, the mean and
+    # max rates [per sec] and the number of resets of each counter.
+    """
+
+    def _write_summary(self):
+        if len(self.summary) == 0:
+            return True
+        colnames = ["item", "column"] + Common.COUNTER_STATS
+        rows = []
+        for item, columns in self.summary.items():
+            for col, [total, elapsed, max_rate, resets] in columns.items():
+                rows.append([item, col, total, total / elapsed if elapsed > 0 else None, max_rate, resets])
+        self.summary = {}
+
+        if self.metrics != None:
+            return self.metrics.write(Common.MONITOR_SUMMARY, colnames, rows)
+
+        _file = self.log_dir + Common.MONITOR_SUMMARY + ".csv"
+        try:
+            with open(_file, "w") as f:
+                f.write(",".join(colnames) + "\n")
+                for row in rows:
+                    f.write(",".join(map(str, row)) + "\n")
+        except Exception as e:
+            if Log.error <= Common.DEFAULT_LOG_LEVEL:
+                print("Error: Monitor failed to write file:'{}'".format(_file))
+            return False
+        return True
 
+    """
+    # Writes the rows of the item to the metrics store, or to the csv file of the item
+    # (quoted like result.csv, since the rows may have texts).
+    """
+
+    def _write_table(self, item, colnames, rows, text=()):
+        if self.metrics != None:
+            return self.metrics.write(item, colnames, rows, text)
+
+        _file = self.log_dir + str(item) + ".csv"
+        try:
+            with open(_file, "w") as f:
+                writer = csv.writer(f, quotechar="'", quoting=csv.QUOTE_NONNUMERIC)
+                writer.writerow(colnames)
+                writer.writerows(rows)
+        except Exception as e:
+            if Log.error <= Common.DEFAULT_LOG_LEVEL:
+                print("Error: Monitor failed to write file:'{}'".format(_file))
+            return False
+        return True
+
+    """
+    # Returns the snapshot of the top-level statements of pg_stat_statements,
+    # or None if it cannot be read.
+    """
+
+    def _snapshot_statements(self):
+        _sql = "SELECT userid, dbid, queryid, {}, query FROM pg_stat_statements WHERE toplevel AND queryid IS NOT NULL;".format(
+            ", ".join(Common.STATEMENT_COUNTERS)
+        )
+        cur = self.exec_select_cmd(_sql)
+        if cur == None:
+            if Log.warning <= Common.DEFAULT_LOG_LEVEL:
+                print("Warning: Monitor cannot read pg_stat_statements. Is the extension installed in '{}'?".format(self.database))
+            return None
+        snapshot = {tuple(row[0:3]): list(row[3:]) for row in cur.fetchall()}
+        cur.close()
+        return snapshot
+
+    """
+    # Samples the wait events of the active backends every `wait_event_interval` seconds
+    # at absolute deadlines, until `self.wait_stop` is set. This runs on its own thread
+    # and connection.
+    """
+
+    def _sample_wait_events(self, sampler, query):
+        next_sample = time.monotonic()
+        while self.wait_stop.is_set() == False:
+            cur = sampler.exec_select_cmd(query)
+            if cur == None:
+                break
+            for [backend_type, wait_event_type, wait_event, count] in cur.fetchall():
+                key = (backend_type, wait_event_type, wait_event)
+                self.wait_events[key] = self.wait_events.get(key, 0) + count
+            cur.close()
+            self.wait_samples += 1
+
+            next_sample += self.wait_event_interval
+            now = time.monotonic()
+            if next_sample < now:
+                # Skip the missed deadlines.
+                next_sample += (int((now - next_sample) / self.wait_event_interval) + 1) * self.wait_event_interval
+            self.wait_stop.wait(next_sample - now)
+
+    """
+    # Writes the buffered samples to the csv files, which are kept open until close(),
+    # or to the metrics store.
+    # The column names are written when the first row of the item arrives.
+    """
+
+    def flush(self):
+        for item, rows in self.buffer.items():
+            if len(rows) == 0:
+                continue
+            if self.metrics != None:
+                if self.metrics.write(item, ["sample", "timestamp"] + self._header(item), rows) == False:
+                    return False
+                self.buffer[item] = []
+                continue
             _file = self.log_dir + str(item) + ".csv"
+            if item not in self.files:
+                try:
+                    self.files[item] = open(_file, "a")
+                    self.files[item].write(",".join(map(str, self._header(item))) + "\n")
+                except Exception as e:
+                    if Log.error <= Common.DEFAULT_LOG_LEVEL:
+                        print("Error: Monitor could not open file:'{}'".format(_file))
+                    return False
             try:
-                with open(_file, "a") as f:
-                    try:
-                        if _print_column:
-                            colnames = [col.name for col in cur.description]
-                            f.write(",".join(map(str, colnames)) + "\n")
-                        for row in cur:
-                            f.write(",".join(map(str, row)) + "\n")
-                    except Exception as e:
-                        if Log.error <= Common.DEFAULT_LOG_LEVEL:
-                            print("Error: Monitor failed to write file:'{}'".format(_file))
-                        return False
-            except Exception as ee:
+                for row in rows:
+                    self.files[item].write(",".join(map(str, row)) + "\n")
+                self.files[item].flush()
+            except Exception as e:
                 if Log.error <= Common.DEFAULT_LOG_LEVEL:
-                    print("Error: Monitor could not open file:'{}'".format(_file))
+                    print("Error: Monitor failed to write file:'{}'".format(_file))
+                return False
+            self.buffer[item] = []
+
+        self.last_flush = time.monotonic()
+        return True
+
+    """
+    Public methods
+    """
+
+    """
+    # get monitoring items
+    """
+    def get_basic_monitoring_items(self):
+        return ["timestamp", "numconnections", "checkpointer", "bgwriter", "wal", "autovacuum", "io"]
+
+    def get_linux_monitoring_items(self):
+        return ["vmstat", "mpstat", "free", "iostat", "netstat"]
+
+    """
+    # Connects to the PostgreSQL server.
+    """
+
+    def start(self):
+
+        if self.connect():
+            if Log.info <= Common.DEFAULT_LOG_LEVEL:
+                print("Info: Monitor: Connection established.")
+            return True
+        else:
+            return False
+
+    """
+    # Collects PostgreSQL server statistics in one query, and writes the samples
+    # every Common.MONITOR_FLUSH_INTERVAL seconds.
+    """
+
+    def monitoring(self):
+
+        self.count += 1
+
+        cur = self.exec_select_cmd(self.query)
+        if cur == None:
+            if Log.error <= Common.DEFAULT_LOG_LEVEL:
+                print("Error: Monitor failed to issue sql:'{}'".format(self.query))
+            return False
+        sample = cur.fetchone()
+        cur.close()
+
+        self._add_sample(sample)
+
+        if time.monotonic() - self.last_flush >= Common.MONITOR_FLUSH_INTERVAL:
+            return self.flush()
+        return True
+
+    """
+    # Starts the server-side collector on another connection, which runs until
+    # stop_collector() or for `max_duration` seconds.
+    """
+
+    def start_collector(self, max_duration):
+        with self.connection.cursor() as cur:
+            _sql = "DROP TABLE IF EXISTS {0}; CREATE UNLOGGED TABLE {0} (slot int PRIMARY KEY, no bigint, sample text[]);".format(
+                Common.MONITOR_RING_TABLE
+            )
+            if self.exec_sql(cur, _sql) == False:
                 return False
 
+        self.collector = Psql(self.host, self.port, self.user, self.database, self.password)
+        if self.collector.connect() == False:
+            return False
+        cur = self.collector.exec_select_cmd("SELECT pg_backend_pid();")
+        if cur == None:
+            return False
+        self.collector_pid = cur.fetchone()[0]
+        cur.close()
+
+        # Ends the collector if this process has gone (PostgreSQL 14 or later).
+        with self.collector.connection.cursor() as cur:
+            try:
+                cur.execute("SET client_connection_check_interval = '1s';")
+            except Exception:
+                pass
+
+        block = self._collector_block(max_duration)
+        if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+            print("Debug1: Monitor: collector=", block)
+
+        def run():
+            with self.collector.connection.cursor() as cur:
+                try:
+                    cur.execute(block)
+                except Exception as e:
+                    # Canceled by stop_collector().
+                    if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+                        print("Debug1: Monitor: collector stopped:", e)
+
+        self.collector_thread = threading.Thread(target=run, daemon=True)
+        self.collector_thread.start()
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: Monitor: server-side collector started.")
+        return True
+
+    """
+    # Stops the server-side collector, fetches all samples at once and writes them.
+    """
+
+    def stop_collector(self):
+        cur = self.exec_select_cmd("SELECT pg_cancel_backend({});".format(self.collector_pid))
+        if cur != None:
+            cur.close()
+        self.collector_thread.join()
+        self.collector.close()
+
+        cur = self.exec_select_cmd("SELECT no, sample FROM {} ORDER BY no;".format(Common.MONITOR_RING_TABLE))
+        if cur == None:
+            return False
+        samples = cur.fetchall()
+        cur.close()
+        if len(samples) > 0 and samples[0][0] > 0:
+            if Log.warning <= Common.DEFAULT_LOG_LEVEL:
+                print("Warning: Monitor: the first {} samples were overwritten in the ring buffer.".format(samples[0][0]))
+        for [no, sample] in samples:
+            self.count += 1
+            self._add_sample(sample)
+
+        with self.connection.cursor() as cur:
+            self.exec_sql(cur, "DROP TABLE IF EXISTS {};".format(Common.MONITOR_RING_TABLE))
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: Monitor: {} samples fetched from the server-side collector.".format(len(samples)))
+        return self.flush()
+
+    """
+    # Takes the snapshot of pg_stat_statements at the start of the trial, if statements_top > 0.
+    """
+
+    def start_statements(self):
+        if self.statements_top == 0:
+            return True
+        self.statements = self._snapshot_statements()
+        return self.statements != None
+
+    """
+    # Takes the snapshot of pg_stat_statements at the end of the trial, and writes the
+    # top `statements_top` statements by the execution time during the trial with the
+    # increases of their counters (Common.STATEMENT_COUNTERS).
+    # A statement whose calls have decreased (reset, or evicted and added again) counts
+    # from 0.
+    """
+
+    def stop_statements(self):
+        if self.statements == None:
+            return True
+        start = self.statements
+        self.statements = None
+        end = self._snapshot_statements()
+        if end == None:
+            return False
+
+        n = len(Common.STATEMENT_COUNTERS)
+        calls = Common.STATEMENT_COUNTERS.index("calls")
+        exec_time = Common.STATEMENT_COUNTERS.index("total_exec_time")
+        deltas = []
+        for key, values in end.items():
+            prev = start.get(key)
+            if prev == None or values[calls] < prev[calls]:
+                prev = [0] * n
+            delta = [values[i] - prev[i] if values[i] != None and prev[i] != None else None for i in range(n)]
+            if delta[calls] > 0:
+                deltas.append([str(key[2])] + delta + [values[n]])
+
+        total_time = sum(d[1 + exec_time] for d in deltas)
+        deltas.sort(key=lambda d: d[1 + exec_time], reverse=True)
+        rows = []
+        for rank, d in enumerate(deltas[: self.statements_top]):
+            d_time = float(d[1 + exec_time])
+            rows.append(
+                [rank + 1, d[0]]
+                + d[1:-1]
+                + [d_time / d[1 + calls], d_time / total_time if total_time > 0 else None, d[-1]]
+            )
+
+        colnames = ["rank", "queryid"] + Common.STATEMENT_COUNTERS + ["mean_exec_time", "time_ratio", "query"]
+        # queryid is a 64-bit identifier, not a number.
+        return self._write_table(Common.STATEMENTS, colnames, rows, ["queryid"])
+
+    """
+    # Starts sampling the wait events of the active backends (client backends running
+    # a query, and the background processes not waiting for work) every
+    # `wait_event_interval` seconds, if it is greater than 0.
+    # A backend not waiting is counted as wait_event_type = wait_event = "CPU".
+    """
+
+    def start_wait_events(self):
+        if self.wait_event_interval == 0:
+            return True
+
+        sampler = Psql(self.host, self.port, self.user, self.database, self.password)
+        if sampler.connect() == False:
+            return False
+        pids = [str(self.connection.get_backend_pid())]
+        if self.collector != None:
+            pids.append(str(self.collector_pid))
+        # The backends of the monitor are not counted.
+        query = (
+            "SELECT backend_type, coalesce(wait_event_type, 'CPU'), coalesce(wait_event, 'CPU'), count(*)"
+            " FROM pg_stat_activity"
+            " WHERE pid <> pg_backend_pid() AND pid NOT IN ({})"
+            " AND (state = 'active' OR backend_type <> 'client backend')"
+            " AND wait_event_type IS DISTINCT FROM 'Activity'"
+            " GROUP BY 1, 2, 3;".format(", ".join(pids))
+        )
+
+        self.wait_events = {}
+        self.wait_samples = 0
+        self.wait_stop = threading.Event()
+        self.wait_sampler = threading.Thread(target=self._sample_wait_events, args=(sampler, query), daemon=True)
+        self.wait_sampler.start()
+        self.wait_sampler_connection = sampler
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: Monitor: wait event sampler started.")
         return True
 
+    """
+    # Stops sampling the wait events, and writes the histogram of the trial: the number
+    # of the samples of each wait event, the average number of the backends waiting
+    # for it (count / samples), and its ratio to all waits.
+    """
+
+    def stop_wait_events(self):
+        if self.wait_sampler == None:
+            return True
+        self.wait_stop.set()
+        self.wait_sampler.join()
+        self.wait_sampler = None
+        self.wait_sampler_connection.close()
+
+        total = sum(self.wait_events.values())
+        rows = []
+        if self.wait_samples == 0:
+            return True
+        for [key, count] in sorted(self.wait_events.items(), key=lambda e: e[1], reverse=True):
+            rows.append(list(key) + [count, count / self.wait_samples, count / total])
+
+        if Log.info <= Common.DEFAULT_LOG_LEVEL:
+            print("Info: Monitor: {} wait event samples taken.".format(self.wait_samples))
+        colnames = ["backend_type", "wait_event_type", "wait_event", "count", "avg_backends", "ratio"]
+        return self._write_table(Common.WAIT_EVENTS, colnames, rows)
+
+    """
+    # Writes the buffered samples, the summary of the counters, the statements and the
+    # wait events, and closes the files and the connection.
+    """
+
+    def close(self):
+        ret = self.stop_wait_events()
+        if self.stop_statements() == False:
+            ret = False
+        if self.flush() == False:
+            ret = False
+        if self._write_summary() == False:
+            ret = False
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        if self.metrics != None:
+            self.metrics.close()
+        super().close()
+        return ret
+
+    """
+    # Reads the csv file of the monitoring item in log_dir, and returns the list of rows (dict).
+    # Returns [] if not found.
+    """
+
+    @staticmethod
+    def read_item(log_dir, item):
+        _file = Common.set_dir(log_dir) + str(item) + ".csv"
+        if os.path.isfile(_file) == False:
+            return []
+        rows = []
+        with open(_file) as f:
+            colnames = None
+            for line in f:
+                values = line.rstrip("\n").split(",")
+                if colnames == None:
+                    colnames = values
+                    continue
+                rows.append(dict(zip(colnames, values)))
+        return rows
+
     """
     # Disconnects the PostgreSQL server.
     """
 
     def stop(self):
+        self.stop_wait_events()
+        self.stop_statements()
+        self.flush()
+        self._write_summary()
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
         with self.connection.cursor() as cur:
             if Log.info <= Common.DEFAULT_LOG_LEVEL:
                 print("Info: Monitor: Execute Checkpoint command.")
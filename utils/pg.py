@@ -5,11 +5,13 @@ pg.py
 """
 
 import warnings
-import paramiko
 import subprocess
-import sys, os, shutil
+import sys, os, shutil, time, tempfile
 
 from .common import Common, Log
+from .psql import Psql
+from .ssh import SSHPool
+from .restore import RESTORE_BACKENDS
 
 class PG:
     def __init__(
@@ -20,6 +22,17 @@ class PG:
         pgdata_backup,
         server_user=None,
         server_passwd=None,
+        port=None,
+        pg_user=None,
+        pg_db=None,
+        pg_passwd=None,
+        restore_method=Common.DEFAULT_RESTORE_METHOD,
+        restore_verify=False,
+        pgdata_snapshot=None,
+        pgdata_snapshot_size=Common.DEFAULT_SNAPSHOT_SIZE,
+        clone=None,
+        cpus=None,
+        memory_max=None,
     ):
         self.host = host
         self.pg_ctl = pg_ctl
@@ -28,6 +41,29 @@ class PG:
         self.server_user = server_user
         self.server_passwd = server_passwd
 
+        # Used by the readiness probe.
+        self.port = port
+        self.pg_user = pg_user
+        self.pg_db = pg_db
+        self.pg_passwd = pg_passwd
+
+        if restore_method not in RESTORE_BACKENDS:
+            print("Error: restore_method '{}' not supported.".format(restore_method))
+            sys.exit(1)
+        self.restore_method = restore_method
+        self.restorer = RESTORE_BACKENDS[restore_method](
+            self, pgdata_snapshot, pgdata_snapshot_size, restore_verify
+        )
+
+        # Cloned cluster: number of the clone, and its cpuset/memory limit (cgroup v2).
+        self.clone = clone
+        self.cpus = cpus
+        self.memory_max = memory_max
+        if clone != None and (cpus != None or memory_max != None):
+            self.cgroup = "{}{}.{}".format(Common.CGROUP_ROOT, Common.CGROUP_PREFIX, port)
+        else:
+            self.cgroup = None
+
         self.conf_filename = Common.ADDITIONAL_CONF
         self.pgconf_dir = Common.set_dir(Common.ADDITIONAL_CONF_DIR)
 
@@ -35,8 +71,14 @@ class PG:
         self.auth_timeout = Common.AUTH_TIMEOUT
         self.channel_timeout = Common.CHANNEL_TIMEOUT
 
+        # Shared SSH session (see SSHPool), acquired on first remote access.
+        self.ssh_session = None
+
         warnings.simplefilter("ignore")
 
+    def __del__(self):
+        self.close()
+
     def _stderr(self, stderr, msg):
         if len(stderr.read()) > 0:
             print("{}".format(str(msg)))
@@ -45,69 +87,61 @@ class PG:
             return True
 
 
-    def _exec_remote(self, command):
+    def _session(self):
+        if self.ssh_session != None and self.ssh_session.pid != os.getpid():
+            # Inherited from the parent process; do not touch its socket.
+            self.ssh_session = None
+        if self.ssh_session == None:
+            self.ssh_session = SSHPool.acquire(
+                self.host,
+                self.server_user,
+                self.server_passwd,
+                self.banner_timeout,
+                self.auth_timeout,
+                self.channel_timeout,
+            )
+        return self.ssh_session
 
-        with paramiko.SSHClient() as client:
-            try:
-                client.set_missing_host_key_policy(paramiko.WarningPolicy())
-                client.connect(
-                    self.host,
-                    username=self.server_user,
-                    password=self.server_passwd,
-                    banner_timeout=self.banner_timeout,
-                    auth_timeout=self.auth_timeout,
-                    channel_timeout=self.channel_timeout,
-                    timeout=self.channel_timeout,
-                )
-                try:
-                    stdin, stdout, stderr = client.exec_command(command, get_pty=True)
-                    for line in stderr:
-                        print(line, end="")
-                    for line in stdout:
-                        print(line, end="")
-                finally:
-                    client.close()
+    def _exec_remote(self, command, return_output=False):
+        try:
+            stdin, stdout, stderr = self._session().exec_command(command, get_pty=True)
+            output = ""
+            for line in stderr:
+                print(line, end="")
+            for line in stdout:
+                if return_output:
+                    output += line
+                else:
+                    print(line, end="")
+            status = stdout.channel.recv_exit_status()
 
-                return True
+        except Exception as e:
+            print("\nError: Cannot access to host with SSH:'{}'".format(str(self.host)))
+            print("Detail: {}".format(str(e)))
+            sys.exit(1)
 
-            except Exception as e:
-                print("\nError: Cannot access to host with SSH:'{}'".format(str(self.host)))
-                print("Detail: {}".format(str(e)))
-                sys.exit(1)
+        if status != 0:
+            if return_output:
+                print("Error: {}".format(output))
+            return False
+        if return_output:
+            return output
+        return True
 
 
     def _exist_remote_file(self, filename):
-        ret = True
-        with paramiko.SSHClient() as client:
-            try:
-                client.set_missing_host_key_policy(paramiko.WarningPolicy())
-
-                client.connect(
-                    self.host,
-                    username=self.server_user,
-                    password=self.server_passwd,
-                    banner_timeout=self.banner_timeout,
-                    auth_timeout=self.auth_timeout,
-                    channel_timeout=self.channel_timeout,
-                    timeout=self.channel_timeout,
-                )
-                try:
-                    sftp_connection = client.open_sftp()
-                    sftp_connection.stat(filename)
-                except Exception as e:
-                    ret = False
-                finally:
-                    client.close()
-                del client
-
-                if sftp_connection == None:
-                    return False
-                return ret
+        try:
+            session = self._session()
+        except Exception as e:
+            print("Error: Cannot access to host with SSH:'{}'".format(str(self.host)))
+            print("Detail: {}".format(str(e)))
+            sys.exit(1)
 
-            except Exception as e:
-                print("Error: Cannot access to host with SSH:'{}'".format(str(self.host)))
-                print("Detail: {}".format(str(e)))
-                sys.exit(1)
+        try:
+            session.stat(filename)
+        except Exception as e:
+            return False
+        return True
 
 
     def _copy_file(self, source, target):
@@ -126,40 +160,28 @@ class PG:
             return True
 
         else:
-            ret = True
-            with paramiko.SSHClient() as client:
-                try:
-                    client.set_missing_host_key_policy(paramiko.WarningPolicy())
-
-                    client.connect(
-                        self.host,
-                        username=self.server_user,
-                        password=self.server_passwd,
-                        banner_timeout=self.banner_timeout,
-                        auth_timeout=self.auth_timeout,
-                        channel_timeout=self.channel_timeout,
-                        timeout=self.channel_timeout,
-                    )
-                    try:
-                        sftp_connection = client.open_sftp()
-                        sftp_connection.put(source, target)
-                    except Exception as e:
-                        ret = False
-                    finally:
-                        client.close()
-                    del client
-
-                    if sftp_connection == None:
-                        return False
-                    return ret
-
-                except Exception as e:
-                    print("Error: Cannot access to host with SSH:'{}'".format(str(self.host)))
-                    print("Detail: {}".format(str(e)))
-                    sys.exit(1)
+            try:
+                session = self._session()
+            except Exception as e:
+                print("Error: Cannot access to host with SSH:'{}'".format(str(self.host)))
+                print("Detail: {}".format(str(e)))
+                sys.exit(1)
 
-    def _cmd(self, command):
+            try:
+                session.put(source, target)
+            except Exception as e:
+                return False
+            return True
+
+    def _ctl_cmd(self, command):
         cmd = "{} -D {} {}".format(self.pg_ctl, self.pgdata, command)
+        if self.cgroup != None and command in ("start", "restart"):
+            # The postmaster and its children inherit the cgroup of pg_ctl.
+            cmd = "sh -c 'echo $$ > {}cgroup.procs && exec {}'".format(Common.set_dir(self.cgroup), cmd)
+        return cmd
+
+    def _cmd(self, command):
+        cmd = self._ctl_cmd(command)
         if self.host == "localhost" or self.host == "127.0.0.1":
             try:
                 ret = subprocess.run(cmd, shell=True, capture_output=False, check=True)
@@ -174,6 +196,29 @@ class PG:
     Public methods
     """
 
+    """
+    # Releases the shared SSH session.
+    """
+    def close(self):
+        if getattr(self, "ssh_session", None) != None:
+            SSHPool.release(self.ssh_session)
+            self.ssh_session = None
+
+    """
+    # Returns True if the server runs on the local host.
+    """
+    def is_local(self):
+        return self.host == "localhost" or self.host == "127.0.0.1"
+
+    """
+    # executes cmd on the server (locally or over SSH)
+    """
+    def exec_server(self, cmd, return_output=False):
+        if self.is_local():
+            return self.exec_local(cmd, return_output=return_output)
+        else:
+            return self._exec_remote(cmd, return_output=return_output)
+
     """
     # executes cmd locally
     """
@@ -190,6 +235,12 @@ class PG:
         else:
             return True
 
+    """
+    # Copies the local file to the server
+    """
+    def put_file(self, source, target):
+        return self._copy_file(source, target)
+
     """
     # Check the file/dir exists or not
     """
@@ -249,72 +300,39 @@ class PG:
     def make_backup(self):
         force_remove = False
 
-        if self.is_dir_exist(self.pgdata_backup):
+        if self.restorer.exists():
             print("====== Confirmation Prompt =====")
-            print("backup dir '{}' already exists.".format(self.pgdata_backup))
+            print("backup '{}' already exists.".format(self._backup_name()))
             print("Select the following options:")
             print("\t1: Quit this task.")
-            print("\t2: Remove the backup dir and Continue this task.")
+            print("\t2: Remove the backup and Continue this task.")
             answer = input("Enter 1 or 2: ").lower()
             if answer in ("1", "quit", "exit"):
                 return False
             elif answer in ("2"):
-                print("Are you sure you want to remove backup dir '{}'?".format(self.pgdata_backup))
+                print("Are you sure you want to remove backup '{}'?".format(self._backup_name()))
                 answer = input("Enter yes or no: ").lower()
                 if answer in ("yes"):
                     force_remove = True
                 else:
                     return False
 
-        if force_remove:
-            cmd = "rm -rf {}; cp -r {} {}".format(self.pgdata_backup, self.pgdata, self.pgdata_backup)
-        else:
-            cmd = "cp -r {} {}".format(self.pgdata, self.pgdata_backup)
-        if self.host == "localhost" or self.host == "127.0.0.1":
-            print("Currently running '{}'".format(cmd))
-            ret = self.exec_local(cmd)
-        else:
-            print("Currently running '{}'".format(cmd))
-            ret = self._exec_remote(cmd)
-
-        if ret:
-            print("... done.")
-        else:
-            print("... failed.")
-
-        return ret
+        return self.restorer.backup(force_remove)
 
     """
     # recover backup file
     """
     def restore_backup(self):
-        if self.is_dir_exist(self.pgdata_backup) == False:
-            print("Error: backup dir '{}' not found.".format(self.pgdata_backup))
+        if self.restorer.exists() == False:
+            print("Error: backup '{}' not found.".format(self._backup_name()))
             return False
 
-        if self.is_dir_exist(self.pgdata):
-            if self.host == "localhost" or self.host == "127.0.0.1":
-                shutil.rmtree(self.pgdata)
-            else:
-                cmd = "rm -rf {}".format(self.pgdata)
-                if self._exec_remote(cmd) == False:
-                    print("Error: Could not remove '{}'".format(self.pgdata))
-                    return False
-
-        cmd = "cp -r {} {}".format(self.pgdata_backup, self.pgdata)
-        if self.host == "localhost" or self.host == "127.0.0.1":
-            print("Currently running '{}'".format(cmd))
-            ret = self.exec_local(cmd)
-        else:
-            print("Currently running '{}'".format(cmd))
-            ret = self._exec_remote(cmd)
+        return self.restorer.restore()
 
-        if ret:
-            print("... done.")
-        else:
-            print("... failed.")
-
-        return ret
+    def _backup_name(self):
+        if self.restorer.snapshot != None:
+            return self.restorer.snapshot
+        return self.pgdata_backup
 
     """
     # server start
@@ -349,6 +367,110 @@ class PG:
         return self._cmd("reload")
 
 
+    """
+    # Waits until the server accepts connections.
+    #
+    # Polls the server with a libpq connection (or pg_isready on the server if the
+    # connection parameters are not given) with exponential backoff.
+    # Only the errors of a server that is starting up (see Common.STARTUP_ERRORS)
+    # are retried; any other error, such as a wrong password, fails at once.
+    # Returns the elapsed time [sec] since `start_time`, or None on timeout or error.
+    """
+    def wait_until_ready(self, timeout=Common.STARTUP_TIMEOUT, start_time=None):
+        if start_time == None:
+            start_time = time.monotonic()
+
+        if self.port != None:
+            psql = Psql(self.host, self.port, self.pg_user, self.pg_db, self.pg_passwd)
+        else:
+            psql = None
+
+        interval = Common.STARTUP_PROBE_INTERVAL
+        while True:
+            if psql != None:
+                ready = psql.connect(verbose=False)
+                if ready:
+                    psql.close()
+                elif not any(e in str(psql.error) for e in Common.STARTUP_ERRORS):
+                    print("Error: Could not connect to '{}'".format(self.host))
+                    print(psql.error)
+                    return None
+            else:
+                ready = self._pg_isready()
+                if ready == None:
+                    return None
+
+            elapsed = time.monotonic() - start_time
+            if ready:
+                if Log.info <= Common.DEFAULT_LOG_LEVEL:
+                    print("Info: PostgreSQL server is ready ({:.2f} [sec]).".format(elapsed))
+                return elapsed
+
+            if elapsed > timeout:
+                print("Error: PostgreSQL server is not ready after {} [sec].".format(timeout))
+                return None
+
+            time.sleep(interval)
+            interval = min(interval * 2, Common.STARTUP_PROBE_MAX_INTERVAL)
+
+    def _pg_isready(self):
+        # Returns True if the server accepts connections, False if it is starting up
+        # or does not respond, and None if pg_isready made no attempt (invalid parameters).
+        cmd = "{}/pg_isready -q; echo $?".format(os.path.dirname(self.pg_ctl))
+        ret = self.exec_server(cmd, return_output=True)
+        if ret == False or ret.strip() not in ["0", "1", "2"]:
+            print("Error: pg_isready failed on '{}'.".format(self.host))
+            return None
+        return ret.strip() == "0"
+
+    """
+    # Returns the fingerprint of the server, which identifies the measurement environment:
+    # host, server version, system identifier of the database cluster and cgroup limits.
+    # The server must be running. Returns None if it cannot connect.
+    """
+    def get_fingerprint(self):
+        psql = Psql(self.host, self.port, self.pg_user, self.pg_db, self.pg_passwd)
+        if psql.connect() == False:
+            return None
+
+        _sql = "SELECT current_setting('server_version_num'), (SELECT system_identifier FROM pg_control_system());"
+        cur = psql.exec_select_cmd(_sql)
+        if cur == None:
+            psql.close()
+            return None
+        [version, system_identifier] = cur.fetchone()
+        cur.close()
+        psql.close()
+
+        return [self.host, str(version), str(system_identifier), self.cpus, self.memory_max]
+
+    """
+    # Returns {name: context} of the parameters from pg_settings.
+    # The server must be running. Returns None if it cannot connect.
+    """
+    def get_param_contexts(self, names):
+        if len(names) == 0:
+            return {}
+
+        psql = Psql(self.host, self.port, self.pg_user, self.pg_db, self.pg_passwd)
+        if psql.connect() == False:
+            return None
+
+        _sql = "SELECT name, context FROM pg_settings WHERE name IN ({});".format(
+            ", ".join("'{}'".format(str(name).replace("'", "''")) for name in names)
+        )
+        cur = psql.exec_select_cmd(_sql)
+        if cur == None:
+            psql.close()
+            return None
+        contexts = {}
+        for [name, context] in cur:
+            contexts[name] = context
+        cur.close()
+        psql.close()
+
+        return contexts
+
     """
     # get server status
     """
@@ -367,52 +489,35 @@ class PG:
                 return True
 
         else:
-            with paramiko.SSHClient() as client:
-                try:
-                    client.set_missing_host_key_policy(paramiko.WarningPolicy())
-                    client.connect(
-                        self.host,
-                        username=self.server_user,
-                        password=self.server_passwd,
-                        banner_timeout=self.banner_timeout,
-                        auth_timeout=self.auth_timeout,
-                        channel_timeout=self.channel_timeout,
-                        timeout=self.channel_timeout,
-                    )
-                    try:
-                        stdin, stdout, stderr = client.exec_command(cmd, get_pty=True)
-                        for line in stdout:
-                            ret = int(line)
-                    finally:
-                        client.close()
-
-                    if ret == 1:
-                        return False
-                    else:
-                        return True
-
-                except Exception as e:
-                    print("\nError: Cannot access to host with SSH:'{}'".format(str(self.host)))
-                    print("Detail: {}".format(str(e)))
-                    sys.exit(1)
+            ret = self._exec_remote(cmd, return_output=True)
+            if ret == False:
+                sys.exit(1)
+            if int(ret) == 1:  # no server running
+                return False
+            else:
+                return True
 
     """
     # Creates additional conf file and copies to PostgreSQL server
     """
-    def set_conf(self, conf_params, max_connections=None):
+    def set_conf(self, conf_params, max_connections=None, local_dir=""):
 
         if Log.info <= Common.DEFAULT_LOG_LEVEL:
             print("Info: send additional configuration file to postgresql server.")
 
         # write test.conf
-        with open(self.conf_filename, "w") as o:
+        _conf_file = local_dir + self.conf_filename
+        with open(_conf_file, "w") as o:
             for row in conf_params:
                 print("{} = {}".format(str(row[0]), str(row[1])), file=o)
 
             if max_connections != None:
                 print("max_connections = {}".format(max_connections), file=o)
 
-        ret = self._copy_file(self.conf_filename, self.pgdata + self.pgconf_dir + str(self.conf_filename))
+            if self.clone != None:
+                print("port = {}".format(self.port), file=o)
+
+        ret = self._copy_file(_conf_file, self.pgdata + self.pgconf_dir + str(self.conf_filename))
 
         if Log.info <= Common.DEFAULT_LOG_LEVEL:
             if ret:
@@ -421,17 +526,72 @@ class PG:
                 print("Error: Failed to send file.")
         return ret
 
+    """
+    # Provisions the cloned cluster: copies the backup to its own data directory
+    # (if not exists), sets its port, creates its cgroup and starts it.
+    # Does nothing if this is not a clone.
+    """
+    def provision(self):
+        if self.clone == None:
+            return True
+
+        if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+            print("Notice: provision clone {} on port {}: '{}'".format(self.clone, self.port, self.pgdata))
+
+        if self.is_dir_exist(self.pgdata) == False:
+            if self.restorer.exists() == False:
+                print("Error: backup '{}' not found.".format(self._backup_name()))
+                return False
+            if self.restorer.restore() == False:
+                return False
+            # Do not reuse the lock file of the original cluster.
+            self.exec_server("rm -f {}postmaster.pid".format(self.pgdata))
+
+        if self.set_conf([], local_dir=Common.set_dir(tempfile.gettempdir())) == False:
+            return False
+
+        if self.cgroup != None:
+            cmds = [
+                "mkdir -p {}".format(self.cgroup),
+                "echo '+cpuset +memory' > {}cgroup.subtree_control 2> /dev/null || true".format(Common.CGROUP_ROOT),
+            ]
+            if self.cpus != None:
+                cmds.append("echo {} > {}/cpuset.cpus".format(self.cpus, self.cgroup))
+            if self.memory_max != None:
+                cmds.append("echo {} > {}/memory.max".format(self.memory_max, self.cgroup))
+            for cmd in cmds:
+                if self.exec_server(cmd) == False:
+                    print("Error: Could not set up cgroup '{}'.".format(self.cgroup))
+                    return False
+
+        if self.is_running() == False:
+            self.start()
+            if self.wait_until_ready() == None:
+                return False
+        return True
+
     """
     # Checks PostgreSQL server configuration
     """
-    def check(self, restore_everytime, linux_monitoring):
+    def check(self, restore_everytime, linux_monitoring, statements=False):
         if self.host == "localhost" or self.host == "127.0.0.1":
-            return self._check_local(restore_everytime, linux_monitoring)
+            return self._check_local(restore_everytime, linux_monitoring, statements)
         else:
-            return self._check_remote(restore_everytime, linux_monitoring)
+            return self._check_remote(restore_everytime, linux_monitoring, statements)
+
+    """
+    # Returns the modules that must be in shared_preload_libraries.
+    """
+    def _preload_modules(self, linux_monitoring, statements):
+        modules = []
+        if linux_monitoring:
+            modules += Common.REQUIRED_MODULES
+        if statements:
+            modules.append(Common.STATEMENTS_MODULE)
+        return modules
 
 
-    def _check_local(self, restore_everytime, linux_monitoring):
+    def _check_local(self, restore_everytime, linux_monitoring, statements=False):
 
         print("Server Check Start.")
 
@@ -448,20 +608,18 @@ class PG:
         if restore_everytime:
             count += 1
             print("({}) Check backup file:".format(count))
-            if self.is_exist(self.pgdata_backup):
-                print("backup file:'{}' exists.".format(self.pgdata_backup))
+            if self.restorer.check() == False:
+                sys.exit(1)
+            if self.restorer.exists():
+                print("backup file:'{}' exists.".format(self._backup_name()))
                 print("ok.")
             else:
-                print("backup file:'{}' not found.".format(self.pgdata_backup))
-                print("Warning: Create a backup using the 'pg_tuner.py backup' command before running the task.".format(self.pgdata_backup))
+                print("backup file:'{}' not found.".format(self._backup_name()))
+                print("Warning: Create a backup using the 'pg_tuner.py backup' command before running the task.")
 
         count += 1
         print("({}) Check preload libraries:".format(count))
-        for module in Common.REQUIRED_MODULES:
-            if linux_monitoring == False:
-                # Skip this check
-                break
-
+        for module in self._preload_modules(linux_monitoring, statements):
             # This command cannot completely prevent module leakage.
             _cmd = 'grep "^shared_preload_libraries" {} | grep {} | wc -l'.format(
                 str(self.pgdata) + "postgresql.conf", str(module)
@@ -544,7 +702,7 @@ class PG:
 
         count += 1
         print("({}) postgresql server start:".format(count))
-        _cmd = "{} -D {} start".format(self.pg_ctl, self.pgdata)
+        _cmd = self._ctl_cmd("start")
         try:
             ret = subprocess.run(_cmd, shell=True, capture_output=False, check=True)
         except subprocess.CalledProcessError as e:
@@ -560,118 +718,52 @@ class PG:
             _conn["superuser_reserved_connections"],
         ]
 
-    def _check_remote(self, restore_everytime, linux_monitoring):
+    def _check_remote(self, restore_everytime, linux_monitoring, statements=False):
 
         print("Server Check Start.")
 
         count = 1
         print("({}) Access to {}:".format(count, self.host))
-        with paramiko.SSHClient() as client:
-            try:
-                client.set_missing_host_key_policy(paramiko.WarningPolicy())
-                client.connect(
-                    self.host,
-                    username=self.server_user,
-                    password=self.server_passwd,
-                    banner_timeout=self.banner_timeout,
-                    auth_timeout=self.auth_timeout,
-                    channel_timeout=self.channel_timeout,
-                    timeout=self.channel_timeout,
-                )
-            except Exception as e:
-                print("Error: Cannot access to host with SSH:'{}'".format(str(self.host)))
-                print("Detail: {}".format(str(e)))
-                sys.exit(1)
-
-            print("ok.")
-
-            if restore_everytime:
-                count += 1
-                print("({}) Check backup file:".format(count))
-                _cmd = "ls {}".format(self.pgdata_backup)
-                stdin, stdout, stderr = client.exec_command(_cmd, get_pty=False)
-                if self._stderr(stderr, "backup file:'{}' not found.".format(self.pgdata_backup)) == False:
-                    print("\n** Warning **: Create a backup using the 'pg_tuner.py backup' command before running the task.\n".format(self.pgdata_backup))
-                else:
-                    print("backup file:'{}' exists.".format(self.pgdata_backup))
-                    print("ok.")
-
-
-            count += 1
-            print("({}) Check directories:".format(count))
-            for d in [self.pg_ctl, self.pgdata, self.pgdata + self.pgconf_dir]:
-                _cmd = "ls {}".format(str(d))
-                stdin, stdout, stderr = client.exec_command(_cmd, get_pty=False)
-                if self._stderr(stderr, "Error: '{}' not found.".format(d)) == False:
-                    sys.exit(1)
-
-            print("ok.")
-
-            count += 1
-            print("({}) Check preload libraries:".format(count))
-            for module in Common.REQUIRED_MODULES:
-
-                if linux_monitoring == False:
-                    # Skip this check
-                    break
-
-                # This command cannot completely prevent module leakage.
-                _cmd = 'grep "^shared_preload_libraries" {} | grep {} | wc -l'.format(
-                    str(self.pgdata) + "postgresql.conf", str(module)
-                )
-                stdin, stdout, stderr = client.exec_command(_cmd, get_pty=False)
-                if (
-                    self._stderr(stderr, "Error: '{}' returns error.".format(str(_cmd)))
-                    == False
-                ):
-                    sys.exit(1)
-
-                for line in stdout:
-                    if int(line) != 1:
-                        print("Error: {} module not found in shared_preload_libraries".format(module))
-                        sys.exit(1)
-
-            print("ok.")
+        try:
+            client = self._session()
+            client.open()
+        except Exception as e:
+            print("Error: Cannot access to host with SSH:'{}'".format(str(self.host)))
+            print("Detail: {}".format(str(e)))
+            sys.exit(1)
 
+        print("ok.")
 
+        if restore_everytime:
             count += 1
-            print("({}) Check max_connections:".format(count))
-            # Get max_connections
-            _conn = {
-                "max_connections": Common.DEFAULT_MAX_CONNECTIONS,
-                "reserved_connections": Common.DEFAULT_RESERVED_CONNECTIONS,
-                "superuser_reserved_connections": Common.DEFAULT_SUPERUSERRESERVED_CONNECTIONS,
-            }
-
-            for _key in _conn.keys():
-                _cmd = 'grep "^\s*{}" {}'.format(_key, str(self.pgdata) + "postgresql.conf")
-                stdin, stdout, stderr = client.exec_command(_cmd, get_pty=False)
-                if (
-                    self._stderr(stderr, "Error: '{}' returns error.".format(str(_cmd)))
-                    == False
-                ):
-                    sys.exit(1)
+            print("({}) Check backup file:".format(count))
+            if self.restorer.check() == False:
+                sys.exit(1)
+            if self.restorer.exists() == False:
+                print("backup file:'{}' not found.".format(self._backup_name()))
+                print("\n** Warning **: Create a backup using the 'pg_tuner.py backup' command before running the task.\n")
+            else:
+                print("backup file:'{}' exists.".format(self._backup_name()))
+                print("ok.")
 
-                for line in stdout:
-                    token = line.split("=")
-                    word = token[1].split()
-                    _conn[_key] = int(word[0])
 
-                    if Log.debug3 <= Common.DEFAULT_LOG_LEVEL:
-                        print("Update: _conn[{}]={}".format(_key, _conn[_key]))
+        count += 1
+        print("({}) Check directories:".format(count))
+        for d in [self.pg_ctl, self.pgdata, self.pgdata + self.pgconf_dir]:
+            _cmd = "ls {}".format(str(d))
+            stdin, stdout, stderr = client.exec_command(_cmd, get_pty=False)
+            if self._stderr(stderr, "Error: '{}' not found.".format(d)) == False:
+                sys.exit(1)
 
-            for _key in _conn.keys():
-                if Log.debug3 <= Common.DEFAULT_LOG_LEVEL:
-                    print("_conn[{}]={}".format(_key, _conn[_key]))
+        print("ok.")
 
-            print("ok.")
+        count += 1
+        print("({}) Check preload libraries:".format(count))
+        for module in self._preload_modules(linux_monitoring, statements):
 
-            count += 1
-            print("({}) Check include_if_exists dir:".format(count))
-            _cmd = "grep include_if_exists {} | grep '{}{}' | wc -l".format(
-                str(self.pgdata) + "postgresql.conf",
-                self.pgconf_dir,
-                self.conf_filename,
+            # This command cannot completely prevent module leakage.
+            _cmd = 'grep "^shared_preload_libraries" {} | grep {} | wc -l'.format(
+                str(self.pgdata) + "postgresql.conf", str(module)
             )
             stdin, stdout, stderr = client.exec_command(_cmd, get_pty=False)
             if (
@@ -682,15 +774,23 @@ class PG:
 
             for line in stdout:
                 if int(line) != 1:
-                    print("Error: '{}{}' not set in include_if_exists".format(self.pgconf_dir, self.conf_filename))
+                    print("Error: {} module not found in shared_preload_libraries".format(module))
                     sys.exit(1)
 
-            print("ok.")
+        print("ok.")
 
-            # start stop
-            count += 1
-            print("({}) Check postgresql server status:".format(count))
-            _cmd = "{} -D {} status | grep 'no server running' | wc -l".format(self.pg_ctl, self.pgdata)
+
+        count += 1
+        print("({}) Check max_connections:".format(count))
+        # Get max_connections
+        _conn = {
+            "max_connections": Common.DEFAULT_MAX_CONNECTIONS,
+            "reserved_connections": Common.DEFAULT_RESERVED_CONNECTIONS,
+            "superuser_reserved_connections": Common.DEFAULT_SUPERUSERRESERVED_CONNECTIONS,
+        }
+
+        for _key in _conn.keys():
+            _cmd = 'grep "^\s*{}" {}'.format(_key, str(self.pgdata) + "postgresql.conf")
             stdin, stdout, stderr = client.exec_command(_cmd, get_pty=False)
             if (
                 self._stderr(stderr, "Error: '{}' returns error.".format(str(_cmd)))
@@ -699,34 +799,78 @@ class PG:
                 sys.exit(1)
 
             for line in stdout:
-                if int(line) == 1:  # no server running
-                    print("Error: no server running. Start your postgresql server.")
-                    sys.exit(1)
-            print("ok.")
+                token = line.split("=")
+                word = token[1].split()
+                _conn[_key] = int(word[0])
 
-            count += 1
-            print("({}) postgresql server stop:".format(count))
-            _cmd = "{} -D {} stop".format(self.pg_ctl, self.pgdata)
-            stdin, stdout, stderr = client.exec_command(_cmd, get_pty=True)
-            if (
-                self._stderr(stderr, "Error: '{}' returns error.".format(str(_cmd)))
-                == False
-            ):
+                if Log.debug3 <= Common.DEFAULT_LOG_LEVEL:
+                    print("Update: _conn[{}]={}".format(_key, _conn[_key]))
+
+        for _key in _conn.keys():
+            if Log.debug3 <= Common.DEFAULT_LOG_LEVEL:
+                print("_conn[{}]={}".format(_key, _conn[_key]))
+
+        print("ok.")
+
+        count += 1
+        print("({}) Check include_if_exists dir:".format(count))
+        _cmd = "grep include_if_exists {} | grep '{}{}' | wc -l".format(
+            str(self.pgdata) + "postgresql.conf",
+            self.pgconf_dir,
+            self.conf_filename,
+        )
+        stdin, stdout, stderr = client.exec_command(_cmd, get_pty=False)
+        if (
+            self._stderr(stderr, "Error: '{}' returns error.".format(str(_cmd)))
+            == False
+        ):
+            sys.exit(1)
+
+        for line in stdout:
+            if int(line) != 1:
+                print("Error: '{}{}' not set in include_if_exists".format(self.pgconf_dir, self.conf_filename))
                 sys.exit(1)
-            print("ok.")
 
-            count += 1
-            print("({}) postgresql server start:".format(count))
-            _cmd = "{} -D {} start".format(self.pg_ctl, self.pgdata)
-            stdin, stdout, stderr = client.exec_command(_cmd, get_pty=True)
-            if (
-                self._stderr(stderr, "Error: '{}' returns error.".format(str(_cmd)))
-                == False
-            ):
+        print("ok.")
+
+        # start stop
+        count += 1
+        print("({}) Check postgresql server status:".format(count))
+        _cmd = "{} -D {} status | grep 'no server running' | wc -l".format(self.pg_ctl, self.pgdata)
+        stdin, stdout, stderr = client.exec_command(_cmd, get_pty=False)
+        if (
+            self._stderr(stderr, "Error: '{}' returns error.".format(str(_cmd)))
+            == False
+        ):
+            sys.exit(1)
+
+        for line in stdout:
+            if int(line) == 1:  # no server running
+                print("Error: no server running. Start your postgresql server.")
                 sys.exit(1)
-            print("ok.")
+        print("ok.")
 
-        client.close()
+        count += 1
+        print("({}) postgresql server stop:".format(count))
+        _cmd = "{} -D {} stop".format(self.pg_ctl, self.pgdata)
+        stdin, stdout, stderr = client.exec_command(_cmd, get_pty=True)
+        if (
+            self._stderr(stderr, "Error: '{}' returns error.".format(str(_cmd)))
+            == False
+        ):
+            sys.exit(1)
+        print("ok.")
+
+        count += 1
+        print("({}) postgresql server start:".format(count))
+        _cmd = self._ctl_cmd("start")
+        stdin, stdout, stderr = client.exec_command(_cmd, get_pty=True)
+        if (
+            self._stderr(stderr, "Error: '{}' returns error.".format(str(_cmd)))
+            == False
+        ):
+            sys.exit(1)
+        print("ok.")
 
         print("Server Check finished.")
 
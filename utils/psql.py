@@ -16,6 +16,8 @@ class Psql:
         self.password = password
 
         self.connection = None
+        # Message of the last connection error.
+        self.error = None
 
     """
     Public methods
@@ -24,7 +26,7 @@ class Psql:
     """
     # Creates a connection to the PostgreSQL server.
     """
-    def connect(self, autocommit=True):
+    def connect(self, autocommit=True, verbose=True):
         _conn = "host='{}' port={} user='{}' dbname='{}'".format(
             str(self.host), self.port, str(self.user), str(self.database)
         )
@@ -37,8 +39,10 @@ class Psql:
         try:
             _connection = psycopg2.connect(_conn, connect_timeout=Common.CONNECTION_TIMEOUT)
         except psycopg2.OperationalError as e:
-            print("Error: Could not connect to '{}'".format(self.host))
-            print(e)
+            self.error = str(e)
+            if verbose:
+                print("Error: Could not connect to '{}'".format(self.host))
+                print(e)
             return False
 
         if autocommit:
@@ -73,14 +73,30 @@ class Repository(Common):
                 return False
 
 
-    def get_log_dir(self, num):
+    """
+    # Returns the directory of the trial `num`.
+    # The repeated measurements (repeat > 0) are stored in its subdirectories "r1", "r2", ...
+    """
+
+    def get_log_dir(self, num, repeat=0):
         _log_dir = self.base_dir + self.log_dir + self._fill_dir(num) + "/"
-        if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
-            print("log_dir=", _log_dir)
         if os.path.exists(_log_dir) == False:
             os.mkdir(_log_dir, mode=self.DEFAULT_DIR_MODE)
+        if repeat > 0:
+            _log_dir += "r{}/".format(repeat)
+            if os.path.exists(_log_dir) == False:
+                os.mkdir(_log_dir, mode=self.DEFAULT_DIR_MODE)
+        if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+            print("log_dir=", _log_dir)
         return _log_dir
 
+    """
+    # Returns the directory of the metrics store of the study.
+    """
+
+    def get_metrics_dir(self):
+        return self.base_dir + self.log_dir + Common.METRICS_STORE_DIR + "/"
+
     """
     def create_base_repo(self):
         # Make repository directory.
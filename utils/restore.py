@@ -0,0 +1,467 @@
+"""
+restore.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import os, shutil, tempfile
+from abc import ABCMeta, abstractmethod
+
+from .common import Common, Log
+
+
+class RestoreBackend(metaclass=ABCMeta):
+    """
+    # Strategy to make the backup of the database cluster and to restore it.
+    #
+    # LOCAL:       whether the backend works when the server is on the local host.
+    # REMOTE:      whether the backend works on a remote server over SSH.
+    # ROOT:        whether the commands must run as root on the server.
+    # FILESYSTEMS: filesystem types (`stat -f -c %T`) that $PGDATA must be on, or None.
+    # TOOLS:       commands that must exist on the server.
+    """
+
+    NAME = None
+    LOCAL = True
+    REMOTE = True
+    ROOT = False
+    FILESYSTEMS = None
+    TOOLS = ["cp", "rm"]
+
+    def __init__(self, pg, snapshot=None, snapshot_size=None, verify=False):
+        self.pg = pg
+        self.snapshot = snapshot
+        self.snapshot_size = snapshot_size
+        self.verify = verify
+
+    def _run(self, cmd):
+        print("Currently running '{}'".format(cmd))
+        ret = self.pg.exec_server(cmd)
+        if ret:
+            print("... done.")
+        else:
+            print("... failed.")
+        return ret
+
+    """
+    Public methods
+    """
+
+    """
+    # Checks whether the backend can be used for the server.
+    """
+    def check(self):
+        if self.pg.is_local() and self.LOCAL == False:
+            print("Error: restore_method '{}' does not support a local server.".format(self.NAME))
+            return False
+        if self.pg.is_local() == False and self.REMOTE == False:
+            print("Error: restore_method '{}' does not support a remote server.".format(self.NAME))
+            return False
+
+        if self.ROOT and self.pg.exec_server("[ $(id -u) -eq 0 ]") == False:
+            print("Error: restore_method '{}' requires root privileges on '{}'.".format(self.NAME, self.pg.host))
+            return False
+
+        if self.FILESYSTEMS != None:
+            # $PGDATA does not exist yet for a new clone: check its parent directory.
+            cmd = "d={0}; [ -d $d ] || d=$(dirname $d); stat -f -c %T $d".format(self.pg.pgdata.rstrip("/"))
+            ret = self.pg.exec_server(cmd, return_output=True)
+            if ret == False or ret.strip() not in self.FILESYSTEMS:
+                print(
+                    "Error: restore_method '{}' requires '{}' on {}.".format(
+                        self.NAME, self.pg.pgdata, " or ".join(self.FILESYSTEMS)
+                    )
+                )
+                return False
+
+        for tool in self.TOOLS:
+            if self.pg.exec_server("command -v {} > /dev/null".format(tool)) == False:
+                print("Error: restore_method '{}' requires '{}' on '{}'.".format(self.NAME, tool, self.pg.host))
+                return False
+        return True
+
+    """
+    # Returns True if the backup exists.
+    """
+    def exists(self):
+        return self.pg.is_dir_exist(self.pg.pgdata_backup)
+
+    """
+    # Makes the backup. The server must be stopped.
+    """
+    def backup(self, force_remove=False):
+        cmd = "cp -r {} {}".format(self.pg.pgdata, self.pg.pgdata_backup)
+        if force_remove:
+            cmd = "rm -rf {}; {}".format(self.pg.pgdata_backup, cmd)
+        return self._run(cmd)
+
+    """
+    # Restores the database cluster from the backup. The server must be stopped.
+    """
+    @abstractmethod
+    def restore(self):
+        pass
+
+
+class CopyRestore(RestoreBackend):
+    """
+    # Removes $PGDATA and copies the whole backup tree.
+    """
+
+    NAME = "copy"
+
+    def restore(self):
+        if self.pg.is_dir_exist(self.pg.pgdata):
+            if self.pg.is_local():
+                shutil.rmtree(self.pg.pgdata)
+            elif self.pg.exec_server("rm -rf {}".format(self.pg.pgdata)) == False:
+                print("Error: Could not remove '{}'".format(self.pg.pgdata))
+                return False
+
+        return self._run("cp -r {} {}".format(self.pg.pgdata_backup, self.pg.pgdata))
+
+
+class RsyncRestore(RestoreBackend):
+    """
+    # Rewrites only the files whose size or mtime differ from the backup,
+    # and deletes the files that do not exist in the backup.
+    """
+
+    NAME = "rsync"
+    TOOLS = ["cp", "rm", "rsync"]
+
+    def backup(self, force_remove=False):
+        # Preserve mtimes so that the quick check of rsync works from the first trial.
+        cmd = "rsync -a {} {}".format(self.pg.pgdata, self.pg.pgdata_backup)
+        if force_remove:
+            cmd = "rm -rf {}; {}".format(self.pg.pgdata_backup, cmd)
+        return self._run(cmd)
+
+    def restore(self):
+        return self._run(
+            "rsync -a --inplace --delete {} {}".format(self.pg.pgdata_backup, self.pg.pgdata)
+        )
+
+
+class ReflinkRestore(RestoreBackend):
+    """
+    # Copies the backup with reflinks (copy-on-write), e.g. on XFS or btrfs.
+    """
+
+    NAME = "reflink"
+    FILESYSTEMS = ["xfs", "btrfs"]
+
+    def backup(self, force_remove=False):
+        cmd = "cp -r --reflink=always {} {}".format(self.pg.pgdata, self.pg.pgdata_backup)
+        if force_remove:
+            cmd = "rm -rf {}; {}".format(self.pg.pgdata_backup, cmd)
+        return self._run(cmd)
+
+    def restore(self):
+        return self._run(
+            "rm -rf {0}; cp -r --reflink=always {1} {0}".format(self.pg.pgdata, self.pg.pgdata_backup)
+        )
+
+
+class BtrfsRestore(RestoreBackend):
+    """
+    # $PGDATA is a btrfs subvolume and the backup is its read-only snapshot.
+    # Restoring replaces $PGDATA (if it exists, e.g. not for a new clone) with a writable
+    # snapshot of the backup.
+    """
+
+    NAME = "btrfs"
+    FILESYSTEMS = ["btrfs"]
+    TOOLS = ["btrfs"]
+
+    def backup(self, force_remove=False):
+        cmd = "btrfs subvolume snapshot -r {} {}".format(
+            self.pg.pgdata.rstrip("/"), self.pg.pgdata_backup.rstrip("/")
+        )
+        if force_remove:
+            cmd = "btrfs subvolume delete {}; {}".format(self.pg.pgdata_backup.rstrip("/"), cmd)
+        return self._run(cmd)
+
+    def restore(self):
+        return self._run(
+            "{{ [ ! -d {0} ] || btrfs subvolume delete {0}; }} && btrfs subvolume snapshot {1} {0}".format(
+                self.pg.pgdata.rstrip("/"), self.pg.pgdata_backup.rstrip("/")
+            )
+        )
+
+
+class ZfsRestore(RestoreBackend):
+    """
+    # $PGDATA is a ZFS dataset and the backup is its snapshot (e.g. "tank/pgdata@pg_tuner").
+    """
+
+    NAME = "zfs"
+    ROOT = True
+    FILESYSTEMS = ["zfs"]
+    TOOLS = ["zfs"]
+
+    def exists(self):
+        return self.pg.exec_server("zfs list -t snapshot {} > /dev/null".format(self.snapshot))
+
+    def backup(self, force_remove=False):
+        cmd = "zfs snapshot {}".format(self.snapshot)
+        if force_remove:
+            cmd = "zfs destroy {}; {}".format(self.snapshot, cmd)
+        return self._run(cmd)
+
+    def restore(self):
+        return self._run("zfs rollback -r {}".format(self.snapshot))
+
+
+class LvmRestore(RestoreBackend):
+    """
+    # $PGDATA is (in) the mounted filesystem of an LVM logical volume, and the backup
+    # is its snapshot volume (e.g. "vg0/pgdata_snap").
+    # Restoring merges the snapshot into the origin and takes the snapshot again.
+    """
+
+    NAME = "lvm"
+    ROOT = True
+    TOOLS = ["lvs", "lvcreate", "lvconvert", "lvchange", "findmnt"]
+
+    def exists(self):
+        return self.pg.exec_server("lvs {} > /dev/null".format(self.snapshot))
+
+    def _origin(self):
+        return "$(findmnt -n -o SOURCE --target {})".format(self.pg.pgdata)
+
+    def backup(self, force_remove=False):
+        name = self.snapshot.split("/")[1]
+        cmd = "lvcreate -s -n {} -L {} {}".format(name, self.snapshot_size, self._origin())
+        if force_remove:
+            cmd = "lvremove -y {}; {}".format(self.snapshot, cmd)
+        return self._run(cmd)
+
+    def restore(self):
+        vg, name = self.snapshot.split("/")
+        script = [
+            "set -e",
+            "origin=$(lvs --noheadings -o origin {} | tr -d \"[:space:]\")".format(self.snapshot),
+            "size=$(lvs --noheadings --units b --nosuffix -o lv_size {} | tr -d \"[:space:]\")".format(self.snapshot),
+            "dev=$(findmnt -n -o SOURCE --target {})".format(self.pg.pgdata),
+            "mnt=$(findmnt -n -o TARGET --target {})".format(self.pg.pgdata),
+            "umount $mnt",
+            "lvconvert --merge {}".format(self.snapshot),
+            "lvchange -an {0}/$origin && lvchange -ay {0}/$origin".format(vg),
+            "mount $dev $mnt",
+            "lvcreate -s -n {} -L ${{size}}b {}/$origin".format(name, vg),
+        ]
+        return self._run("sh -c '{}'".format("; ".join(script)))
+
+
+class IncrementalRestore(RestoreBackend):
+    """
+    # Keeps a manifest of the backup (path, size, mtime and, with `verify`, sha256 of
+    # every file, like pg_verifybackup, and the path of every directory) and copies back
+    # only the files whose size or mtime differ from the manifest, or which are missing.
+    # With `verify`, the files whose size and mtime match are also compared by sha256,
+    # which catches a file rewritten in place with the same size and mtime at the cost
+    # of reading them.
+    # Missing directories are copied back with their contents, and the files and
+    # directories that do not exist in the backup are removed.
+    # Restore time scales with the amount of data written by the trial.
+    """
+
+    NAME = "incremental"
+    TOOLS = ["cp", "rm", "find", "xargs"]
+
+    def __init__(self, pg, snapshot=None, snapshot_size=None, verify=False):
+        super().__init__(pg, snapshot, snapshot_size, verify)
+        if verify:
+            self.TOOLS = IncrementalRestore.TOOLS + ["sha256sum"]
+
+    def _manifest_file(self):
+        return self.pg.pgdata_backup.rstrip("/") + Common.MANIFEST_SUFFIX
+
+    def _list_files(self, dirname):
+        # Returns {path: [size, mtime]}. The paths of the directories end with "/",
+        # and their size and mtime are "-" because they change with their entries.
+        cmd = "cd {} && find . -mindepth 1 \\( -type f -o -type d \\) -printf '%y\\t%P\\t%s\\t%T@\\n'".format(
+            dirname
+        )
+        ret = self.pg.exec_server(cmd, return_output=True)
+        if ret == False:
+            return None
+        files = {}
+        for line in ret.splitlines():
+            token = line.rstrip("\r").split("\t")
+            if len(token) != 4:
+                continue
+            if token[0] == "d":
+                files[token[1] + "/"] = ["-", "-"]
+            else:
+                files[token[1]] = token[2:4]
+        return files
+
+    def _checksums(self, dirname, paths):
+        # Returns {path: sha256} of the files of dirname.
+        _list = self._put_list(paths, "checksums")
+        if _list == None:
+            return None
+        cmd = "cd {} && xargs -0 -r -a {} sha256sum".format(dirname, _list)
+        ret = self.pg.exec_server(cmd, return_output=True)
+        self._rm_list(_list)
+        if ret == False:
+            return None
+        checksums = {}
+        for line in ret.splitlines():
+            token = line.rstrip("\r").split(None, 1)
+            if len(token) == 2:
+                checksums[token[1]] = token[0]
+        return checksums
+
+    def _read_manifest(self):
+        if self.pg.is_exist(self._manifest_file()) == False:
+            return None
+        ret = self.pg.exec_server("cat {}".format(self._manifest_file()), return_output=True)
+        if ret == False:
+            return None
+        manifest = {}
+        for line in ret.splitlines():
+            token = line.rstrip("\r").split("\t")
+            if len(token) != 4:
+                # Not written by this version: do not trust it.
+                return None
+            manifest[token[0]] = token[1:4]
+        return manifest
+
+    def _put_list(self, paths, name):
+        fd, local_file = tempfile.mkstemp(prefix="pg_tuner_", suffix=".list")
+        with os.fdopen(fd, "w") as f:
+            f.write("\0".join(paths))
+        if self.pg.is_local():
+            return local_file
+        remote_file = "/tmp/pg_tuner_{}_{}.list".format(os.getpid(), name)
+        ret = self.pg.put_file(local_file, remote_file)
+        os.remove(local_file)
+        return remote_file if ret else None
+
+    def _rm_list(self, filename):
+        if self.pg.is_local():
+            os.remove(filename)
+        else:
+            self.pg.exec_server("rm -f {}".format(filename))
+
+    def _run_list(self, paths, name, cmd):
+        # Runs cmd (formatted with the list file) over paths.
+        if len(paths) == 0:
+            return True
+        _list = self._put_list(paths, name)
+        if _list == None:
+            return False
+        ret = self._run(cmd.format(_list))
+        self._rm_list(_list)
+        return ret
+
+    @staticmethod
+    def _top_dirs(dirs):
+        # Returns the directories which are not under another one of dirs.
+        return [d for d in dirs if not any(d != p and d.startswith(p) for p in dirs)]
+
+    def backup(self, force_remove=False):
+        # Preserve mtimes so that the restored files match the manifest.
+        cmd = "cp -a {} {}".format(self.pg.pgdata, self.pg.pgdata_backup)
+        if force_remove:
+            cmd = "rm -rf {}; {}".format(self.pg.pgdata_backup, cmd)
+        if self._run(cmd) == False:
+            return False
+
+        print("Creating the manifest '{}'".format(self._manifest_file()))
+        files = self._list_files(self.pg.pgdata_backup)
+        checksums = {}
+        if files != None and self.verify:
+            checksums = self._checksums(self.pg.pgdata_backup, [p for p in files if p.endswith("/") == False])
+        if files == None or checksums == None:
+            print("... failed.")
+            return False
+
+        fd, local_file = tempfile.mkstemp(prefix="pg_tuner_", suffix=Common.MANIFEST_SUFFIX)
+        with os.fdopen(fd, "w") as f:
+            for path in sorted(files.keys()):
+                [size, mtime] = files[path]
+                f.write("{}\t{}\t{}\t{}\n".format(path, size, mtime, checksums.get(path, "-")))
+        ret = self.pg.put_file(local_file, self._manifest_file())
+        os.remove(local_file)
+
+        print("... done." if ret else "... failed.")
+        return ret
+
+    def restore(self):
+        manifest = self._read_manifest()
+        if manifest == None or self.pg.is_dir_exist(self.pg.pgdata) == False:
+            if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                print("Notice: manifest or '{}' not found. Restore the whole backup.".format(self.pg.pgdata))
+            return self._run("rm -rf {0}; cp -a {1} {0}".format(self.pg.pgdata, self.pg.pgdata_backup))
+
+        files = self._list_files(self.pg.pgdata)
+        if files == None:
+            return False
+
+        # The missing directories are copied back as a whole, with their contents.
+        missing_dirs = self._top_dirs([p for p in manifest if p.endswith("/") and p not in files])
+        changed = [
+            p
+            for p in manifest
+            if p.endswith("/") == False
+            and (p not in files or files[p] != manifest[p][0:2])
+            and not any(p.startswith(d) for d in missing_dirs)
+        ]
+        if self.verify:
+            same = [p for p in manifest if p.endswith("/") == False and p in files and files[p] == manifest[p][0:2]]
+            if any(manifest[p][2] == "-" for p in same):
+                if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                    print("Notice: the manifest has no checksums; make the backup again with restore_verify.")
+            elif len(same) > 0:
+                checksums = self._checksums(self.pg.pgdata, same)
+                if checksums == None:
+                    return False
+                changed += [p for p in same if checksums.get(p) != manifest[p][2]]
+        # The extra directories are removed with their contents.
+        extras = self._top_dirs([p for p in files if p.endswith("/") and p not in manifest])
+        extras += [
+            p
+            for p in files
+            if p.endswith("/") == False and p not in manifest and not any(p.startswith(d) for d in extras)
+        ]
+
+        if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+            nbytes = sum(int(manifest[p][0]) for p in changed)
+            print(
+                "Notice: restore {} changed files ({} bytes) and {} directories, and remove {} files and directories.".format(
+                    len(changed), nbytes, len(missing_dirs), len(extras)
+                )
+            )
+
+        ret = self._run_list(
+            [d.rstrip("/") for d in missing_dirs],
+            "dirs",
+            "cd {} && xargs -0 -r -a {{}} cp -a --parents -t {}".format(self.pg.pgdata_backup, self.pg.pgdata),
+        )
+        if ret:
+            ret = self._run_list(
+                changed,
+                "changed",
+                "cd {} && xargs -0 -r -a {{}} cp -p --parents -t {}".format(self.pg.pgdata_backup, self.pg.pgdata),
+            )
+        if ret:
+            ret = self._run_list(
+                [p.rstrip("/") for p in extras], "extras", "cd {} && xargs -0 -r -a {{}} rm -rf".format(self.pg.pgdata)
+            )
+
+        return ret
+
+
+RESTORE_BACKENDS = {
+    CopyRestore.NAME: CopyRestore,
+    RsyncRestore.NAME: RsyncRestore,
+    ReflinkRestore.NAME: ReflinkRestore,
+    BtrfsRestore.NAME: BtrfsRestore,
+    ZfsRestore.NAME: ZfsRestore,
+    LvmRestore.NAME: LvmRestore,
+    IncrementalRestore.NAME: IncrementalRestore,
+}
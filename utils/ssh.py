@@ -0,0 +1,173 @@
+"""
+ssh.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import os, threading
+import paramiko
+
+from .common import Common, Log
+
+
+class SSHSession:
+    def __init__(
+        self,
+        host,
+        user,
+        passwd,
+        banner_timeout=Common.BANNER_TIMEOUT,
+        auth_timeout=Common.AUTH_TIMEOUT,
+        channel_timeout=Common.CHANNEL_TIMEOUT,
+    ):
+        self.host = host
+        self.user = user
+        self.passwd = passwd
+        self.banner_timeout = banner_timeout
+        self.auth_timeout = auth_timeout
+        self.channel_timeout = channel_timeout
+
+        self.client = None
+        self.sftp = None
+        self.pid = os.getpid()
+        self.refcount = 0
+
+        # paramiko's Transport can open channels from several threads,
+        # but SFTPClient cannot be shared; both are guarded by this lock.
+        self.lock = threading.RLock()
+
+    def _connect(self):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.WarningPolicy())
+        client.connect(
+            self.host,
+            username=self.user,
+            password=self.passwd,
+            banner_timeout=self.banner_timeout,
+            auth_timeout=self.auth_timeout,
+            channel_timeout=self.channel_timeout,
+            timeout=self.channel_timeout,
+        )
+        if Log.debug1 <= Common.DEFAULT_LOG_LEVEL:
+            print("Debug1: SSH session to '{}' established.".format(self.host))
+        self.client = client
+        self.sftp = None
+
+    def _is_active(self):
+        if self.client == None:
+            return False
+        transport = self.client.get_transport()
+        return transport != None and transport.is_active()
+
+    def _get_client(self):
+        with self.lock:
+            if self._is_active() == False:
+                self.disconnect()
+                self._connect()
+            return self.client
+
+    def _get_sftp(self):
+        with self.lock:
+            client = self._get_client()
+            if self.sftp == None or self.sftp.get_channel().closed:
+                self.sftp = client.open_sftp()
+            return self.sftp
+
+    """
+    Public methods
+    """
+
+    """
+    # Establishes the transport if it is not connected yet.
+    """
+    def open(self):
+        self._get_client()
+        return True
+
+    """
+    # Opens a new channel on the shared transport and executes the command.
+    # If the transport has been dropped, reconnects once and retries.
+    """
+    def exec_command(self, command, get_pty=False):
+        try:
+            return self._get_client().exec_command(command, get_pty=get_pty)
+        except (paramiko.SSHException, EOFError, OSError):
+            if Log.notice <= Common.DEFAULT_LOG_LEVEL:
+                print("Notice: SSH session to '{}' lost. Reconnecting.".format(self.host))
+            self.disconnect()
+            return self._get_client().exec_command(command, get_pty=get_pty)
+
+    def stat(self, filename):
+        with self.lock:
+            try:
+                return self._get_sftp().stat(filename)
+            except (paramiko.SSHException, EOFError):
+                self.disconnect()
+                return self._get_sftp().stat(filename)
+
+    def put(self, source, target):
+        with self.lock:
+            try:
+                return self._get_sftp().put(source, target)
+            except (paramiko.SSHException, EOFError):
+                self.disconnect()
+                return self._get_sftp().put(source, target)
+
+    def disconnect(self):
+        with self.lock:
+            if self.sftp != None:
+                try:
+                    self.sftp.close()
+                except Exception:
+                    pass
+                self.sftp = None
+            if self.client != None:
+                try:
+                    self.client.close()
+                except Exception:
+                    pass
+                self.client = None
+
+
+class SSHPool:
+    """
+    # Long-lived, reference-counted SSH sessions shared per (host, user).
+    #
+    # Sessions are not shared across processes: a forked child gets its own
+    # session instead of reusing the parent's socket.
+    """
+
+    _sessions = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def acquire(
+        cls,
+        host,
+        user,
+        passwd,
+        banner_timeout=Common.BANNER_TIMEOUT,
+        auth_timeout=Common.AUTH_TIMEOUT,
+        channel_timeout=Common.CHANNEL_TIMEOUT,
+    ):
+        key = (os.getpid(), host, user)
+        with cls._lock:
+            if key not in cls._sessions:
+                cls._sessions[key] = SSHSession(
+                    host, user, passwd, banner_timeout, auth_timeout, channel_timeout
+                )
+            session = cls._sessions[key]
+            session.refcount += 1
+            return session
+
+    @classmethod
+    def release(cls, session):
+        key = (session.pid, session.host, session.user)
+        with cls._lock:
+            session.refcount -= 1
+            if session.refcount > 0:
+                return
+            if cls._sessions.get(key) is session:
+                del cls._sessions[key]
+        if session.pid == os.getpid():
+            session.disconnect()
@@ -0,0 +1,93 @@
+"""
+stats.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import math
+from .common import Common, Log
+
+
+class Stats:
+    def __init__(self):
+        pass
+
+    # Two-sided 95% critical values of Student's t distribution, indexed by degrees of freedom.
+    T_TABLE_95 = {
+        1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571,
+        6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228,
+        11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131,
+        16: 2.120, 17: 2.110, 18: 2.101, 19: 2.093, 20: 2.086,
+        21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064, 25: 2.060,
+        26: 2.056, 27: 2.052, 28: 2.048, 29: 2.045, 30: 2.042,
+        40: 2.021, 60: 2.000, 120: 1.980,
+    }
+    Z_95 = 1.960
+
+    @staticmethod
+    def mean(values):
+        return sum(values) / len(values)
+
+    @staticmethod
+    def stdev(values):
+        if len(values) < 2:
+            return 0.0
+        m = Stats.mean(values)
+        return math.sqrt(sum((v - m) ** 2 for v in values) / (len(values) - 1))
+
+    @staticmethod
+    def median(values):
+        v = sorted(values)
+        n = len(v)
+        if n % 2 == 1:
+            return v[n // 2]
+        return (v[n // 2 - 1] + v[n // 2]) / 2
+
+    """
+    # Mean of the values after removing `proportion` of the values from each end.
+    """
+
+    @staticmethod
+    def trimmed_mean(values, proportion=Common.DEFAULT_TRIM_PROPORTION):
+        v = sorted(values)
+        k = int(len(v) * proportion)
+        if len(v) - 2 * k <= 0:
+            return Stats.median(v)
+        return Stats.mean(v[k : len(v) - k])
+
+    @staticmethod
+    def t_value(df):
+        if df in Stats.T_TABLE_95:
+            return Stats.T_TABLE_95[df]
+        # Use the nearest smaller degrees of freedom (conservative).
+        for d in sorted(Stats.T_TABLE_95, reverse=True):
+            if d < df:
+                return Stats.T_TABLE_95[d] if df <= 120 else Stats.Z_95
+        return Stats.Z_95
+
+    """
+    # Returns the 95% confidence interval [low, high] of the mean,
+    # centered on `center` (default: the mean). Returns None if len(values) < 2.
+    """
+
+    @staticmethod
+    def confidence_interval(values, center=None):
+        n = len(values)
+        if n < 2:
+            return None
+        if center == None:
+            center = Stats.mean(values)
+        half = Stats.t_value(n - 1) * Stats.stdev(values) / math.sqrt(n)
+        return [center - half, center + half]
+
+    """
+    # Returns the robust score of the values: "median", "trimmed_mean" or "mean".
+    """
+
+    @staticmethod
+    def score(values, statistic=Common.DEFAULT_REPEAT_STATISTIC):
+        if statistic == "median":
+            return Stats.median(values)
+        elif statistic == "trimmed_mean":
+            return Stats.trimmed_mean(values)
+        return Stats.mean(values)
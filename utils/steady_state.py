@@ -0,0 +1,86 @@
+"""
+steady_state.py
+
+  Copyright (c) 2024-2025, Hironobu Suzuki @ interdb.jp
+"""
+
+import math, sys
+from .common import Common, Log
+
+
+"""
+# Steady-state detector.
+#
+# Finds the first interval from which the throughput series (tps of each
+# interval report) is stable, so that the ramp-up after the server start
+# is excluded from the score.
+#
+# "cv":    The first window of `window` intervals whose coefficient of variation
+#          (stddev / mean) is less than or equal to `threshold`.
+# "cusum": The change point of the cumulative sum of the deviations from the mean
+#          of the second half of the series, if the deviation exceeds `threshold`
+#          standard deviations (scaled by the square root of the length).
+"""
+
+
+class SteadyState:
+    def __init__(self, method, window=Common.DEFAULT_STEADY_STATE_WINDOW, threshold=None):
+        if method not in ["cv", "cusum"]:
+            print("Error: steady_state '{}' not supported.".format(method))
+            sys.exit(1)
+        self.method = method
+        self.window = window
+        if threshold == None:
+            if method == "cv":
+                threshold = Common.DEFAULT_STEADY_STATE_CV
+            else:
+                threshold = Common.DEFAULT_STEADY_STATE_CUSUM
+        self.threshold = threshold
+
+    def _mean_stdev(self, values):
+        mean = sum(values) / len(values)
+        if len(values) < 2:
+            return mean, 0.0
+        var = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+        return mean, math.sqrt(var)
+
+    def _cv(self, values):
+        for i in range(len(values) - self.window + 1):
+            mean, stdev = self._mean_stdev(values[i : i + self.window])
+            if mean > 0 and stdev / mean <= self.threshold:
+                return i
+        return None
+
+    def _cusum(self, values):
+        reference = values[len(values) // 2 :]
+        mean, stdev = self._mean_stdev(reference)
+
+        s = 0.0
+        s_max = 0.0
+        k = None
+        for i in range(len(values) - len(reference)):
+            s += values[i] - mean
+            if abs(s) > s_max:
+                s_max = abs(s)
+                k = i
+
+        if k == None or stdev == 0.0 or s_max <= self.threshold * stdev * math.sqrt(k + 1):
+            return 0
+        return k + 1
+
+    """
+    Public methods
+    """
+
+    """
+    # Returns the index of the first steady interval of `values`,
+    # or None if the series is too short or never becomes steady.
+    """
+
+    def detect(self, values):
+        if len(values) < self.window:
+            return None
+        if self.method == "cv":
+            return self._cv(values)
+        else:
+            return self._cusum(values)